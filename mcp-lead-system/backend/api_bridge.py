@@ -1,18 +1,60 @@
 # FastAPI Agent/Bridge for n8n
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse  # <--- NEW IMPORT
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-# We import the functions directly, so we call them like normal python functions
-from mcp_server import generate_leads, enrich_leads_batch, generate_messages_batch, send_outreach_batch
-from database import LeadDB
-import uvicorn
-import json
-import csv       # <--- NEW IMPORT
-import io        # <--- NEW IMPORT
+# The stages are the same service functions the MCP tools wrap; their result dicts are encoded once, here
+from service import get_db, close_db, close_ai_client, generate_leads, enrich_leads_batch, generate_messages_batch, send_outreach_batch, run_pipeline, process_retries, send_rate_limiter, WORKER_ID
+from encoding import dumps_text
+from responses import CompressionMiddleware, JSONResponse
+from retry_scheduler import RetryScheduler
+from archiver import Archiver
+from database import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+from logic.metrics import REGISTRY, LEADS_BY_STATUS
+from jobs import JobManager
+from change_feed import ChangeFeed
+from logic.exporter import FORMATS, is_available, stream_export
+import asyncio
+import os
+from contextlib import asynccontextmanager, suppress
 
-app = FastAPI()
+# Optional in-process retry loop: "live" or "dry_run" (unset: retries wait for /agent/retries)
+RETRY_SCHEDULER = os.getenv("RETRY_SCHEDULER")
+# Optional in-process archival loop: "on" (unset: leads are archived via POST /db/archive)
+ARCHIVER = os.getenv("ARCHIVER")
+
+@asynccontextmanager
+async def lifespan(app):
+    # The shared LeadDB (and its connection pool) is opened by the first request that needs
+    # it and reused by every later one; release it on shutdown.
+    stop = asyncio.Event()
+    retry_loop = None
+    if RETRY_SCHEDULER in ("live", "dry_run"):
+        dry_run = RETRY_SCHEDULER == "dry_run"
+        # Retries share the live sends' limiter: together they stay within the send rate
+        scheduler = RetryScheduler(get_db(), WORKER_ID, dry_run=dry_run, rate_limiter=send_rate_limiter(dry_run))
+        retry_loop = asyncio.create_task(scheduler.run(stop))
+    archive_loop = asyncio.create_task(Archiver(get_db()).run(stop)) if ARCHIVER == "on" else None
+    yield
+    stop.set()
+    if retry_loop:
+        # With stop set the scheduler would keep going until every pending retry is due and
+        # sent; cancel it instead, and let it unwind before the database is closed below
+        # (pending retries stay in the schedule for the next start)
+        retry_loop.cancel()
+        with suppress(asyncio.CancelledError):
+            await retry_loop
+    if archive_loop:
+        # Finishes the batches in flight: the database is closed below
+        await archive_loop
+    jobs.executor.shutdown(wait=True)
+    close_ai_client()
+    close_db()
+
+app = FastAPI(lifespan=lifespan, default_response_class=JSONResponse)
+# Large pages and exports go out gzip/brotli-compressed when the client accepts it
+app.add_middleware(CompressionMiddleware)
 
 # Enable CORS so Frontend can talk to Backend
 app.add_middleware(
@@ -27,75 +69,254 @@ class GenRequest(BaseModel):
     count: int = 5
     seed: int = 42
     industry: str = "" 
+    fast: bool = False
+    shards: int = None
 
 class ProcessRequest(BaseModel):
     limit: int = 5
     dry_run: bool = True
     mode: str = "offline"
 
+class RunRequest(BaseModel):
+    count: int = 100
+    seed: int = 42
+    industry: str = ""
+    mode: str = "offline"
+    dry_run: bool = True
+    batch_size: int = None
+    workers: dict = None
+    resume: bool = True
+
+# Largest /leads page (a virtualized table asks for a screenful or two at a time)
+MAX_PAGE_SIZE = 1000
+
+# Background jobs process large limits in chunks of this size to report progress
+JOB_CHUNK_SIZE = 500
+
+# Stages run on a bounded worker pool, never on the event loop
+jobs = JobManager()
+# Pushes lead changes to dashboards (one broadcaster shared by all viewers, created with the first)
+_feed = None
+SSE_KEEPALIVE_SECONDS = 15
+
+def get_feed() -> ChangeFeed:
+    global _feed
+    if _feed is None:
+        _feed = ChangeFeed(get_db())
+    return _feed
+
+async def run_stage(stage, fn, background, chunk_size=None, **kwargs):
+    """Awaits the stage off-loop, or queues it as a background job and returns the job record."""
+    if background:
+        return JSONResponse(jobs.submit(stage, fn, chunk_size=chunk_size, **kwargs), status_code=202)
+    return JSONResponse(await jobs.run(fn, **kwargs))
+
 @app.post("/agent/generate")
-async def api_generate(req: GenRequest):
+async def api_generate(req: GenRequest, background: bool = False):
     # Pass industry to the function
-    res = generate_leads(count=req.count, seed=req.seed, industry=req.industry)
-    return json.loads(res)
+    return await run_stage("generate", generate_leads, background, count=req.count, seed=req.seed, industry=req.industry, fast=req.fast, shards=req.shards)
 
 @app.post("/agent/enrich")
-async def api_enrich(req: ProcessRequest):
-    res = enrich_leads_batch(limit=req.limit, mode=req.mode)
-    return json.loads(res)
+async def api_enrich(req: ProcessRequest, background: bool = False):
+    return await run_stage("enrich", enrich_leads_batch, background, JOB_CHUNK_SIZE, limit=req.limit, mode=req.mode)
 
 @app.post("/agent/prepare-messages")
-async def api_messages(req: ProcessRequest):
-    res = generate_messages_batch(limit=req.limit)
-    return json.loads(res)
+async def api_messages(req: ProcessRequest, background: bool = False):
+    return await run_stage("prepare-messages", generate_messages_batch, background, JOB_CHUNK_SIZE, limit=req.limit)
 
 @app.post("/agent/send")
-async def api_send(req: ProcessRequest):
-    res = send_outreach_batch(limit=req.limit, dry_run=req.dry_run)
-    return json.loads(res)
+async def api_send(req: ProcessRequest, background: bool = False):
+    return await run_stage("send", send_outreach_batch, background, JOB_CHUNK_SIZE, limit=req.limit, dry_run=req.dry_run)
+
+@app.post("/agent/retries")
+async def api_retries(req: ProcessRequest, drain: bool = False, background: bool = False):
+    """Due send retries (one pass, or until none are scheduled with drain=true)."""
+    return await run_stage("retries", process_retries, background, limit=req.limit, dry_run=req.dry_run, drain=drain)
+
+@app.post("/agent/run")
+async def api_run(req: RunRequest, background: bool = False):
+    """The whole pipeline in one run, stages overlapping (see pipeline.PipelineRunner)."""
+    return await run_stage("run", run_pipeline, background, count=req.count, seed=req.seed, industry=req.industry or None,
+                           mode=req.mode, dry_run=req.dry_run, batch_size=req.batch_size, workers=req.workers, resume=req.resume)
 
+@app.get("/jobs")
+def list_jobs():
+    return JSONResponse({"jobs": jobs.list()})
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Plain `def` handlers: FastAPI runs them in its threadpool, so sqlite reads don't block the loop
 @app.get("/leads")
-async def get_leads():
-    db = LeadDB()
-    try:
-        # Increase limit to 500 so you can see large batches
-        return {"leads": db.get_recent_leads(limit=500), "stats": db.get_stats()}
-    finally:
-        db.close()
-
-# --- NEW ENDPOINT FOR CSV EXPORT ---
-@app.get("/export/csv")
-async def export_leads_csv():
-    """Bonus: Export all leads to CSV"""
-    db = LeadDB()
+def get_leads(since: int = None, after_id: int = None, limit: int = 500,
+              status: str = None, industry: str = None, country: str = None, persona: str = None, company_size: str = None,
+              min_confidence: int = None, max_confidence: int = None,
+              q: str = None, sort: str = "id", order: str = "desc", cursor: str = None, columns: str = None):
+    """
+    Without `since`: one page of leads plus the current change `version`. Pages are keyset
+    paginated: pass the returned `next_cursor` back as `cursor` (null on the last page).
+    `sort` is id/full_name/company_name, `order` desc/asc; `q` is a full-text search over
+    names, companies, roles and message content; `columns` (comma-separated) trims each
+    row. `total` counts the matching leads when the status counters can tell, else null.
+    With `since`: only rows changed after that version (delta mode). Pass the returned
+    `version`/`after_id` back to continue; `has_more` means another page is waiting.
+    """
+    if since is None:
+        limit = min(limit, MAX_PAGE_SIZE)
+        # Read the version first: anything written after it will show up in the next delta
+        db = get_db()
+        version = db.current_version()
+        filters = dict(status=status, industry=industry, country=country, persona=persona, company_size=company_size,
+                       min_confidence=min_confidence, max_confidence=max_confidence)
+        selected = tuple(c.strip() for c in columns.split(",") if c.strip()) if columns else None
+        try:
+            leads, next_cursor = db.page_leads(limit, cursor, sort, order, q, selected, **filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # Returned as a response: the rows are encoded straight from the query results
+        return JSONResponse({
+            "leads": leads,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
+            "total": None if q else db.count_leads(**filters),
+            "stats": db.get_stats(),
+            "industry_stats": db.get_industry_stats(),
+            "throughput": db.get_throughput(),
+            "version": version,
+        })
+
+    db = get_db()
+    rows = db.get_changes(since, after_id, limit)
+    last = rows[-1] if rows else {"row_version": since, "id": after_id}
+    return JSONResponse({
+        "leads": rows,
+        "stats": db.get_stats(),
+        "version": last["row_version"],
+        "after_id": last["id"],
+        "has_more": len(rows) == limit,
+    })
+
+@app.get("/leads/segments")
+def lead_segments(group_by: str = "persona", status: str = None, industry: str = None, persona: str = None,
+                  company_size: str = None, min_confidence: int = None, max_confidence: int = None):
+    """Lead counts and average confidence per segment, e.g. ?group_by=industry,persona&min_confidence=90."""
     try:
-        # Get all leads
-        cursor = db.conn.cursor()
-        cursor.execute("SELECT * FROM leads ORDER BY id DESC")
-        rows = cursor.fetchall()
-        
-        # Create CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write Header
-        if rows:
-            writer.writerow(rows[0].keys())
-            
-        # Write Data
-        for row in rows:
-            writer.writerow(list(row))
-            
-        output.seek(0)
-        
-        return StreamingResponse(
-            io.BytesIO(output.getvalue().encode()),
-            media_type="text/csv",
-            headers={"Content-Disposition": "attachment; filename=leads_export.csv"}
+        segments = get_db().segment_stats(
+            tuple(c.strip() for c in group_by.split(",") if c.strip()),
+            status=status, industry=industry, persona=persona, company_size=company_size,
+            min_confidence=min_confidence, max_confidence=max_confidence,
         )
-    finally:
-        db.close()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse({"group_by": group_by, "segments": segments})
+
+@app.get("/leads/{lead_id}/events")
+def lead_events(lead_id: int, after_id: int = 0, limit: int = 100):
+    """A lead's stage history, oldest first. Pass `next_after_id` back as `after_id` for the next page."""
+    events = get_db().get_lead_events(lead_id, after_id, limit)
+    return JSONResponse({"lead_id": lead_id, "events": events, "next_after_id": events[-1]["id"] if events else after_id,
+                         "has_more": len(events) == limit})
+
+@app.get("/stats")
+def get_stats():
+    """Pipeline counters by status and industry, plus per-stage throughput (leads/min)."""
+    db = get_db()
+    return {"stats": db.get_stats(), "industry_stats": db.get_industry_stats(), "throughput": db.get_throughput()}
+
+@app.get("/stats/stages")
+def stage_stats(since: float = None):
+    """Per-stage failure rates and latencies computed from the lead event log (`since` = unix time)."""
+    return {"stages": get_db().stage_analytics(since)}
+
+@app.post("/stats/reconcile")
+def reconcile_stats(fix: bool = True):
+    """Recounts the leads table and repairs any counter drift."""
+    drift = get_db().reconcile_counters(fix=fix)
+    return {"consistent": not drift, "drift": drift, "fixed": fix and bool(drift)}
+
+@app.get("/leads/stream")
+async def stream_leads(request: Request, since: int = None):
+    """Server-Sent Events: pushes changed rows and stats as the pipeline writes them."""
+    # Browsers resend the last event id on reconnect, so no change is missed
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    feed = get_feed()
+    queue = await feed.subscribe(since)
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['version']}\nevent: changes\ndata: {dumps_text(event)}\n\n"
+        finally:
+            feed.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/leads/{lead_id}")
+def get_lead(lead_id: int, columns: str = None):
+    """One lead with all (or the comma-separated) columns, e.g. the message drafts behind a table row."""
+    selected = tuple(c.strip() for c in columns.split(",") if c.strip()) if columns else None
+    try:
+        lead = get_db().get_lead(lead_id, selected)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if lead is None:
+        raise HTTPException(status_code=404, detail=f"Lead {lead_id} not found")
+    return JSONResponse(lead)
+
+@app.post("/db/archive")
+async def archive_leads(older_than_days: float = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE, background: bool = False):
+    """Moves SENT/FAILED leads untouched for `older_than_days` to the archive table (still shown by /leads and exports)."""
+    return await run_stage("archive", get_db().archive_leads, background, older_than_days=older_than_days, batch_size=batch_size)
+
+@app.get("/db/archive")
+def archive_stats():
+    """Hot and archived lead counts, database pages and the auto-vacuum mode."""
+    return get_db().archive_stats()
+
+@app.get("/db/pool")
+def get_pool_metrics():
+    """Connection pool health: idle readers and time spent waiting for connections."""
+    return get_db().pool_metrics()
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text format: stage and DB query latencies, backlog by status, rate-limit waits, retries."""
+    # Backlog depth comes from the status counters, read at scrape time
+    LEADS_BY_STATUS.replace(get_db().get_stats())
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# --- STREAMING EXPORT (CSV / NDJSON / Parquet) ---
+@app.get("/export/{fmt}")
+def export_leads(fmt: str = "csv", status: str = None, industry: str = None,
+                 updated_since: str = None, updated_until: str = None,
+                 persona: str = None, min_confidence: int = None):
+    """Bonus: Export leads, streamed in chunks so memory stays flat regardless of table size"""
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=404, detail=f"Unknown export format '{fmt}'")
+    if not is_available(fmt):
+        raise HTTPException(status_code=501, detail=f"{fmt} export needs optional dependency pyarrow")
+
+    chunks = get_db().iter_export(status=status, industry=industry, updated_since=updated_since, updated_until=updated_until,
+                            persona=persona, min_confidence=min_confidence)
+    media_type, extension = FORMATS[fmt]
+    return StreamingResponse(
+        stream_export(chunks, fmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=leads_export.{extension}"}
+    )
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
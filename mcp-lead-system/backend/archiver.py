@@ -0,0 +1,47 @@
+# Periodic hot/cold archival: terminal leads leave the working table once old enough
+
+import asyncio
+import os
+from database import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+
+# Pause between archival passes (each pass drains everything old enough, batch by batch)
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+# Batches per hop to the worker thread; a stop request is honoured between hops
+ARCHIVE_STEP_BATCHES = 10
+
+class Archiver:
+    """
+    Runs LeadDB.archive_leads every `interval` seconds: SENT/FAILED leads untouched for
+    `older_than_days` move to the archive table in short transactions, and the pages they
+    free are handed back as it goes. Pages, search, export and stats keep showing them.
+    """
+    def __init__(self, db, older_than_days: float = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                 interval: float = ARCHIVE_INTERVAL_SECONDS):
+        self.db = db
+        self.older_than_days = older_than_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.totals = {"passes": 0, "archived": 0, "pages_freed": 0}
+
+    async def run_once(self, stop: asyncio.Event = None) -> int:
+        """One pass: archives until nothing is old enough (or `stop` is set). Returns leads archived."""
+        archived = 0
+        while stop is None or not stop.is_set():
+            result = await asyncio.to_thread(self.db.archive_leads, self.older_than_days, self.batch_size, ARCHIVE_STEP_BATCHES)
+            archived += result["archived"]
+            self.totals["pages_freed"] += result["pages_freed"]
+            if result["batches"] < ARCHIVE_STEP_BATCHES:
+                break
+        self.totals["passes"] += 1
+        self.totals["archived"] += archived
+        return archived
+
+    async def run(self, stop: asyncio.Event) -> dict:
+        """Archives, then sleeps `interval`, until `stop` is set. Returns the running totals."""
+        while not stop.is_set():
+            await self.run_once(stop)
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+        return dict(self.totals)
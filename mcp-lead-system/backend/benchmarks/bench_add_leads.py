@@ -0,0 +1,65 @@
+# Benchmark: bulk insert throughput of LeadDB.add_leads against a pre-populated table
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import LeadDB
+
+def seed_existing_rows(db, count):
+    """Fills the table with `count` placeholder leads (fast path, bypasses Faker)."""
+    rows = (
+        {
+            "full_name": f"Seed Lead {i}", "company_name": f"Seed Co {i}", "role": "CEO",
+            "industry": "SaaS", "website": f"https://www.seedco{i}.com",
+            "email": f"seed.{i}@seedco{i}.com", "linkedin_url": f"https://linkedin.com/in/seed-{i}",
+            "country": "Nowhere",
+        }
+        for i in range(count)
+    )
+    db.add_leads(rows, chunk_size=10000)
+
+def new_leads(count, offset):
+    return [
+        {
+            "full_name": f"New Lead {i}", "company_name": f"New Co {i}", "role": "CTO",
+            "industry": "FinTech", "website": f"https://www.newco{i}.com",
+            "email": f"new.{i}@newco{i}.com", "linkedin_url": f"https://linkedin.com/in/new-{i}",
+            "country": "Somewhere",
+        }
+        for i in range(offset, offset + count)
+    ]
+
+def run(existing_sizes, batch_size):
+    for existing in existing_sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DB_PATH = os.path.join(tmp, "bench.db")
+            db = LeadDB()
+            seed_existing_rows(db, existing)
+
+            batch = new_leads(batch_size, offset=0)
+            start = time.perf_counter()
+            added = db.add_leads(batch)
+            elapsed = time.perf_counter() - start
+
+            # Second pass is all duplicates: measures the dedup cost alone
+            start = time.perf_counter()
+            db.add_leads(batch)
+            dup_elapsed = time.perf_counter() - start
+            db.close()
+
+        print(f"existing={existing:>9,}  added={added:>7,}  "
+              f"insert={batch_size / elapsed:>10,.0f} leads/s  "
+              f"dedup-only={batch_size / dup_elapsed:>10,.0f} leads/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LeadDB.add_leads insert throughput")
+    parser.add_argument("--existing", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--batch", type=int, default=50_000)
+    args = parser.parse_args()
+    run(args.existing, args.batch)
@@ -0,0 +1,66 @@
+# Benchmark: active-queue operations before and after archiving the terminal leads of a
+# seeded fixture (the suite's), plus the archival rate itself
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import LeadDB
+from logic.enricher import enrich_many
+from logic.generator import generate_leads_fast
+from suite import build_fixture
+
+def best_ms(fn, rounds):
+    best = float("inf")
+    for i in range(rounds):
+        start = time.perf_counter()
+        fn(i)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def queue_ops(db, batch, rounds, seed):
+    """Best-of-`rounds` latency (ms) of the operations the pipeline runs all the time."""
+    def enrich(i):
+        leads = db.claim_batch("enrich", batch, "bench", columns=("id", "industry", "role"))
+        db.update_enrichment_many([(lead["id"], e) for lead, e in zip(leads, enrich_many(leads))])
+
+    return {
+        "generate": best_ms(lambda i: db.add_leads(lead for shard in generate_leads_fast(batch, seed=seed + i, processes=1) for lead in shard), rounds),
+        "enrich": best_ms(enrich, rounds),
+        "claim message": best_ms(lambda i: db.claim_batch("message", batch, f"bench-{i}", lease_seconds=0), rounds),
+        "stats": best_ms(lambda i: db.get_stats(), rounds),
+        "page": best_ms(lambda i: db.page_leads(100, columns=("id", "full_name", "status")), rounds),
+        "page status": best_ms(lambda i: db.page_leads(100, status="NEW", sort="company_name", columns=("id",)), rounds),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot-table operations before/after archiving terminal leads")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    fixture = build_fixture(args.size, args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "leads.db")
+        shutil.copyfile(fixture, path)
+        db = LeadDB(path)
+        before = queue_ops(db, args.batch, args.rounds, args.seed + 100)
+        start = time.perf_counter()
+        result = db.archive_leads(older_than_days=0, batch_size=args.batch)
+        elapsed = time.perf_counter() - start
+        print(f"archived {result['archived']:,} leads in {elapsed:.1f}s ({result['archived'] / elapsed:,.0f}/s); "
+              f"hot {result['hot_leads']:,}, archive {result['archived_leads']:,}")
+        after = queue_ops(db, args.batch, args.rounds, args.seed + 200)
+        db.close()
+    for name in before:
+        print(f"{name:<14} {before[name]:9.2f} ms -> {after[name]:9.2f} ms  ({(after[name] / before[name] - 1) * 100:+6.1f}%)")
+
+if __name__ == "__main__":
+    main()
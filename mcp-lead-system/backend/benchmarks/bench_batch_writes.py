@@ -0,0 +1,53 @@
+# Benchmark: per-lead commits (legacy) vs. LeadDB batch write APIs
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import LeadDB
+from logic.generator import generate_leads_logic
+from logic.enricher import enrich_lead_logic
+
+def legacy_enrich(path, updates):
+    """The pre-batch code path: default pragmas (rollback journal) and one commit per lead."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    for lead_id, data in updates:
+        conn.execute("UPDATE leads SET enrichment_data = ?, status = 'ENRICHED', last_updated = CURRENT_TIMESTAMP WHERE id = ?", (json.dumps(data), lead_id))
+        conn.commit()
+    conn.close()
+
+def run(count):
+    leads = generate_leads_logic(count, seed=42)
+    with tempfile.TemporaryDirectory() as tmp:
+        for label in ("legacy", "batch"):
+            database.DB_PATH = os.path.join(tmp, f"{label}.db")
+            db = LeadDB()
+            db.add_leads(leads)
+            pending = db.get_leads_by_status("NEW", count, columns=("id", "industry", "role"))
+            updates = [(lead["id"], enrich_lead_logic(lead)) for lead in pending]
+
+            start = time.perf_counter()
+            if label == "legacy":
+                db.close()
+                legacy_enrich(database.DB_PATH, updates)
+            else:
+                db.update_enrichment_many(updates)
+                db.update_status_many([(lead_id, "SENT", "bench") for lead_id, _ in updates])
+                db.close()
+            elapsed = time.perf_counter() - start
+            writes = len(updates) * (1 if label == "legacy" else 2)
+            print(f"{label:>6}: {writes:>6,} lead writes in {elapsed:7.3f}s  ->  {writes / elapsed:>10,.0f} leads/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-lead commit vs. batched write throughput")
+    parser.add_argument("--count", type=int, default=5000)
+    args = parser.parse_args()
+    run(args.count)
@@ -0,0 +1,65 @@
+# Benchmark: N worker processes draining the enrich queue through claim_batch
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from itertools import chain
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import LeadDB
+from logic.enricher import enrich_many
+from logic.generator import generate_leads_fast
+
+def worker(path, worker_id, batch_size, work_latency):
+    """Claims batches until the queue is empty; `work_latency` stands in for the model/API call."""
+    database.DB_PATH = path
+    db = LeadDB()
+    done = []
+    while True:
+        leads = db.claim_batch("enrich", batch_size, worker_id, columns=("id", "industry", "role"))
+        if not leads:
+            break
+        time.sleep(work_latency)
+        db.update_enrichment_many([(lead["id"], e) for lead, e in zip(leads, enrich_many(leads))])
+        done += [lead["id"] for lead in leads]
+    db.close()
+    return done
+
+def run(count, workers, batch_size, work_latency):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "leads.db")
+        db = LeadDB()
+        db.add_leads(chain.from_iterable(generate_leads_fast(count, seed=42)))
+        db.close()
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            # Warm up the pool so process start-up is not timed
+            pool.map(time.sleep, [0] * workers)
+            start = time.perf_counter()
+            done = pool.starmap(worker, [(database.DB_PATH, f"bench-{i}", batch_size, work_latency) for i in range(workers)])
+            elapsed = time.perf_counter() - start
+    ids = [i for worker_ids in done for i in worker_ids]
+    return elapsed, len(ids), len(ids) - len(set(ids))
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process stage draining with lease-based claims")
+    parser.add_argument("--count", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--work-latency", type=float, default=0.05, help="simulated work per batch (s)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in args.workers:
+        elapsed, processed, duplicates = run(args.count, workers, args.batch_size, args.work_latency)
+        rate = processed / elapsed
+        baseline = baseline or rate
+        print(f"workers={workers:>3}  processed={processed:>7,}  duplicates={duplicates}  {elapsed:6.2f}s  ->  "
+              f"{rate:>8,.0f} leads/s  ({rate / baseline:4.1f}x)")
+
+if __name__ == "__main__":
+    main()
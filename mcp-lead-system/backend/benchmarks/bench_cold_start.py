@@ -0,0 +1,121 @@
+# Benchmark: cold start. Fresh interpreters time the imports of each entry module and the
+# API's time to first served request, against the floor of a one-route FastAPI app;
+# --profile breaks one import down by module (the startup-profiling mode)
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# What short-lived workers and CLI invocations import
+MODULES = ("service", "mcp_server", "api_bridge")
+# /jobs touches no lead data; /leads needs the database
+REQUESTS = ("/jobs", "/leads?limit=100")
+# The goal was half the time to the first served request. The worker and CLI entry modules
+# (service, mcp_server) get there; the API does not, because a bare FastAPI app alone takes
+# more than half of what the API used to (about 870ms to first request before lazy
+# initialization, 470-600ms for the bare app, on a 1-CPU box). For the API the targets are
+# set on the share this app adds on top of the bare app: half of what it was before (about
+# 250-270ms for /jobs and 270-280ms for /leads, as measured here). Of what is left, about
+# 30ms is FastAPI loading pydantic.v1 to check route parameters and 30ms is registering the
+# routes, both paid by any app with this many parameterized routes; the app's own modules
+# take under 15ms. Both shares sit at their targets, and runs on a busy box miss them.
+TARGET_OVERHEAD_MS = {"/jobs": 125, "/leads?limit=100": 135}
+# The floor: a FastAPI app with one route
+BARE_APP = '''
+from fastapi import FastAPI
+app = FastAPI()
+app.get("/ping")(lambda: {"ok": True})
+'''
+# A fresh interpreter imports the app and serves it one request, ASGI-direct: no server or
+# HTTP client library in the timing, only what a worker pays before its first response
+CHILD = '''
+import asyncio
+from {module} import app
+
+async def first_request():
+    sent = []
+    async def receive():
+        return {{"type": "http.request", "body": b"", "more_body": False}}
+    async def send(message):
+        sent.append(message)
+    path, _, query = {target!r}.partition("?")
+    await app({{"type": "http", "asgi": {{"version": "3.0"}}, "http_version": "1.1", "method": "GET", "scheme": "http",
+               "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+               "headers": [(b"host", b"localhost")], "client": ("127.0.0.1", 1), "server": ("localhost", 80)}},
+              receive, send)
+    assert sent[0]["status"] == 200, sent[0]
+
+asyncio.run(first_request())
+'''
+
+def import_ms(module, env):
+    """Wall time (ms) of a fresh interpreter that imports `module` and exits."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=BACKEND, env=env, check=True)
+    return (time.perf_counter() - start) * 1000
+
+def first_request_ms(target, env, module="api_bridge", cwd=BACKEND):
+    """Wall time (ms) of a fresh interpreter that imports `module` and answers GET `target`."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", CHILD.format(module=module, target=target)], cwd=cwd, env=env, check=True)
+    return (time.perf_counter() - start) * 1000
+
+def profile(module, env, top):
+    """-X importtime for one import: the slowest modules by cumulative and by self time."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BACKEND, env=env,
+                         capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000, (len(name) - len(name.lstrip())) // 2))
+    total = next(r[2] for r in rows if r[0] == module)
+    print(f"import {module}: {total:.1f} ms ({len(rows)} modules)")
+    for label, key in (("cumulative", 2), ("self", 1)):
+        print(f"\nslowest by {label} time:")
+        for name, self_ms, cumulative_ms, depth in sorted(rows, key=lambda r: -r[key])[:top]:
+            print(f"  {cumulative_ms:8.1f} ms cumulative  {self_ms:7.1f} ms self  {'  ' * depth}{name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start time of the entry modules and of the API's first request")
+    parser.add_argument("--repeat", type=int, default=7, help="fresh processes per timing")
+    parser.add_argument("--profile", metavar="MODULE", help="per-module import times for MODULE instead")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A database that already exists, like a worker restarting against the shared file
+        path = os.path.join(tmp, "leads.db")
+        # Bytecode is cached (in the temp dir) even where PYTHONDONTWRITEBYTECODE is set, as on a deployed worker
+        env = {**os.environ, "DB_PATH": path, "PYTHONPYCACHEPREFIX": os.path.join(tmp, "pycache")}
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        subprocess.run([sys.executable, "-c", "from database import LeadDB; LeadDB().close()"], cwd=BACKEND, env=env, check=True)
+        # Import timings are the best of --repeat fresh processes, which keeps the run that
+        # writes the bytecode cache and scheduler noise out
+        if args.profile:
+            profile(args.profile, env, args.top)
+            return
+        baseline = min(import_ms("sys", env) for _ in range(args.repeat))
+        print(f"{'interpreter only':<28} {baseline:8.1f} ms")
+        for module in MODULES:
+            print(f"{'import ' + module:<28} {min(import_ms(module, env) for _ in range(args.repeat)):8.1f} ms")
+        with open(os.path.join(tmp, "bare_app.py"), "w") as f:
+            f.write(BARE_APP)
+        floors = [first_request_ms("/ping", env, "bare_app", tmp) for _ in range(args.repeat)]
+        print(f"{'first GET, bare FastAPI':<28} {min(floors):8.1f} ms")
+        for path in REQUESTS:
+            # The app share is the median over back-to-back (app, bare app) pairs: a slow
+            # moment on the box lands on both runs of a pair instead of on the difference
+            pairs = [(first_request_ms(path, env), first_request_ms("/ping", env, "bare_app", tmp)) for _ in range(args.repeat)]
+            overhead, target = statistics.median(app - bare for app, bare in pairs), TARGET_OVERHEAD_MS[path]
+            print(f"{'first GET ' + path:<28} {min(app for app, _ in pairs):8.1f} ms  app share {overhead:6.1f} ms "
+                  f"(target < {target} ms: {'met' if overhead < target else 'MISSED'})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Benchmark: segment queries via typed, indexed enrichment columns vs. Python-side JSON scans
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import LeadDB
+
+# Set-based fill: enriched leads across 6 industries, 3 personas and confidence 70-99
+FILL_SQL = '''
+WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+INSERT INTO leads (full_name, company_name, role, industry, email, status, logs,
+                   persona, company_size, confidence_score, buying_trigger, pain_point, enrichment_source, enrichment_data)
+SELECT 'Lead ' || i, 'Company ' || i, 'Role', industry, 'lead' || i || '@example.com', 'ENRICHED', '',
+       persona, '51-200', confidence, 'Growth', 'Churn', 'AI',
+       json_object('persona', persona, 'company_size', '51-200', 'confidence_score', confidence,
+                   'buying_trigger', 'Growth', 'pain_points', json_array('Churn'), 'enrichment_source', 'AI')
+FROM (
+    SELECT i,
+           CASE i % 6 WHEN 0 THEN 'SaaS' WHEN 1 THEN 'FinTech' WHEN 2 THEN 'Healthcare'
+                      WHEN 3 THEN 'Manufacturing' WHEN 4 THEN 'E-commerce' ELSE 'Biotech' END AS industry,
+           CASE (i / 6) % 3 WHEN 0 THEN 'Decision Maker' WHEN 1 THEN 'Operational Manager' ELSE 'Individual Contributor' END AS persona,
+           70 + (i * 7919) % 30 AS confidence
+    FROM n
+)
+'''
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def fill(db, count):
+    with db.write() as conn:
+        conn.execute(FILL_SQL, (count,))
+
+def python_scan(db):
+    """The pre-column approach: fetch every enrichment blob and filter/aggregate in Python."""
+    with db.read() as conn:
+        rows = conn.execute("SELECT id, industry, enrichment_data FROM leads").fetchall()
+    matches, personas = [], {}
+    for row in rows:
+        data = json.loads(row["enrichment_data"])
+        personas[data["persona"]] = personas.get(data["persona"], 0) + 1
+        if row["industry"] == "FinTech" and data["persona"] == "Decision Maker" and data["confidence_score"] >= 90:
+            matches.append(row["id"])
+    return len(matches), personas
+
+def main():
+    parser = argparse.ArgumentParser(description="Segment queries on typed enrichment columns")
+    parser.add_argument("--count", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "leads.db")
+        db = LeadDB()
+        _, fill_elapsed = timed(lambda: fill(db, args.count))
+        print(f"filled {args.count:,} enriched leads in {fill_elapsed:.1f}s")
+
+        (scan_matches, scan_personas), scan_elapsed = timed(lambda: python_scan(db))
+        found, query_elapsed = timed(lambda: db.page_leads(args.count, industry="FinTech", persona="Decision Maker", min_confidence=90, columns=("id",))[0])
+        segments, segment_elapsed = timed(lambda: db.segment_stats(("persona",)))
+        with db.read() as conn:
+            plan = " | ".join(row[3] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM leads WHERE industry = 'FinTech' AND persona = 'Decision Maker' AND confidence_score >= 90"))
+        db.close()
+
+    assert scan_matches == len(found) and scan_personas == {row["persona"]: row["count"] for row in segments}
+    print(f"python JSON scan : filter + aggregate        {scan_elapsed:7.3f}s  ({scan_matches:,} matches)")
+    print(f"page_leads       : FinTech DMs, conf >= 90  {query_elapsed:7.3f}s  ->  {scan_elapsed / query_elapsed:,.0f}x faster")
+    print(f"segment_stats    : count per persona        {segment_elapsed:7.3f}s")
+    print(f"query plan       : {plan}")
+
+if __name__ == "__main__":
+    main()
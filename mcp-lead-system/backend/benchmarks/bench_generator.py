@@ -0,0 +1,46 @@
+# Benchmark: legacy per-lead Faker generator vs. sharded high-throughput generator
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from itertools import chain
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import LeadDB
+from logic.generator import generate_leads_logic, generate_leads_fast
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic lead generation throughput")
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--legacy-count", type=int, default=20_000, help="legacy path is slow; sample a smaller run")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--shards", type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generate_leads_logic(args.legacy_count, seed=42)
+    elapsed = time.perf_counter() - start
+    print(f"legacy           : {args.legacy_count:>9,} leads  {elapsed:7.2f}s  ->  {args.legacy_count / elapsed:>9,.0f} leads/s")
+
+    for processes in sorted(set(args.processes)):
+        start = time.perf_counter()
+        total = sum(len(shard) for shard in generate_leads_fast(args.count, 42, shards=args.shards, processes=processes))
+        elapsed = time.perf_counter() - start
+        print(f"fast (procs={processes:>2}) : {total:>9,} leads  {elapsed:7.2f}s  ->  {total / elapsed:>9,.0f} leads/s")
+
+    # End to end: generate and stream into the bulk insert
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        db = LeadDB()
+        start = time.perf_counter()
+        added = db.add_leads(chain.from_iterable(generate_leads_fast(args.count, 42, shards=args.shards)))
+        elapsed = time.perf_counter() - start
+        db.close()
+    print(f"fast + insert    : {added:>9,} added  {elapsed:7.2f}s  ->  {added / elapsed:>9,.0f} leads/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Report: on-disk size and read latency of full message texts vs. template references
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from itertools import chain
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import LeadDB
+from logic.enricher import enrich_many
+from logic.generator import generate_leads_fast
+from logic.messaging import DEFAULT_RENDERER
+
+MESSAGE_COLUMNS = ("id", "email", "email_content_a", "email_content_b", "linkedin_content_a", "linkedin_content_b")
+
+def file_size(path):
+    """Main file size after folding the WAL back in and reclaiming free pages."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(path)
+
+def read_latency(db, count, page_size):
+    """Seconds to page through every MESSAGED lead with its four messages."""
+    start = time.perf_counter()
+    rows = sum(1 for _ in db.iter_leads_by_status("MESSAGED", page_size, columns=MESSAGE_COLUMNS))
+    assert rows == count
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Message storage: full texts vs. template references")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "leads.db")
+        db = LeadDB()
+        count = db.add_leads(chain.from_iterable(generate_leads_fast(args.count, seed=42)))
+        pending = db.get_leads_by_status("NEW", args.count, columns=("id", "industry", "role", "company_name"))
+        db.update_enrichment_many(zip((lead["id"] for lead in pending), enrich_many(pending)))
+        # Legacy layout: four full texts per lead
+        messages, _ = DEFAULT_RENDERER.render_many(db.get_message_inputs(args.count))
+        db.update_messages_many(messages)
+
+        report = {"full texts": (file_size(database.DB_PATH), read_latency(db, count, args.page_size))}
+        start = time.perf_counter()
+        result = db.migrate_message_bodies()
+        migrate_elapsed = time.perf_counter() - start
+        report["references"] = (file_size(database.DB_PATH), read_latency(db, count, args.page_size))
+        db.close()
+
+    print(f"migration: {result['converted']:,} converted, {result['kept']:,} kept as text in {migrate_elapsed:.2f}s")
+    for label, (size, elapsed) in report.items():
+        print(f"{label:<11}: {size / 2**20:8.1f} MiB on disk  read {count:,} leads with messages in {elapsed:6.2f}s  ->  {count / elapsed:>10,.0f} rows/s")
+    print(f"size ratio : {report['full texts'][0] / report['references'][0]:.2f}x smaller")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Benchmark: per-lead JSON decoding + inline f-strings (legacy) vs. compiled batch rendering
+
+import argparse
+import json
+import os
+import sys
+import time
+from itertools import chain
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logic.enricher import enrich_many
+from logic.generator import generate_leads_fast
+from logic.messaging import DEFAULT_RENDERER
+
+def legacy_render(lead):
+    """The original generate_messages_batch loop body (JSON parsing and four f-strings)."""
+    try:
+        enrichment = json.loads(lead["enrichment_data"]) if lead["enrichment_data"] else {}
+        if isinstance(enrichment, str):
+            enrichment = json.loads(enrichment)
+    except (TypeError, json.JSONDecodeError):
+        enrichment = {}
+    pain_points = enrichment.get("pain_points", [])
+    pain = pain_points[0] if pain_points else "efficiency"
+    trigger = enrichment.get("buying_trigger", "growth")
+    return {
+        "email_a": (f"Hi {lead['full_name'].split()[0]},\n\nI noticed {lead['company_name']} might be navigating {pain} challenges. "
+                    f"We help {lead['industry']} leaders streamline operations to solve exactly this.\n\n"
+                    f"Are you open to a 15-minute call next Tuesday to discuss?\n\nBest,\n[Your Name]"),
+        "email_b": (f"Hi {lead['full_name']},\n\nSaw the news about your {trigger} - congratulations.\n"
+                    f"As a {lead['role']}, you likely care about avoiding {pain}.\n\n"
+                    f"Do you have 15 minutes this week for a quick intro?\n\nCheers,\n[Your Name]"),
+        "linkedin_a": f"Hi {lead['full_name'].split()[0]}, would love to connect and share how we solve {pain} for {lead['industry']} teams. Open to chatting?",
+        "linkedin_b": f"Hi {lead['full_name']}, saw {lead['company_name']} is in {lead['industry']}. We help peers tackle {pain}. Let's connect.",
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Message rendering throughput")
+    parser.add_argument("--count", type=int, default=100_000)
+    args = parser.parse_args()
+
+    leads = list(chain.from_iterable(generate_leads_fast(args.count, seed=42)))
+    enrichments = enrich_many(leads)
+    # What each path receives from the database: the stored JSON vs. the extracted fields
+    stored = [dict(lead, id=i, enrichment_data=json.dumps(e)) for i, (lead, e) in enumerate(zip(leads, enrichments))]
+    typed = [dict(lead, id=i, pain=e["pain_points"][0], trigger=e["buying_trigger"]) for i, (lead, e) in enumerate(zip(leads, enrichments))]
+
+    start = time.perf_counter()
+    legacy = [legacy_render(lead) for lead in stored]
+    legacy_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    messages, rejected = DEFAULT_RENDERER.render_many(typed)
+    elapsed = time.perf_counter() - start
+
+    assert not rejected and legacy == [msgs for _, msgs in messages], "templates must match the legacy output"
+    print(f"legacy per-lead  : {args.count:>8,} leads  {legacy_elapsed:6.2f}s  ->  {args.count / legacy_elapsed:>10,.0f} leads/s  ({4 * args.count / legacy_elapsed:,.0f} messages/s)")
+    print(f"render_many      : {args.count:>8,} leads  {elapsed:6.2f}s  ->  {args.count / elapsed:>10,.0f} leads/s  ({4 * args.count / elapsed:,.0f} messages/s, checks included)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Benchmark: fused pipeline run time with instrumentation off, on, and on with a per-batch trace
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# METRICS_* are read at import time, so every setting runs in a fresh interpreter
+CHILD = '''
+import asyncio, json, os, sys, tempfile
+sys.path.insert(0, {backend!r})
+import database
+with tempfile.TemporaryDirectory() as tmp:
+    database.DB_PATH = os.path.join(tmp, "leads.db")
+    from database import LeadDB
+    from pipeline import PipelineRunner
+    db = LeadDB()
+    result = asyncio.run(PipelineRunner(db, batch_size={batch_size}).run({count}, seed=42, dry_run=True))
+    db.close()
+print(json.dumps(result["elapsed_seconds"]))
+'''
+
+def run(count, batch_size, env):
+    code = CHILD.format(backend=BACKEND, count=count, batch_size=batch_size)
+    out = subprocess.run([sys.executable, "-c", code], env={**os.environ, **env}, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Instrumentation overhead on the fused pipeline (dry run)")
+    parser.add_argument("--count", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs per setting")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings = {
+            "disabled": {"METRICS_ENABLED": "0"},
+            "enabled": {"METRICS_ENABLED": "1"},
+            "traced": {"METRICS_ENABLED": "1", "METRICS_TRACE": os.path.join(tmp, "trace.jsonl")},
+        }
+        baseline = None
+        for label, env in settings.items():
+            elapsed = min(run(args.count, args.batch_size, env) for _ in range(args.repeat))
+            baseline = baseline or elapsed
+            print(f"{label:<9}: {elapsed:6.2f}s  ->  {args.count / elapsed:>8,.0f} leads/s  ({(elapsed / baseline - 1) * 100:+5.1f}%)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Benchmark: async outreach engine throughput against the local simulated channel
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logic.outreach import OutreachEngine
+from logic.rate_limiter import RateLimiter
+from logic.sender import SimulatedChannel
+
+def make_leads(count):
+    return [{"id": i, "email": f"lead{i}@example.com", "email_content_a": "Hi there"} for i in range(count)]
+
+async def run_once(leads, concurrency, latency, failure_rate, rate_per_minute):
+    engine = OutreachEngine(
+        dry_run=False, concurrency=concurrency,
+        rate_limiter=RateLimiter(rate_per_minute, capacity=max(1, concurrency)),
+        transport=SimulatedChannel(latency=latency, failure_rate=failure_rate, seed=1),
+        base_backoff=latency, seed=1,
+    )
+    start = time.perf_counter()
+    results = await engine.run(leads)
+    elapsed = time.perf_counter() - start
+    sent = sum(1 for _, status, *_ in results if status == "SENT")
+    return elapsed, sent, engine.retries
+
+def main():
+    parser = argparse.ArgumentParser(description="Async outreach throughput (simulated SMTP/LinkedIn)")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated per-send latency (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--rate-per-minute", type=float, default=None, help="token bucket rate (default: unlimited)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 200])
+    args = parser.parse_args()
+
+    leads = make_leads(args.count)
+    for concurrency in args.concurrency:
+        elapsed, sent, retries = asyncio.run(
+            run_once(leads, concurrency, args.latency, args.failure_rate, args.rate_per_minute)
+        )
+        print(f"concurrency={concurrency:>4}  sent={sent:>6,}/{args.count:,}  retries={retries:>5,}  "
+              f"{elapsed:7.2f}s  ->  {args.count / elapsed:>8,.0f} leads/s")
+
+if __name__ == "__main__":
+    main()
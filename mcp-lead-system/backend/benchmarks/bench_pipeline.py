@@ -0,0 +1,76 @@
+# Benchmark: four sequential stage calls vs. the fused streaming pipeline runner
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import LeadDB
+from logic.enricher import enrich_many
+from logic.generator import generate_leads_fast
+from logic.messaging import DEFAULT_RENDERER
+from logic.outreach import OutreachEngine
+from logic.rate_limiter import RateLimiter
+from logic.sender import SimulatedChannel
+from pipeline import PipelineRunner, _percentile
+
+def sequential(db, count, batch_size, latency, concurrency):
+    """generate, then enrich, then message, then send: each stage drains the whole queue first."""
+    start = time.perf_counter()
+    db.add_leads(lead for shard in generate_leads_fast(count, seed=42, processes=1) for lead in shard)
+    for lead_page in iter(lambda: db.get_leads_by_status("NEW", batch_size, columns=("id", "industry", "role", "company_name")), []):
+        db.update_enrichment_many(zip((lead["id"] for lead in lead_page), enrich_many(lead_page)))
+    set_id = db.template_set_id(DEFAULT_RENDERER.assignment())
+    for page in iter(lambda: db.get_message_inputs(batch_size), []):
+        params, rejected = DEFAULT_RENDERER.check_many(page)
+        db.update_message_refs_many(set_id, params)
+        if rejected:
+            db.update_status_many([(lead_id, "FAILED", reason) for lead_id, reason in rejected], stage="message")
+
+    transport = SimulatedChannel(latency=latency, failure_rate=0, seed=1)
+    latencies = []
+    for page in iter(lambda: db.get_leads_by_status("MESSAGED", batch_size, columns=("id", "email", "email_content_a")), []):
+        engine = OutreachEngine(dry_run=False, concurrency=concurrency, rate_limiter=RateLimiter(None), transport=transport)
+        results = asyncio.run(engine.run(page))
+        db.update_status_many(results, events=engine.events)
+        # Every lead entered at the start; it is done when its send is checkpointed
+        latencies += [time.perf_counter() - start] * len(results)
+    return time.perf_counter() - start, latencies
+
+def fused(db, count, batch_size, latency, concurrency, send_workers):
+    runner = PipelineRunner(db, batch_size=batch_size, workers={"send": send_workers},
+                            transport=SimulatedChannel(latency=latency, failure_rate=0, seed=1))
+    # rate_per_minute=0 disables the live-mode rate limit, as RateLimiter(None) does above
+    result = asyncio.run(runner.run(count, seed=42, dry_run=False, concurrency=concurrency, rate_per_minute=0))
+    return result["elapsed_seconds"], runner.latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential stages vs. fused pipeline (simulated send latency)")
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated per-send latency (s)")
+    parser.add_argument("--concurrency", type=int, default=50, help="in-flight sends per batch")
+    parser.add_argument("--send-workers", type=int, default=2)
+    args = parser.parse_args()
+
+    runs = {
+        "sequential": lambda db: sequential(db, args.count, args.batch_size, args.latency, args.concurrency),
+        "fused": lambda db: fused(db, args.count, args.batch_size, args.latency, args.concurrency, args.send_workers),
+    }
+    for label, run in runs.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DB_PATH = os.path.join(tmp, "leads.db")
+            db = LeadDB()
+            elapsed, latencies = run(db)
+            stats = db.get_stats()
+            db.close()
+        print(f"{label:<10}: {elapsed:6.2f}s  ->  {args.count / elapsed:>8,.0f} leads/s  "
+              f"latency p50={_percentile(latencies, 50):6.2f}s p99={_percentile(latencies, 99):6.2f}s  {stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Benchmark: draining sends at a 10% failure rate, inline retries vs. the persistent retry schedule
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from database import LeadDB
+from logic.outreach import OutreachEngine, RETRY_POLICIES
+from logic.rate_limiter import RateLimiter
+from logic.sender import SimulatedChannel
+from retry_scheduler import RetryScheduler
+
+SEND_COLUMNS = ("id", "email", "email_content_a")
+
+def fill(db, count):
+    with db.write() as conn:
+        conn.execute('''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        INSERT INTO leads (full_name, company_name, role, industry, email, status, email_content_a)
+        SELECT 'Lead ' || i, 'Company ' || i, 'CTO', 'SaaS', 'lead' || i || '@example.com', 'MESSAGED', 'Hi there?'
+        FROM n
+        ''', (count,))
+
+def inline(db, batch_size, options, backoff):
+    """The old send path: every batch waits for its slowest lead's retries."""
+    while True:
+        leads = db.claim_batch("send", batch_size, "bench", columns=SEND_COLUMNS)
+        if not leads:
+            return
+        engine = OutreachEngine(base_backoff=backoff, max_backoff=backoff * 30, **options)
+        results = asyncio.run(engine.run(leads))
+        db.update_status_many(results, events=engine.events)
+
+def scheduled(db, batch_size, options, backoff):
+    """One attempt per lead on the send path; the scheduler works due retries alongside."""
+    policies = {**RETRY_POLICIES, "transient": {**RETRY_POLICIES["transient"], "base_backoff": backoff, "max_backoff": backoff * 30}}
+
+    async def run():
+        stop = asyncio.Event()
+        scheduler = RetryScheduler(db, "bench-retry", batch_size, poll_interval=backoff, policies=policies, **options)
+        retries = asyncio.create_task(scheduler.run(stop))
+        while True:
+            leads = await asyncio.to_thread(db.claim_batch, "send", batch_size, "bench", columns=SEND_COLUMNS)
+            if not leads:
+                break
+            engine = OutreachEngine(schedule_retries=True, policies=policies, **options)
+            await asyncio.to_thread(db.update_status_many, await engine.run(leads))
+        stop.set()
+        await retries
+    asyncio.run(run())
+
+def main():
+    parser = argparse.ArgumentParser(description="Send drain time with inline vs. scheduled retries")
+    parser.add_argument("--count", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated per-send latency (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--backoff", type=float, default=0.2, help="base retry backoff (s)")
+    args = parser.parse_args()
+
+    for label, drain in (("inline", inline), ("scheduled", scheduled)):
+        options = dict(dry_run=False, concurrency=args.concurrency, rate_limiter=RateLimiter(None), seed=1,
+                       transport=SimulatedChannel(latency=args.latency, failure_rate=args.failure_rate, seed=1))
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DB_PATH = os.path.join(tmp, "leads.db")
+            db = LeadDB()
+            fill(db, args.count)
+            start = time.perf_counter()
+            drain(db, args.batch_size, options, args.backoff)
+            elapsed = time.perf_counter() - start
+            stats = db.get_stats()
+            db.close()
+        print(f"{label:<9}: drained {args.count:,} sends in {elapsed:6.2f}s  ->  {args.count / elapsed:>8,.0f} leads/s  {stats}")
+
+if __name__ == "__main__":
+    main()
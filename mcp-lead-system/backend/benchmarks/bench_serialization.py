@@ -0,0 +1,73 @@
+# Benchmark: serialization CPU and bytes on the wire for /leads pages and stage results,
+# the old dumps -> loads -> jsonable_encoder -> json path against encoding.dumps (+ gzip/brotli)
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from database import LeadDB
+import encoding
+import responses
+from suite import build_fixture
+
+def best_us(fn, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+def leads_payload(db, limit, columns=None):
+    """The body GET /leads builds for one page."""
+    leads, cursor = db.page_leads(limit, columns=columns)
+    return {"leads": leads, "next_cursor": cursor, "has_more": cursor is not None, "total": db.count_leads(),
+            "stats": db.get_stats(), "industry_stats": db.get_industry_stats(), "throughput": db.get_throughput(),
+            "version": db.current_version()}
+
+def before_route(payload):
+    """A route returning a dict: FastAPI's jsonable_encoder pass, then the stdlib-json JSONResponse."""
+    return StarletteJSONResponse(jsonable_encoder(payload)).body
+
+def before_stage(result):
+    """A stage result: the MCP tool's json.dumps, the bridge's json.loads, then the route path."""
+    return before_route(json.loads(json.dumps(result)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Response serialization: old path vs encoding.dumps, and compressed sizes")
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    db = LeadDB(build_fixture(args.size, args.seed))
+    payloads = {
+        "/leads limit=500": (leads_payload(db, 500), before_route),
+        "/leads limit=100 table": (leads_payload(db, 100, ("id", "full_name", "email", "company_name", "status")), before_route),
+        "/leads?since (1000)": ({"leads": db.get_changes(0, None, 1000), "stats": db.get_stats()}, before_route),
+        "/agent/send result": ({"status": "complete", "sent": 981, "failed": 12, "retries": 7, "mode": "DRY RUN"}, before_stage),
+    }
+    db.close()
+    print(f"encoder: {'orjson' if encoding.orjson else 'json'}; brotli {'available' if responses.brotli else 'not installed'}")
+    print(f"{'payload':<24} {'before':>10} {'after':>10} {'change':>8}   {'bytes':>9} {'gzip':>8} {'gzip cpu':>9} {'brotli':>8}")
+    for name, (payload, before) in payloads.items():
+        old = best_us(lambda: before(payload), args.rounds)
+        new = best_us(lambda: encoding.dumps(payload), args.rounds)
+        body = encoding.dumps(payload)
+        assert json.loads(body) == json.loads(before(payload))
+        compressed = len(body) >= responses.COMPRESS_MIN_BYTES
+        gzipped = len(gzip.compress(body, responses.GZIP_LEVEL)) if compressed else len(body)
+        gzip_us = best_us(lambda: gzip.compress(body, responses.GZIP_LEVEL), args.rounds) if compressed else 0
+        brotlied = len(responses.brotli.compress(body, quality=responses.BROTLI_QUALITY)) if responses.brotli and compressed else None
+        print(f"{name:<24} {old:8.0f}us {new:8.0f}us {(new / old - 1) * 100:+7.1f}%   {len(body):>9,} {gzipped:>8,} {gzip_us:7.0f}us "
+              f"{brotlied if brotlied is not None else '-':>8}")
+
+if __name__ == "__main__":
+    main()
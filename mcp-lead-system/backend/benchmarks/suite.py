@@ -0,0 +1,282 @@
+# Benchmark suite: every pipeline stage, /leads, /export/csv and archival on seeded
+# 10k/100k/1M-lead fixtures, written as JSON and gated against a stored baseline
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+FIXTURE_DIR = os.path.join(tempfile.gettempdir(), "leadgen-bench-fixtures")
+STORAGES = ("memory", "tmpfs", "file")
+TMPFS_DIR = "/dev/shm"
+# Share of fixture leads past each stage: 75% enriched, 50% messaged, 25% sent
+FIXTURE_MIX = {"enrich": 0.75, "message": 0.5, "send": 0.25}
+FIXTURE_BATCH = 10_000
+# Page reads are short and leave the data unchanged, so they get more rounds
+READ_ROUNDS = 5
+# What the dashboard's table asks for
+PAGE_COLUMNS = "id,full_name,email,company_name,website,role,country,industry,status,linkedin_url"
+# Rows per round of the reference workload
+REFERENCE_ROWS = 2000
+
+def schema_digest():
+    """Short hash of the schema this tree creates (tables, indexes, triggers)."""
+    from database import LeadDB
+    db = LeadDB(":memory:")
+    with db.read() as conn:
+        schema = "\n".join(sql for (sql,) in conn.execute("SELECT sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY name"))
+    db.close()
+    return hashlib.sha1(schema.encode()).hexdigest()[:12]
+
+def fixture_path(size, seed):
+    # Keyed by schema: a fixture migrated by another tree keeps that tree's triggers and
+    # indexes (and their write costs), so it is never shared between schemas
+    return os.path.join(FIXTURE_DIR, f"leads-{size}-seed{seed}-{schema_digest()}.db")
+
+def build_fixture(size, seed):
+    """
+    Seeded fixture database, built once per schema and cached: `size` generated leads of
+    which a fixed share has been enriched, messaged and sent, so every stage and read path
+    has data.
+    """
+    from database import LeadDB
+    path = fixture_path(size, seed)
+    if os.path.exists(path):
+        return path
+    from logic.enricher import enrich_many
+    from logic.generator import generate_leads_fast
+    from logic.messaging import DEFAULT_RENDERER
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    partial = path + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    db = LeadDB(partial)
+    db.add_leads(lead for shard in generate_leads_fast(size, seed=seed, processes=1) for lead in shard)
+    set_id = db.template_set_id(DEFAULT_RENDERER.assignment())
+    targets = {stage: int(size * share) for stage, share in FIXTURE_MIX.items()}
+    for stage in ("enrich", "message", "send"):
+        done = 0
+        while done < targets[stage]:
+            leads = db.claim_batch(stage, min(FIXTURE_BATCH, targets[stage] - done), "fixture")
+            if not leads:
+                break
+            if stage == "enrich":
+                db.update_enrichment_many([(lead["id"], e) for lead, e in zip(leads, enrich_many(leads))])
+            elif stage == "message":
+                params, rejected = DEFAULT_RENDERER.check_many(leads)
+                db.update_message_refs_many(set_id, params)
+                if rejected:
+                    db.update_status_many([(lead_id, "FAILED", reason) for lead_id, reason in rejected], stage="message")
+            else:
+                db.update_status_many([(lead["id"], "SENT", "Fixture send.") for lead in leads])
+            done += len(leads)
+    db.close()
+    os.replace(partial, path)
+    return path
+
+def open_storage(storage, fixture, workdir):
+    """Points DB_PATH at a private copy of the fixture on the chosen storage."""
+    if storage == "memory":
+        os.environ["DB_PATH"] = ":memory:"
+        return
+    target_dir = TMPFS_DIR if storage == "tmpfs" else workdir
+    target = os.path.join(target_dir, f"leadgen-bench-{os.getpid()}.db")
+    shutil.copyfile(fixture, target)
+    os.environ["DB_PATH"] = target
+    return target
+
+def reference_round(i):
+    """
+    The reference workload: a fixed mix of SQLite writes and reads through an index and a
+    trigger, and the Python row handling around them, like the stages do. Returns rows.
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.executescript('''
+        CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT, status TEXT, n INTEGER);
+        CREATE INDEX idx_t_status ON t (status, id);
+        CREATE TABLE c (status TEXT PRIMARY KEY, count INTEGER);
+        CREATE TRIGGER trg_t AFTER UPDATE OF status ON t BEGIN
+            INSERT INTO c VALUES (NEW.status, 1) ON CONFLICT (status) DO UPDATE SET count = count + 1;
+        END;
+    ''')
+    with conn:
+        conn.executemany("INSERT INTO t (name, status, n) VALUES (?, 'NEW', ?)",
+                         ((f"lead {i} {n}", n * 7919 % 97) for n in range(REFERENCE_ROWS)))
+        conn.executemany("UPDATE t SET status = 'DONE' WHERE id = ?", ((n,) for n in range(1, REFERENCE_ROWS + 1, 2)))
+    rows = [dict(zip(("id", "name", "status", "n"), row)) for row in conn.execute("SELECT * FROM t WHERE status = 'DONE' ORDER BY id")]
+    json.dumps(rows)
+    conn.close()
+    return REFERENCE_ROWS
+
+def timed(name, size, items, fn, rounds):
+    """
+    Runs `fn` once to warm up, then `rounds` timed times; `items` turns its return value into
+    the work done. Each round is paired with a round of the reference workload right before
+    it, in the same process: `relative` is the median of the per-round ratios, so a slower
+    or momentarily busier machine moves both sides and cancels out. The gate compares
+    `relative`; `throughput` is the median round's, for reading.
+    """
+    reference_round(-1)
+    fn(-1)
+    done, seconds, rates, references = 0, 0.0, [], []
+    for i in range(rounds):
+        start = time.perf_counter()
+        references.append(reference_round(i) / (time.perf_counter() - start))
+        start = time.perf_counter()
+        result = fn(i)
+        elapsed = time.perf_counter() - start
+        n = items(result)
+        done += n
+        seconds += elapsed
+        rates.append(n / elapsed)
+    relative = statistics.median(rate / reference for rate, reference in zip(rates, references))
+    return {"name": name, "size": size, "rounds": rounds, "items": done, "seconds": round(seconds, 6),
+            "throughput": round(statistics.median(rates), 2), "reference": round(statistics.median(references), 2),
+            "relative": round(relative, 6)}
+
+def run_size(size, storage, seed, batch, rounds):
+    """Child process body: opens the fixture on `storage` and times every entry point once."""
+    fixture = fixture_path(size, seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        target = open_storage(storage, fixture, workdir)
+        # database reads DB_PATH at import; service opens its LeadDB there on first use
+        import service
+        from api_bridge import app
+        from fastapi.testclient import TestClient
+        if storage == "memory":
+            with service.get_db().write() as conn, sqlite3.connect(fixture) as source:
+                source.backup(conn)
+        # Dry-run sends log every lead at INFO; keep console I/O out of the timings
+        logging.getLogger().setLevel(logging.WARNING)
+        client = TestClient(app)
+
+        def stage(fn, **kwargs):
+            result = fn(**kwargs)
+            return asyncio.run(result) if asyncio.iscoroutine(result) else result
+
+        cursors = {}
+
+        def next_page(**params):
+            """The next page of a table view, following the cursor across rounds."""
+            key = tuple(sorted(params.items()))
+            cursor = {"cursor": cursors[key]} if cursors.get(key) else {}
+            response = client.get("/leads", params={"limit": 100, **cursor, **params})
+            cursors[key] = response.json()["next_cursor"]
+            return response
+
+        def export():
+            # Streamed like a real download; nothing is held beyond one chunk
+            with client.stream("GET", "/export/csv") as response:
+                for _ in response.iter_bytes():
+                    pass
+
+        results = [
+            timed("generate_leads", size, lambda r: r["generated"],
+                  lambda i: stage(service.generate_leads, count=batch, seed=seed + 1 + i, fast=True), rounds),
+            timed("enrich_leads_batch", size, lambda r: r["processed"],
+                  lambda i: stage(service.enrich_leads_batch, limit=batch), rounds),
+            timed("generate_messages_batch", size, lambda r: r["processed"],
+                  lambda i: stage(service.generate_messages_batch, limit=batch), rounds),
+            timed("send_outreach_batch", size, lambda r: r["sent"] + r["failed"] + r["retries"],
+                  lambda i: stage(service.send_outreach_batch, limit=batch, dry_run=True, concurrency=100), rounds),
+            timed("GET /leads", size, lambda r: len(r.json()["leads"]),
+                  lambda i: client.get("/leads", params={"limit": 500}), rounds * READ_ROUNDS),
+            timed("GET /leads?status", size, lambda r: len(r.json()["leads"]),
+                  lambda i: client.get("/leads", params={"limit": 500, "status": "MESSAGED"}), rounds * READ_ROUNDS),
+            timed("GET /leads?sort", size, lambda r: len(r.json()["leads"]),
+                  lambda i: next_page(sort="company_name", status="NEW", columns=PAGE_COLUMNS), rounds * READ_ROUNDS),
+            timed("GET /leads?q", size, lambda r: len(r.json()["leads"]),
+                  lambda i: next_page(q="jo", columns=PAGE_COLUMNS), rounds * READ_ROUNDS),
+            # A full export per round: throughput is rows/s over the whole table
+            timed("GET /export/csv", size, lambda r: sum(service.get_db().get_stats().values()),
+                  lambda i: export(), rounds),
+            # Every fixture lead is old enough: one batch of terminal leads per round
+            timed("archive_leads", size, lambda r: r["archived"],
+                  lambda i: service.get_db().archive_leads(older_than_days=0, batch_size=batch, max_batches=1), rounds),
+        ]
+        service.close_db()
+        if storage == "tmpfs":
+            os.remove(target)
+    return results
+
+def compare(results, baseline):
+    """Rows of (result, baseline relative throughput or None, relative change)."""
+    previous = {(r["name"], r["size"], r.get("storage")): r.get("relative") for r in baseline.get("results", [])}
+    rows = []
+    for result in results:
+        before = previous.get((result["name"], result["size"], result["storage"]))
+        rows.append((result, before, result["relative"] / before - 1 if before else None))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeded end-to-end benchmark suite with a regression gate")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--storage", choices=STORAGES, default="memory")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=1000, help="limit/count per stage call")
+    parser.add_argument("--rounds", type=int, default=5, help="timed calls per entry point (after one warm-up call)")
+    parser.add_argument("--output", default="bench_results.json", help="machine-readable results")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.3, help="allowed drop in reference-relative throughput vs. baseline (0.3 = 30%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        start = time.perf_counter()
+        build_fixture(size, args.seed)
+        print(f"fixture {size:>9,} leads ready in {time.perf_counter() - start:6.2f}s", flush=True)
+        # A fresh interpreter per size: database binds DB_PATH at import
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            for result in pool.apply(run_size, (size, args.storage, args.seed, args.batch, args.rounds)):
+                results.append(dict(result, storage=args.storage))
+
+    report = {
+        "meta": {"timestamp": time.time(), "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                 "platform": platform.platform(), "cpus": os.cpu_count(), "storage": args.storage,
+                 "seed": args.seed, "batch": args.batch, "rounds": args.rounds},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = []
+    for result, before, change in compare(results, baseline):
+        flag = ""
+        if change is not None and change < -args.threshold:
+            regressions.append(result)
+            flag = "  REGRESSION"
+        delta = f"{change * 100:+6.1f}% vs {before:8.4f}" if change is not None else "(no baseline)"
+        print(f"{result['name']:<24} {result['size']:>9,}  {result['items']:>8,} in {result['seconds']:7.3f}s  ->  "
+              f"{result['throughput']:>11,.0f}/s  x ref {result['relative']:8.4f}  {delta}{flag}")
+    print(f"results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} result(s) regressed more than {args.threshold:.0%} against {args.baseline}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Server-push change feed for the dashboard (Server-Sent Events)
+
+import asyncio
+
+# How often the broadcaster checks meta.change_seq (a single-row primary-key read)
+FEED_POLL_SECONDS = 1.0
+# Deltas larger than this are not pushed row by row; clients are told to resync instead
+FEED_MAX_ROWS = 500
+# Events buffered per subscriber before a slow client is asked to resync
+FEED_QUEUE_SIZE = 100
+
+class ChangeFeed:
+    """
+    One broadcaster per process. It polls the change sequence and, only when it moves,
+    reads the changed rows and stats once and fans the event out to every subscriber.
+    Backend work is proportional to the number of changes, not rows x viewers.
+    """
+    def __init__(self, db, interval: float = FEED_POLL_SECONDS, max_rows: int = FEED_MAX_ROWS):
+        self.db = db
+        self.interval = interval
+        self.max_rows = max_rows
+        self.subscribers = set()
+        self.joining = 0  # subscribers still catching up; keeps the broadcaster alive
+        self.version = None
+        self.task = None
+
+    async def _build_event(self, since: int, until: int) -> dict:
+        rows = await asyncio.to_thread(self.db.get_changes, since, None, self.max_rows + 1, until)
+        stats = await asyncio.to_thread(self.db.get_stats)
+        if len(rows) > self.max_rows:
+            return {"version": until, "reset": True, "leads": [], "stats": stats}
+        return {"version": until, "reset": False, "leads": rows, "stats": stats}
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: dict):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind: drop the backlog and ask the client to refetch a snapshot
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({**event, "reset": True, "leads": []})
+
+    async def _run(self):
+        try:
+            while self.subscribers or self.joining:
+                await asyncio.sleep(self.interval)
+                latest = await asyncio.to_thread(self.db.current_version)
+                if latest == self.version:
+                    continue
+                event = await self._build_event(self.version, latest)
+                # No await between advancing the version and fanning out (see subscribe)
+                self.version = latest
+                for queue in list(self.subscribers):
+                    self._offer(queue, event)
+        finally:
+            # Also reached on errors, so the next subscriber starts a fresh broadcaster
+            self.task = None
+
+    async def subscribe(self, since: int = None) -> asyncio.Queue:
+        """
+        Registers a subscriber. If `since` is given, the changes it missed are queued first,
+        and the subscriber only joins the broadcast once it has caught up, so events always
+        arrive in version order.
+        """
+        queue = asyncio.Queue(maxsize=FEED_QUEUE_SIZE)
+        self.joining += 1
+        try:
+            if self.task is None:
+                version = await asyncio.to_thread(self.db.current_version)
+                if self.task is None:  # another subscriber may have started it meanwhile
+                    self.version = version
+                    self.task = asyncio.create_task(self._run())
+            cursor = since
+            while True:
+                upto = self.version
+                if cursor is not None and cursor < upto:
+                    self._offer(queue, await self._build_event(cursor, upto))
+                    cursor = upto
+                if self.version == upto:
+                    self.subscribers.add(queue)
+                    return queue
+        finally:
+            self.joining -= 1
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
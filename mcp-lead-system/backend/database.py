@@ -1,15 +1,414 @@
 # Database handler for SQLite
 
+import base64
 import sqlite3
 import json
 import os
-from datetime import datetime
+import re
+import time
+from itertools import count
+from db_pool import acquire_pool, release_pool, DB_POOL_SIZE
+from logic.metrics import timed_query
+from logic.messaging import compile_stored, DEFAULT_RENDERER, DEFAULT_PAIN, DEFAULT_TRIGGER
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'data', 'leads.db')
+# Default database; DB_PATH overrides it (a file, a tmpfs path such as /dev/shm/leads.db, or ":memory:")
+DB_PATH = os.getenv("DB_PATH") or os.path.join(os.path.dirname(__file__), 'data', 'leads.db')
+MEMORY_PATH = ":memory:"
+_memory_ids = count(1)
 
-def init_db():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+# Rows per executemany() call when bulk inserting
+INSERT_CHUNK_SIZE = 1000
+# Rows per fetchmany() call when streaming exports
+EXPORT_CHUNK_SIZE = 1000
+
+# Applied on every pooled connection: WAL lets readers run alongside the writer and, with
+# synchronous=NORMAL, a commit no longer pays for a full fsync of the main file.
+# Incremental auto-vacuum lets archival hand freed pages back as it goes.
+CONNECTION_PRAGMAS = (
+    # Only takes effect on a new database (before any table exists); see LeadDB.vacuum
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",  # 64 MiB page cache (negative = KiB)
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Whitelist for column projection (names are interpolated into SQL, values never are)
+LEAD_COLUMNS = (
+    "id", "full_name", "company_name", "role", "industry",
+    "website", "email", "linkedin_url", "country", "status",
+    "enrichment_data", "email_content_a", "email_content_b",
+    "linkedin_content_a", "linkedin_content_b", "last_updated", "logs",
+    "row_version", "persona", "company_size", "confidence_score",
+    "buying_trigger", "pain_point", "enrichment_source", "attempt_count",
+)
+
+# Message columns and the template_sets slot each is rendered from when stored by reference
+MESSAGE_SLOT_COLUMNS = {
+    "email_content_a": "email_a", "email_content_b": "email_b",
+    "linkedin_content_a": "linkedin_a", "linkedin_content_b": "linkedin_b",
+}
+# What a referenced message is rendered from: the template set and the template fields
+MESSAGE_SOURCE_COLUMNS = ("message_set_id", "full_name", "company_name", "role", "industry", "message_pain", "message_trigger")
+
+def _select_list(columns):
+    """
+    Builds a validated SELECT column list; None means all columns. When a message column
+    is selected, MESSAGE_SOURCE_COLUMNS follow as extra trailing columns (see _render_rows).
+    """
+    columns = columns or LEAD_COLUMNS
+    unknown = [c for c in columns if c not in LEAD_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown lead columns: {unknown}")
+    if any(c in MESSAGE_SLOT_COLUMNS for c in columns):
+        columns = (*columns, *(f"{c} AS _src{i}" for i, c in enumerate(MESSAGE_SOURCE_COLUMNS)))
+    return ", ".join(columns)
+
+# Typed enrichment columns, written next to the full enrichment_data record so segments
+# can be filtered and aggregated through indexes: (column, declaration, JSON path)
+ENRICHMENT_COLUMNS = (
+    ("persona", "TEXT", "$.persona"),
+    ("company_size", "TEXT", "$.company_size"),
+    ("confidence_score", "INTEGER", "$.confidence_score"),
+    ("buying_trigger", "TEXT", "$.buying_trigger"),
+    ("pain_point", "TEXT", "$.pain_points[0]"),  # the primary pain point used by messages
+    ("enrichment_source", "TEXT", "$.enrichment_source"),
+)
+
+# One-off fill of the typed columns from enrichment_data for rows written before they
+# existed, including legacy rows that were JSON-encoded twice
+ENRICHMENT_BACKFILL_SQL = f'''
+UPDATE leads SET {", ".join(f"{column} = src.{column}" for column, _, _ in ENRICHMENT_COLUMNS)}
+FROM (
+    SELECT id, {", ".join(f"json_extract(doc, '{path}') AS {column}" for column, _, path in ENRICHMENT_COLUMNS)}
+    FROM (
+        SELECT id, CASE WHEN json_valid(enrichment_data) AND json_type(enrichment_data) = 'text'
+                        THEN json_extract(enrichment_data, '$') ELSE enrichment_data END AS doc
+        FROM leads WHERE enrichment_data IS NOT NULL
+    )
+    WHERE CASE WHEN json_valid(doc) THEN json_type(doc) = 'object' END
+) AS src
+WHERE leads.id = src.id
+'''
+
+# Orders a /leads page can be sorted by (each has an (column, id) index for keyset paging)
+PAGE_SORT_COLUMNS = ("id", "full_name", "company_name")
+
+# Columns leads can be grouped by in segment_stats
+SEGMENT_COLUMNS = ("status", "industry", "country", "persona", "company_size", "buying_trigger", "enrichment_source")
+
+def _filter_clauses(status=None, industry=None, updated_since=None, updated_until=None, persona=None, company_size=None,
+                    min_confidence=None, max_confidence=None, enrichment_source=None, country=None, unindexed=False):
+    """
+    WHERE conditions (and params) for optional lead filters. unindexed=True prefixes the
+    equality columns with '+', which keeps the planner from picking their indexes.
+    """
+    clauses, params = [], []
+    prefix = "+" if unindexed else ""
+    for column, value in (("status", status), ("industry", industry), ("country", country), ("persona", persona),
+                          ("company_size", company_size), ("enrichment_source", enrichment_source)):
+        if value:
+            clauses.append(f"{prefix}{column} = ?")
+            params.append(value)
+    if min_confidence is not None:
+        clauses.append("confidence_score >= ?")
+        params.append(min_confidence)
+    if max_confidence is not None:
+        clauses.append("confidence_score <= ?")
+        params.append(max_confidence)
+    if updated_since:
+        clauses.append("last_updated >= ?")
+        params.append(updated_since)
+    if updated_until:
+        clauses.append("last_updated < ?")
+        params.append(updated_until)
+    return clauses, params
+
+def _where(clauses):
+    return " WHERE " + " AND ".join(clauses) if clauses else ""
+
+def _lead_filters(**filters):
+    """Builds a WHERE clause (and params) from optional lead filters (see _filter_clauses)."""
+    clauses, params = _filter_clauses(**filters)
+    return _where(clauses), params
+
+# Filters the status counters can count (any other filter needs a scan)
+COUNTED_FILTERS = ("status", "industry")
+# Above this many matching rows, a page sorted by name walks the sort index instead of
+# sorting every match (a broad filter fills a page after a few hundred index entries)
+PAGE_SORT_SCAN_ROWS = 20_000
+
+def _search_query(text):
+    """
+    FTS5 query for free text: every word must match, the last one as a prefix (type-ahead)
+    once it has two characters (the prefix index starts there). Words are quoted, so FTS
+    syntax in user input is taken literally. None for no words.
+    """
+    # Letters and digits only, as the unicode61 tokenizer splits them (each word is one token)
+    words = re.findall(r"[^\W_]+", text or "")
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) >= 2:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+def _encode_cursor(value, lead_id):
+    return base64.urlsafe_b64encode(json.dumps([value, lead_id]).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor):
+    """(sort value, id) from an opaque page cursor; ValueError for anything else."""
+    try:
+        value, lead_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid page cursor {cursor!r}") from e
+    if not isinstance(lead_id, int):
+        raise ValueError(f"Invalid page cursor {cursor!r}")
+    return value, lead_id
+
+def _chunks(items, size):
+    """Yields lists of up to `size` items from any iterable (lists or generators)."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# A lead already archived is a duplicate too (its email is unique in leads_archive)
+INSERT_LEAD_SQL = '''
+INSERT INTO leads (full_name, company_name, role, industry, website, email, linkedin_url, country, status, row_version, claimed_by, lease_expires)
+SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, 'NEW', ?9, ?10, ?11
+WHERE NOT EXISTS (SELECT 1 FROM leads_archive WHERE email = ?6)
+ON CONFLICT(email) DO NOTHING
+'''
+
+def _lease_params(lease):
+    """(claimed_by, lease_expires) for a (worker_id, lease_seconds) lease; None ends the claim."""
+    if lease is None:
+        return None, None
+    worker_id, lease_seconds = lease
+    return worker_id, time.time() + lease_seconds
+
+def _owner(worker_id, lease):
+    """The worker a stage write must still be claimed by: `worker_id`, else the `lease` holder."""
+    return worker_id if worker_id is not None else lease[0] if lease else None
+
+def _owned_by(owner):
+    """WHERE clause (and its parameters) that skips leads no longer claimed by `owner`."""
+    return (" AND claimed_by = ?", (owner,)) if owner is not None else ("", ())
+
+def _insert_params(leads, version, claim=(None, None)):
+    return [(lead['full_name'], lead['company_name'], lead['role'], lead['industry'], lead['website'], lead['email'], lead['linkedin_url'], lead['country'], version, *claim) for lead in leads]
+
+COUNTER_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS lead_counters (
+    status TEXT NOT NULL, industry TEXT NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (status, industry)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS stage_throughput (
+    status TEXT NOT NULL, minute INTEGER NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (status, minute)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_leads_counters_insert AFTER INSERT ON leads BEGIN
+    INSERT INTO lead_counters (status, industry, count)
+    VALUES (COALESCE(NEW.status, ''), COALESCE(NEW.industry, ''), 1)
+    ON CONFLICT (status, industry) DO UPDATE SET count = count + 1;
+    INSERT INTO stage_throughput (status, minute, count)
+    VALUES (COALESCE(NEW.status, ''), CAST(strftime('%s', 'now') AS INTEGER) / 60, 1)
+    ON CONFLICT (status, minute) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_leads_counters_update AFTER UPDATE OF status, industry ON leads
+WHEN OLD.status IS NOT NEW.status OR OLD.industry IS NOT NEW.industry BEGIN
+    UPDATE lead_counters SET count = count - 1
+    WHERE status = COALESCE(OLD.status, '') AND industry = COALESCE(OLD.industry, '');
+    INSERT INTO lead_counters (status, industry, count)
+    VALUES (COALESCE(NEW.status, ''), COALESCE(NEW.industry, ''), 1)
+    ON CONFLICT (status, industry) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_leads_throughput_update AFTER UPDATE OF status ON leads
+WHEN OLD.status IS NOT NEW.status BEGIN
+    INSERT INTO stage_throughput (status, minute, count)
+    VALUES (COALESCE(NEW.status, ''), CAST(strftime('%s', 'now') AS INTEGER) / 60, 1)
+    ON CONFLICT (status, minute) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_leads_counters_delete AFTER DELETE ON leads BEGIN
+    UPDATE lead_counters SET count = count - 1
+    WHERE status = COALESCE(OLD.status, '') AND industry = COALESCE(OLD.industry, '');
+END;
+'''
+
+RECOUNT_SQL = '''
+INSERT INTO {counters} (status, industry, count)
+SELECT COALESCE(status, ''), COALESCE(industry, ''), COUNT(*) FROM {table} GROUP BY 1, 2
+'''
+
+# Which pipeline stage produces each status (for throughput reporting)
+STAGE_BY_STATUS = {"NEW": "generate", "ENRICHED": "enrich", "MESSAGED": "message", "SENT": "send", "FAILED": "send", "RETRY": "send"}
+# The status each processing stage drains (see LeadDB.claim_batch). "retry" is the send
+# retry schedule: RETRY leads become claimable once next_attempt_at has passed.
+STAGE_QUEUES = {"enrich": "NEW", "message": "ENRICHED", "send": "MESSAGED", "retry": "RETRY"}
+# Default claim lease: a batch not finished within it is handed to the next claimant
+CLAIM_LEASE_SECONDS = float(os.getenv("CLAIM_LEASE_SECONDS", "300"))
+# What the message stage reads: the template fields, from the typed enrichment columns
+MESSAGE_INPUT_SELECT = 'id, full_name, company_name, role, industry, pain_point AS pain, buying_trigger AS "trigger"'
+MESSAGE_INPUT_FIELDS = ("id", "full_name", "company_name", "role", "industry", "pain", "trigger")
+# Sliding windows (minutes) for throughput, and how long per-minute buckets are kept
+THROUGHPUT_WINDOWS = (1, 5, 15)
+THROUGHPUT_RETENTION_MINUTES = 24 * 60
+
+# Append-only history per lead: one row per stage outcome (and per send retry), so the
+# leads row itself never grows. ts is unix time in seconds.
+EVENT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS lead_events (
+    id INTEGER PRIMARY KEY,
+    lead_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    stage TEXT NOT NULL,
+    attempt INTEGER NOT NULL DEFAULT 1,
+    outcome TEXT NOT NULL,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_lead_events_lead ON lead_events(lead_id, id);
+CREATE INDEX IF NOT EXISTS idx_lead_events_ts ON lead_events(ts);
+'''
+# Outcomes that count as a failed stage (RETRY marks a failed attempt that was retried)
+FAILED_OUTCOMES = ("FAILED",)
+
+TEMPLATE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS templates (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL, version INTEGER NOT NULL, body TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (name, version)
+);
+CREATE TABLE IF NOT EXISTS template_sets (
+    id INTEGER PRIMARY KEY,
+    email_a INTEGER NOT NULL REFERENCES templates(id), email_b INTEGER NOT NULL REFERENCES templates(id),
+    linkedin_a INTEGER NOT NULL REFERENCES templates(id), linkedin_b INTEGER NOT NULL REFERENCES templates(id),
+    UNIQUE (email_a, email_b, linkedin_a, linkedin_b)
+);
+'''
+
+# Hot/cold split: SENT and FAILED leads move from leads to leads_archive once they have not
+# changed for ARCHIVE_AFTER_DAYS (LeadDB.archive_leads), so the stage queues, their indexes
+# and the page cache only hold working rows. Archived rows keep their id, row_version and
+# every column; reads that span all leads (pages, search, export, change feed, stats) query
+# both tables, stage work only the hot one. The archive is written by archival alone.
+ARCHIVE_STATUSES = ("SENT", "FAILED")
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+# Rows moved per transaction: short enough that stage writes interleave with a long run
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# Most free pages handed back to the file system after each archive batch
+VACUUM_PAGES_PER_BATCH = 4096
+# Each lead table with the counters its triggers maintain
+LEAD_TABLES = {"leads": "lead_counters", "leads_archive": "archive_counters"}
+# Counters over every lead, hot or archived
+ALL_COUNTERS = "(SELECT status, industry, count FROM lead_counters UNION ALL SELECT status, industry, count FROM archive_counters)"
+
+ARCHIVE_SCHEMA = '''
+CREATE UNIQUE INDEX IF NOT EXISTS idx_leads_archive_email ON leads_archive(email);
+CREATE INDEX IF NOT EXISTS idx_leads_archive_status_id ON leads_archive(status, id);
+CREATE INDEX IF NOT EXISTS idx_leads_archive_row_version ON leads_archive(row_version, id);
+CREATE INDEX IF NOT EXISTS idx_leads_archive_segment ON leads_archive(industry, persona, confidence_score);
+CREATE INDEX IF NOT EXISTS idx_leads_archive_persona ON leads_archive(persona, confidence_score);
+
+CREATE TABLE IF NOT EXISTS archive_counters (
+    status TEXT NOT NULL, industry TEXT NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (status, industry)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS trg_archive_counters_insert AFTER INSERT ON leads_archive BEGIN
+    INSERT INTO archive_counters (status, industry, count)
+    VALUES (COALESCE(NEW.status, ''), COALESCE(NEW.industry, ''), 1)
+    ON CONFLICT (status, industry) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_archive_counters_delete AFTER DELETE ON leads_archive BEGIN
+    UPDATE archive_counters SET count = count - 1
+    WHERE status = COALESCE(OLD.status, '') AND industry = COALESCE(OLD.industry, '');
+END;
+'''
+
+def _across(select, where=""):
+    """
+    The same SELECT over leads and leads_archive as one UNION ALL; `where` is applied to
+    each table, so its params are passed once per table. An ORDER BY appended to the result
+    must name selected columns: SQLite then merges the two index-ordered scans, so
+    `ORDER BY id DESC LIMIT n` still stops after n rows.
+    """
+    return " UNION ALL ".join(f"SELECT {select} FROM {table}{where}" for table in LEAD_TABLES)
+
+# Full-text search over names, companies, roles and message content. Messages stored by
+# reference are indexed by their per-lead parts (pain, trigger); the template text is shared
+# by every lead of a set. External content and detail=none: the index holds which rows
+# contain a token (no positions, so no phrase queries), the rows stay in the lead tables.
+# Archiving a lead leaves its entry in place (its content only changes table).
+SEARCH_COLUMNS = ("full_name", "company_name", "role", "message_pain", "message_trigger", "email_content_a", "linkedin_content_a")
+_SEARCH_NEW = ", ".join(f"NEW.{c}" for c in SEARCH_COLUMNS)
+_SEARCH_OLD = ", ".join(f"OLD.{c}" for c in SEARCH_COLUMNS)
+SEARCH_SCHEMA = f'''
+CREATE VIEW IF NOT EXISTS leads_fts_content AS {_across(", ".join(("id", *SEARCH_COLUMNS)))};
+CREATE VIRTUAL TABLE IF NOT EXISTS leads_fts USING fts5(
+    {", ".join(SEARCH_COLUMNS)}, content='leads_fts_content', content_rowid='id', prefix='2', detail=none
+);
+CREATE TRIGGER IF NOT EXISTS trg_leads_fts_insert AFTER INSERT ON leads BEGIN
+    INSERT INTO leads_fts (rowid, {", ".join(SEARCH_COLUMNS)}) VALUES (NEW.id, {_SEARCH_NEW});
+END;
+CREATE TRIGGER IF NOT EXISTS trg_leads_fts_delete AFTER DELETE ON leads
+WHEN NOT EXISTS (SELECT 1 FROM leads_archive WHERE id = OLD.id) BEGIN
+    INSERT INTO leads_fts (leads_fts, rowid, {", ".join(SEARCH_COLUMNS)}) VALUES ('delete', OLD.id, {_SEARCH_OLD});
+END;
+CREATE TRIGGER IF NOT EXISTS trg_leads_archive_fts_delete AFTER DELETE ON leads_archive BEGIN
+    INSERT INTO leads_fts (leads_fts, rowid, {", ".join(SEARCH_COLUMNS)}) VALUES ('delete', OLD.id, {_SEARCH_OLD});
+END;
+CREATE TRIGGER IF NOT EXISTS trg_leads_fts_update AFTER UPDATE OF {", ".join(SEARCH_COLUMNS)} ON leads
+WHEN {" OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in SEARCH_COLUMNS)} BEGIN
+    INSERT INTO leads_fts (leads_fts, rowid, {", ".join(SEARCH_COLUMNS)}) VALUES ('delete', OLD.id, {_SEARCH_OLD});
+    INSERT INTO leads_fts (rowid, {", ".join(SEARCH_COLUMNS)}) VALUES (NEW.id, {_SEARCH_NEW});
+END;
+'''
+
+def _add_column_if_missing(cursor, table, column, declaration):
+    """Lightweight migration: SQLite has no ADD COLUMN IF NOT EXISTS. Returns True if added."""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in existing:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+        return True
+    return False
+
+def resolve_path(path: str) -> str:
+    """
+    ":memory:" becomes a fresh named in-memory database with a shared cache, so every pooled
+    connection sees the same data; it lives until the pool is closed. Other paths pass through.
+    """
+    if path == MEMORY_PATH:
+        return f"file:leadgen-memory-{os.getpid()}-{next(_memory_ids)}?mode=memory&cache=shared"
+    return path
+
+def _is_uri(path: str) -> bool:
+    return path.startswith("file:")
+
+def _connection_options(path: str):
+    """(pragmas, sqlite3.connect kwargs) for a pool on `path`."""
+    if not _is_uri(path):
+        return CONNECTION_PRAGMAS, {}
+    pragmas = CONNECTION_PRAGMAS
+    if "cache=shared" in path:
+        # Shared-cache connections lock per table and do not wait on busy_timeout; reading
+        # uncommitted data keeps pooled readers from failing with "table is locked"
+        pragmas += ("PRAGMA read_uncommitted=ON",)
+    return pragmas, {"uri": True}
+
+def init_db(path: str = None):
+    path = path or DB_PATH
+    if not _is_uri(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, uri=_is_uri(path))
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -25,62 +424,900 @@ def init_db():
         logs TEXT
     )
     ''')
+    # Email is the dedup key: the unique index makes the duplicate check an index lookup
+    # and lets bulk inserts skip existing leads with ON CONFLICT DO NOTHING.
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_leads_email ON leads(email)")
+    # Stage queues are pulled by status in FIFO (id) order
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_leads_status_id ON leads(status, id)")
+
+    # Change feed: every write transaction takes the next value of meta.change_seq and
+    # stamps it on the rows it touches, so readers can ask for "rows changed since N".
+    cursor.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('change_seq', 0)")
+    _add_column_if_missing(cursor, "leads", "row_version", "INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_leads_row_version ON leads(row_version, id)")
+
+    # O(1) stats: counters per (status, industry) and per-minute arrivals per status,
+    # maintained by triggers so every write path (including raw SQL) keeps them exact.
+    cursor.executescript(COUNTER_SCHEMA)
+    if cursor.execute("SELECT 1 FROM lead_counters LIMIT 1").fetchone() is None:
+        # First run on an existing database: seed the counters with one full recount
+        cursor.execute(RECOUNT_SQL.format(counters="lead_counters", table="leads"))
+
+    # Messages by reference: versioned template bodies and the slot assignments used
+    # together; a lead keeps the set id plus its two enrichment parameters, and the
+    # message columns are only filled for text that did not come from a template.
+    cursor.executescript(TEMPLATE_SCHEMA)
+    _add_column_if_missing(cursor, "leads", "message_set_id", "INTEGER")
+    _add_column_if_missing(cursor, "leads", "message_pain", "TEXT")
+    _add_column_if_missing(cursor, "leads", "message_trigger", "TEXT")
+
+    # Typed enrichment columns with segment indexes, e.g. "Decision Makers in FinTech
+    # with confidence >= 90" is a range scan on idx_leads_segment.
+    added = [_add_column_if_missing(cursor, "leads", column, declaration) for column, declaration, _ in ENRICHMENT_COLUMNS]
+    if any(added):
+        cursor.execute(ENRICHMENT_BACKFILL_SQL)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_leads_segment ON leads(industry, persona, confidence_score)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_leads_persona ON leads(persona, confidence_score)")
+
+    cursor.executescript(EVENT_SCHEMA)
+
+    # Work claims: a worker owns a lead until lease_expires (unix time); the status is left
+    # alone, so a claim that is never completed simply expires back into its queue.
+    _add_column_if_missing(cursor, "leads", "claimed_by", "TEXT")
+    _add_column_if_missing(cursor, "leads", "lease_expires", "REAL")
+
+    # Persistent send retries: a failed attempt parks the lead in RETRY until next_attempt_at
+    # (unix time); the scheduler pulls due leads in due-time order from this index.
+    _add_column_if_missing(cursor, "leads", "attempt_count", "INTEGER NOT NULL DEFAULT 0")
+    _add_column_if_missing(cursor, "leads", "next_attempt_at", "REAL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_leads_retry_due ON leads(status, next_attempt_at)")
+
+    # Archive: every leads column (added here as leads gains them), plus when the row moved
+    cursor.execute("CREATE TABLE IF NOT EXISTS leads_archive (id INTEGER PRIMARY KEY, archived_at REAL)")
+    for _, column, declaration, *_ in cursor.execute("PRAGMA table_info(leads)").fetchall():
+        if column != "id":
+            _add_column_if_missing(cursor, "leads_archive", column, declaration)
+    cursor.executescript(ARCHIVE_SCHEMA)
+
+    # /leads pages: keyset order per sortable column, and the search index kept in sync by triggers
+    for column in PAGE_SORT_COLUMNS:
+        if column != "id":
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_leads_sort_{column} ON leads({column}, id)")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_leads_archive_sort_{column} ON leads_archive({column}, id)")
+    search = cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'leads_fts'").fetchone()
+    has_search = search and "leads_fts_content" in search[0]
+    if search and not has_search:
+        # Indexed over leads alone, before the archive: rebuilt over both tables below
+        cursor.executescript("DROP TRIGGER trg_leads_fts_insert; DROP TRIGGER trg_leads_fts_delete; "
+                             "DROP TRIGGER trg_leads_fts_update; DROP TABLE leads_fts;")
+    cursor.executescript(SEARCH_SCHEMA)
+    if not has_search:
+        # No merging on each write: with automerge every small stage batch would merge into
+        # the large segments, which makes writes several times slower on a big table. Segments
+        # are still merged once 16 pile up on one level (crisismerge).
+        cursor.execute("INSERT INTO leads_fts (leads_fts, rank) VALUES ('automerge', 0)")
+        # First run on an existing database: index the rows already there
+        cursor.execute("INSERT INTO leads_fts (leads_fts) VALUES ('rebuild')")
     conn.commit()
     conn.close()
 
 class LeadDB:
-    def __init__(self):
-        if not os.path.exists(DB_PATH):
-            init_db()
-        self.conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-
-    def add_leads(self, leads):
-        cursor = self.conn.cursor()
-        count = 0
-        for lead in leads:
-            cursor.execute("SELECT id FROM leads WHERE email = ?", (lead['email'],))
-            if cursor.fetchone(): continue
-            
-            cursor.execute('''
-            INSERT INTO leads (full_name, company_name, role, industry, website, email, linkedin_url, country, status, logs) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'NEW', ?)
-            ''', (lead['full_name'], lead['company_name'], lead['role'], lead['industry'], lead['website'], lead['email'], lead['linkedin_url'], lead['country'], f"Created at {datetime.now()}"))
-            count += 1
-        self.conn.commit()
-        return count
-
-    def get_leads_by_status(self, status, limit=10):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM leads WHERE status = ? LIMIT ?", (status, limit))
-        return [dict(row) for row in cursor.fetchall()]
+    """
+    Lead storage backed by the process-wide connection pool for `path` (default DB_PATH;
+    ":memory:" gives a private in-memory database, see resolve_path).
+    Reads borrow a pooled read connection; writes go through the single serialized writer.
+    """
+    def __init__(self, path: str = None, pool_size=DB_POOL_SIZE):
+        self.path = resolve_path(path or DB_PATH)
+        pragmas, connect_args = _connection_options(self.path)
+        # The pool opens first: an in-memory database only exists while a connection holds it
+        self.pool = acquire_pool(self.path, size=pool_size, pragmas=pragmas, connect_args=connect_args)
+        # Schema statements are idempotent, so existing databases pick up new indexes too
+        init_db(self.path)
+        self.template_sets = {}
+        self.set_renderers = {}
+
+    def read(self):
+        """Context manager yielding a pooled read-only connection."""
+        return self.pool.reader()
+
+    def write(self):
+        """Context manager yielding the writer connection inside one transaction."""
+        return self.pool.writer()
+
+    @staticmethod
+    def _next_version(conn):
+        """Bumps the change sequence inside the caller's write transaction."""
+        return conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'change_seq' RETURNING value").fetchone()[0]
+
+    def _fetch(self, sql, params=()):
+        with self.read() as conn:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    def _fetch_leads(self, columns, sql, params=()):
+        """Runs a `SELECT {_select_list(columns)} ...` query; returns lead dicts with messages rendered."""
+        columns = columns or LEAD_COLUMNS
+        with self.read() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            rows = self._render_rows(conn, columns, cursor.execute(sql, params).fetchall())
+        return [dict(zip(columns, row)) for row in rows]
+
+    def _render_rows(self, conn, columns, rows):
+        """
+        Fills message columns stored by reference from their template set and strips the
+        trailing source columns added by _select_list. Rows are plain tuples; the rows of
+        each template set are rendered together, in one batch.
+        """
+        slots = [(i, list(MESSAGE_SLOT_COLUMNS).index(c)) for i, c in enumerate(columns) if c in MESSAGE_SLOT_COLUMNS]
+        if not slots:
+            return rows
+        n = len(columns)
+        by_set = {}
+        for position, row in enumerate(rows):
+            if row[n] is not None:
+                by_set.setdefault(row[n], []).append(position)
+        rendered = [row[:n] for row in rows]
+        for set_id, positions in by_set.items():
+            if set_id not in self.set_renderers:
+                self._load_template_set(conn, set_id)
+            batch = self.set_renderers[set_id]([rows[position][n + 1:] for position in positions])
+            for position, texts in zip(positions, batch):
+                values = list(rendered[position])
+                for i, slot in slots:
+                    if values[i] is None:
+                        values[i] = texts[slot]
+                rendered[position] = tuple(values)
+        return rendered
+
+    def _load_template_set(self, conn, set_id):
+        """Compiles the (immutable) templates of a set the first time a row references it."""
+        slots = MESSAGE_SLOT_COLUMNS.values()
+        row = conn.execute(
+            f"SELECT {', '.join(f'{slot}.name, {slot}.body' for slot in slots)} FROM template_sets s "
+            + " ".join(f"JOIN templates {slot} ON {slot}.id = s.{slot}" for slot in slots)
+            + " WHERE s.id = ?",
+            (set_id,),
+        ).fetchone()
+        self.set_renderers[set_id] = compile_stored(list(zip(row[::2], row[1::2])))
+
+    @timed_query
+    def add_leads(self, leads, chunk_size=INSERT_CHUNK_SIZE):
+        """
+        Bulk inserts leads in chunks inside a single transaction.
+        Leads whose email already exists are skipped; returns the number actually added.
+        """
+        with self.write() as conn:
+            version = self._next_version(conn)
+            added = 0
+            for chunk in _chunks(leads, chunk_size):
+                # rowcount skips ignored conflicts and trigger side effects (unlike total_changes)
+                added += conn.executemany(INSERT_LEAD_SQL, _insert_params(chunk, version)).rowcount
+            self._log_version_events(conn, version, "generate", "CREATED")
+            return added
+
+    @timed_query
+    def add_leads_returning(self, leads, columns=("id",), lease=None):
+        """
+        Like add_leads for one batch, but returns the inserted rows (projected to `columns`,
+        oldest first) so a caller can carry them on without reading them back by status.
+        With `lease` (worker_id, lease_seconds) the new leads start out claimed by the caller.
+        """
+        with self.write() as conn:
+            version = self._next_version(conn)
+            conn.executemany(INSERT_LEAD_SQL, _insert_params(leads, version, _lease_params(lease)))
+            self._log_version_events(conn, version, "generate", "CREATED")
+            cursor = conn.execute(f"SELECT {_select_list(columns)} FROM leads WHERE row_version = ? ORDER BY id", (version,))
+            return [dict(zip(columns, row)) for row in cursor]
+
+    @timed_query
+    def get_leads_by_status(self, status, limit=10, after_id=0, columns=None):
+        """
+        Returns up to `limit` leads in `status`, oldest first.
+        `after_id` is a keyset cursor (pass the last id of the previous page) and
+        `columns` restricts the projection instead of SELECT *.
+        """
+        return self._fetch_leads(
+            columns,
+            f"SELECT {_select_list(columns)} FROM leads WHERE status = ? AND id > ? ORDER BY id LIMIT ?",
+            (status, after_id, limit),
+        )
+
+    def iter_leads_by_status(self, status, page_size=500, columns=None):
+        """Drains a status queue page by page using the id cursor. Yields lead dicts."""
+        if columns and "id" not in columns:
+            columns = ("id", *columns)
+        after_id = 0
+        while True:
+            page = self.get_leads_by_status(status, page_size, after_id, columns)
+            if not page:
+                return
+            yield from page
+            after_id = page[-1]["id"]
+
+    @timed_query
+    def get_message_inputs(self, limit=10, after_id=0):
+        """
+        ENRICHED leads with the fields the message templates need, read from the typed
+        enrichment columns (no JSON is decoded).
+        """
+        return self._fetch(
+            f"SELECT {MESSAGE_INPUT_SELECT} FROM leads WHERE status = 'ENRICHED' AND id > ? ORDER BY id LIMIT ?",
+            (after_id, limit),
+        )
+
+    # --- WORK CLAIMS (safe across threads and processes) ---
+
+    @timed_query
+    def claim_batch(self, stage, n, worker_id, lease_seconds=CLAIM_LEASE_SECONDS, columns=None, left_by=None):
+        """
+        Atomically takes up to `n` leads from `stage`'s queue (oldest first, or for "retry"
+        the due ones, earliest first) for `worker_id`.
+        Leads claimed by another worker are skipped until their lease expires. Returns lead
+        dicts projected to `columns` (the message stage defaults to its template inputs).
+        A claim ends when a stage write moves the lead on, or with release_claims.
+        `left_by` (a LIKE pattern over worker ids) takes only leads whose lapsed or expired
+        claim was held by a matching worker, i.e. work an earlier claimant left unfinished.
+        """
+        if stage not in STAGE_QUEUES:
+            raise ValueError(f"Unknown stage: {stage} (one of {', '.join(STAGE_QUEUES)})")
+        inputs = stage == "message" and columns is None
+        order = "AND next_attempt_at <= ?1 ORDER BY next_attempt_at" if stage == "retry" else "ORDER BY id"
+        owner = "AND claimed_by LIKE ?6" if left_by is not None else ""
+        now = time.time()
+        with self.write() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            # Picking and marking the rows is one statement, so no two claimants can both
+            # see a lead as free (the writer lock covers threads, SQLite's lock processes)
+            rows = cursor.execute(f'''
+            UPDATE leads SET claimed_by = ?2, lease_expires = ?3
+            WHERE id IN (
+                SELECT id FROM leads WHERE status = ?4 AND (lease_expires IS NULL OR lease_expires <= ?1)
+                {owner} {order} LIMIT ?5
+            )
+            RETURNING {MESSAGE_INPUT_SELECT if inputs else _select_list(columns)}
+            ''', (now, worker_id, now + lease_seconds, STAGE_QUEUES[stage], n, *([left_by] if owner else []))).fetchall()
+            rows.sort(key=lambda row: row[0])  # RETURNING order is unspecified
+            if inputs:
+                return [dict(zip(MESSAGE_INPUT_FIELDS, row)) for row in rows]
+            columns = columns or LEAD_COLUMNS
+            return [dict(zip(columns, row)) for row in self._render_rows(conn, columns, rows)]
+
+    @timed_query
+    def release_claims(self, worker_id, ids=None):
+        """Hands `worker_id`'s claimed leads (all, or only `ids`) back to their queues. Returns rows released."""
+        with self.write() as conn:
+            if ids is None:
+                return conn.execute("UPDATE leads SET claimed_by = NULL, lease_expires = NULL WHERE claimed_by = ?", (worker_id,)).rowcount
+            return conn.executemany(
+                "UPDATE leads SET claimed_by = NULL, lease_expires = NULL WHERE id = ? AND claimed_by = ?",
+                [(lead_id, worker_id) for lead_id in ids],
+            ).rowcount
+
+    @timed_query
+    def expire_claims(self, worker_id):
+        """
+        Ends `worker_id`'s leases at once but keeps its name on the leads: any stage may take
+        them now, and claim_batch(left_by=...) can still tell who left them. Returns rows expired.
+        """
+        with self.write() as conn:
+            return conn.execute("UPDATE leads SET lease_expires = ? WHERE claimed_by = ?", (time.time(), worker_id)).rowcount
+
+    @timed_query
+    def claimed_ids(self, worker_id, ids):
+        """The ids among `ids` that `worker_id` still holds a claim on."""
+        with self.read() as conn:
+            return {lead_id for (lead_id,) in conn.execute(
+                "SELECT id FROM leads WHERE id IN (SELECT value FROM json_each(?)) AND claimed_by = ?", (json.dumps(list(ids)), worker_id))}
+
+    @timed_query
+    def renew_claims(self, worker_id, lease_seconds=CLAIM_LEASE_SECONDS, ids=None):
+        """
+        Extends `worker_id`'s leases (on all its leads, or only `ids`) to `lease_seconds` from
+        now. Only leads it still holds are renewed. Returns rows renewed.
+        """
+        expires = time.time() + lease_seconds
+        with self.write() as conn:
+            if ids is None:
+                return conn.execute("UPDATE leads SET lease_expires = ? WHERE claimed_by = ?", (expires, worker_id)).rowcount
+            return conn.executemany(
+                "UPDATE leads SET lease_expires = ? WHERE id = ? AND claimed_by = ?",
+                [(expires, lead_id, worker_id) for lead_id in ids],
+            ).rowcount
+
+    # --- BATCH WRITES (one transaction per batch) ---
+    # With `worker_id` (implied by a `lease`), a stage write only touches leads that worker
+    # still holds: a lead whose lease ran out and was claimed by another worker belongs to
+    # that worker now, and the late result for it is dropped.
+
+    @staticmethod
+    def _log_version_events(conn, version, stage, outcome):
+        """One event for every row the current write stamped with `version`."""
+        conn.execute(
+            "INSERT INTO lead_events (lead_id, ts, stage, attempt, outcome) SELECT id, ?, ?, 1, ? FROM leads WHERE row_version = ?",
+            (time.time(), stage, outcome, version),
+        )
+
+    @timed_query
+    def update_enrichment_many(self, items, lease=None, worker_id=None):
+        """
+        Applies (lead_id, enrichment_dict) pairs and marks them ENRICHED. The full record
+        goes to enrichment_data and its fields to the typed columns. Returns rows updated.
+        Like every stage write it ends the leads' claims, unless `lease` (worker_id,
+        lease_seconds) renews them for a worker that carries the leads on to the next stage.
+        """
+        claim = _lease_params(lease)
+        owned, owner = _owned_by(_owner(worker_id, lease))
+        with self.write() as conn:
+            version = self._next_version(conn)
+            updated = conn.executemany(
+                "UPDATE leads SET enrichment_data = ?, persona = ?, company_size = ?, confidence_score = ?, buying_trigger = ?, pain_point = ?, enrichment_source = ?, "
+                f"status = 'ENRICHED', claimed_by = ?, lease_expires = ?, last_updated = CURRENT_TIMESTAMP, row_version = ? WHERE id = ?{owned}",
+                [
+                    (json.dumps(data), data.get("persona"), data.get("company_size"), data.get("confidence_score"), data.get("buying_trigger"),
+                     (data.get("pain_points") or [None])[0], data.get("enrichment_source"), *claim, version, lead_id, *owner)
+                    for lead_id, data in items
+                ],
+            ).rowcount
+            self._log_version_events(conn, version, "enrich", "ENRICHED")
+            return updated
+
+    @timed_query
+    def update_messages_many(self, items, lease=None, worker_id=None):
+        """Applies (lead_id, msgs_dict) pairs of literal texts and marks them MESSAGED. Returns rows updated."""
+        claim = _lease_params(lease)
+        owned, owner = _owned_by(_owner(worker_id, lease))
+        with self.write() as conn:
+            version = self._next_version(conn)
+            updated = conn.executemany(
+                "UPDATE leads SET email_content_a = ?, email_content_b = ?, linkedin_content_a = ?, linkedin_content_b = ?, message_set_id = NULL, status = 'MESSAGED', "
+                f"claimed_by = ?, lease_expires = ?, last_updated = CURRENT_TIMESTAMP, row_version = ? WHERE id = ?{owned}",
+                [(msgs.get('email_a'), msgs.get('email_b'), msgs.get('linkedin_a'), msgs.get('linkedin_b'), *claim, version, lead_id, *owner) for lead_id, msgs in items],
+            ).rowcount
+            self._log_version_events(conn, version, "message", "MESSAGED")
+            return updated
+
+    @timed_query
+    def update_message_refs_many(self, set_id, items, lease=None, worker_id=None):
+        """
+        Stores messages by reference: (lead_id, pain, trigger) triples rendered later from
+        template set `set_id`. Marks the leads MESSAGED; returns rows updated.
+        """
+        claim = _lease_params(lease)
+        owned, owner = _owned_by(_owner(worker_id, lease))
+        with self.write() as conn:
+            version = self._next_version(conn)
+            updated = conn.executemany(
+                "UPDATE leads SET message_set_id = ?, message_pain = ?, message_trigger = ?, email_content_a = NULL, email_content_b = NULL, linkedin_content_a = NULL, linkedin_content_b = NULL, status = 'MESSAGED', "
+                f"claimed_by = ?, lease_expires = ?, last_updated = CURRENT_TIMESTAMP, row_version = ? WHERE id = ?{owned}",
+                [(set_id, pain, trigger, *claim, version, lead_id, *owner) for lead_id, pain, trigger in items],
+            ).rowcount
+            self._log_version_events(conn, version, "message", "MESSAGED")
+            return updated
+
+    @timed_query
+    def update_status_many(self, items, stage=None, events=(), worker_id=None):
+        """
+        Applies (lead_id, status, message[, attempt[, next_attempt_at]]) items; each becomes a
+        lead event with the status as outcome, in `stage` (default: the stage that produces
+        the status). `attempt` is stored as the lead's attempt_count and `next_attempt_at`
+        schedules a RETRY. `events` are extra (lead_id, stage, attempt, outcome, message) rows
+        written in the same transaction, e.g. retried send attempts. Returns rows updated.
+        """
+        items = list(items)
+        now = time.time()
+        owned, owner = _owned_by(worker_id)
+        with self.write() as conn:
+            version = self._next_version(conn)
+            updated = conn.executemany(
+                "UPDATE leads SET status = ?, attempt_count = COALESCE(?, attempt_count), next_attempt_at = ?, claimed_by = NULL, lease_expires = NULL, "
+                f"last_updated = CURRENT_TIMESTAMP, row_version = ? WHERE id = ?{owned}",
+                [(status, *(extra + [None, None])[:2], version, lead_id, *owner) for lead_id, status, _, *extra in items],
+            ).rowcount
+            if updated < len(items):
+                # Only the leads this write stamped get events (the rest belong to another worker)
+                written = {lead_id for (lead_id,) in conn.execute("SELECT id FROM leads WHERE row_version = ?", (version,))}
+                items = [item for item in items if item[0] in written]
+                events = [event for event in events if event[0] in written]
+            self._insert_events(conn, now, [*events, *(
+                (lead_id, stage or STAGE_BY_STATUS.get(status, "other"), extra[0] if extra else 1, status, message)
+                for lead_id, status, message, *extra in items
+            )])
+            return updated
+
+    @staticmethod
+    def _insert_events(conn, ts, events):
+        conn.executemany(
+            "INSERT INTO lead_events (lead_id, ts, stage, attempt, outcome, message) VALUES (?, ?, ?, ?, ?, ?)",
+            [(lead_id, ts, stage, attempt, outcome, message) for lead_id, stage, attempt, outcome, message in events],
+        )
+
+    @timed_query
+    def next_retry_at(self):
+        """Due time (unix seconds) of the earliest scheduled send retry, or None when there is none."""
+        with self.read() as conn:
+            return conn.execute("SELECT MIN(next_attempt_at) FROM leads WHERE status = 'RETRY'").fetchone()[0]
+
+    @timed_query
+    def log_events_many(self, events):
+        """Appends (lead_id, stage, attempt, outcome, message) events in one transaction."""
+        with self.write() as conn:
+            self._insert_events(conn, time.time(), events)
+
+    # --- SINGLE-LEAD WRITES (kept for callers outside the batch stages) ---
 
     def update_lead_enrichment(self, lead_id, data):
-        self.conn.execute("UPDATE leads SET enrichment_data = ?, status = 'ENRICHED', last_updated = CURRENT_TIMESTAMP WHERE id = ?", (json.dumps(data), lead_id))
-        self.conn.commit()
+        self.update_enrichment_many([(lead_id, data)])
 
     def update_lead_messages(self, lead_id, msgs):
-        self.conn.execute("UPDATE leads SET email_content_a = ?, email_content_b = ?, linkedin_content_a = ?, linkedin_content_b = ?, status = 'MESSAGED', last_updated = CURRENT_TIMESTAMP WHERE id = ?", (msgs.get('email_a'), msgs.get('email_b'), msgs.get('linkedin_a'), msgs.get('linkedin_b'), lead_id))
-        self.conn.commit()
+        self.update_messages_many([(lead_id, msgs)])
 
     def update_lead_status(self, lead_id, status, log=""):
-        self.conn.execute("UPDATE leads SET status = ?, logs = logs || ?, last_updated = CURRENT_TIMESTAMP WHERE id = ?", (status, f"\n{log}", lead_id))
-        self.conn.commit()
+        self.update_status_many([(lead_id, status, log)])
+
+    # --- MESSAGE TEMPLATES (stored by reference) ---
 
+    @timed_query
+    def template_set_id(self, assignment):
+        """
+        Id of the template set for a {slot: CompiledTemplate} assignment, storing any new
+        template body as the next version of its name. Memoized per LeadDB.
+        """
+        key = tuple((slot, template.name, template.fmt) for slot, template in assignment.items())
+        set_id = self.template_sets.get(key)
+        if set_id is not None:
+            return set_id
+        with self.write() as conn:
+            ids = []
+            for slot in MESSAGE_SLOT_COLUMNS.values():
+                template = assignment[slot]
+                row = conn.execute(
+                    "SELECT id FROM templates WHERE name = ? AND body = ? ORDER BY version DESC LIMIT 1",
+                    (template.name, template.fmt),
+                ).fetchone()
+                if row is None:
+                    row = conn.execute(
+                        "INSERT INTO templates (name, version, body) SELECT ?, COALESCE(MAX(version), 0) + 1, ? FROM templates WHERE name = ? RETURNING id",
+                        (template.name, template.fmt, template.name),
+                    ).fetchone()
+                ids.append(row[0])
+            conn.execute("INSERT INTO template_sets (email_a, email_b, linkedin_a, linkedin_b) VALUES (?, ?, ?, ?) ON CONFLICT DO NOTHING", ids)
+            set_id = conn.execute(
+                "SELECT id FROM template_sets WHERE email_a = ? AND email_b = ? AND linkedin_a = ? AND linkedin_b = ?", ids
+            ).fetchone()[0]
+        self.template_sets[key] = set_id
+        return set_id
+
+    @timed_query
+    def migrate_message_bodies(self, renderer=DEFAULT_RENDERER, batch_size=1000):
+        """
+        Converts stored message texts to references to the renderer's default templates.
+        A row is converted only when those templates reproduce all four texts exactly;
+        anything else (edited text, older templates) keeps its text. Status, version and
+        timestamps are untouched since readers see the same messages. Returns counts.
+        """
+        set_id = self.template_set_id(renderer.assignment())
+        render = renderer.compile()
+        converted = kept = 0
+        after_id = 0
+        while True:
+            rows = self._fetch('''
+            SELECT id, full_name, company_name, role, industry, pain_point AS pain, buying_trigger AS "trigger",
+                   email_content_a, email_content_b, linkedin_content_a, linkedin_content_b
+            FROM leads WHERE message_set_id IS NULL AND email_content_a IS NOT NULL AND id > ? ORDER BY id LIMIT ?
+            ''', (after_id, batch_size))
+            if not rows:
+                break
+            after_id = rows[-1]["id"]
+            refs = []
+            for row, (texts, _) in zip(rows, render(rows)):
+                if texts == tuple(row[column] for column in MESSAGE_SLOT_COLUMNS):
+                    refs.append((set_id, row["pain"] or DEFAULT_PAIN, row["trigger"] or DEFAULT_TRIGGER, row["id"]))
+            with self.write() as conn:
+                conn.executemany(
+                    "UPDATE leads SET message_set_id = ?, message_pain = ?, message_trigger = ?, email_content_a = NULL, email_content_b = NULL, linkedin_content_a = NULL, linkedin_content_b = NULL WHERE id = ?",
+                    refs,
+                )
+            converted += len(refs)
+            kept += len(rows) - len(refs)
+        return {"converted": converted, "kept": kept}
+
+    # --- STATS (served from trigger-maintained counters) ---
+
+    @timed_query
     def get_stats(self):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT status, COUNT(*) as count FROM leads GROUP BY status")
-        return {row['status']: row['count'] for row in cursor.fetchall()}
+        """{status: count} over all leads, archived ones included."""
+        rows = self._fetch(f"SELECT status, SUM(count) as count FROM {ALL_COUNTERS} GROUP BY status HAVING SUM(count) > 0")
+        return {row['status']: row['count'] for row in rows}
+
+    @timed_query
+    def get_industry_stats(self):
+        """{industry: {status: count}}"""
+        breakdown = {}
+        for row in self._fetch(f"SELECT industry, status, SUM(count) AS count FROM {ALL_COUNTERS} GROUP BY industry, status "
+                               "HAVING SUM(count) > 0 ORDER BY industry, status"):
+            breakdown.setdefault(row['industry'], {})[row['status']] = row['count']
+        return breakdown
 
+    @timed_query
+    def get_throughput(self, windows=THROUGHPUT_WINDOWS):
+        """Leads/min reaching each stage over sliding windows, e.g. {"enrich": {"1m": 12.0, ...}}."""
+        rows = self._fetch(
+            "SELECT status, CAST(strftime('%s', 'now') AS INTEGER) / 60 - minute AS age, count "
+            "FROM stage_throughput WHERE minute > CAST(strftime('%s', 'now') AS INTEGER) / 60 - ?",
+            (max(windows),),
+        )
+        throughput = {stage: {f"{w}m": 0.0 for w in windows} for stage in dict.fromkeys(STAGE_BY_STATUS.values())}
+        for row in rows:
+            stage = STAGE_BY_STATUS.get(row['status'])
+            if stage is None:
+                continue
+            for w in windows:
+                if row['age'] < w:
+                    throughput[stage][f"{w}m"] += row['count'] / w
+        return {stage: {k: round(v, 2) for k, v in rates.items()} for stage, rates in throughput.items()}
+
+    @timed_query
+    def reconcile_counters(self, fix=True):
+        """
+        Compares the counters of both lead tables with a full recount. Returns the mismatches
+        as {"status|industry": {"counter": x, "actual": y}} (archive keys start with
+        "archive|"); with `fix`, rewrites the counters that drifted. Also prunes throughput
+        buckets older than the retention window.
+        """
+        drift = {}
+        with self.write() as conn:
+            for table, counter_table in LEAD_TABLES.items():
+                actual = {(r[0], r[1]): r[2] for r in conn.execute(
+                    f"SELECT COALESCE(status, ''), COALESCE(industry, ''), COUNT(*) FROM {table} GROUP BY 1, 2")}
+                counters = {(r[0], r[1]): r[2] for r in conn.execute(
+                    f"SELECT status, industry, count FROM {counter_table} WHERE count != 0")}
+                prefix = "" if table == "leads" else "archive|"
+                table_drift = {
+                    f"{prefix}{status}|{industry}": {"counter": counters.get((status, industry), 0), "actual": actual.get((status, industry), 0)}
+                    for status, industry in set(actual) | set(counters)
+                    if counters.get((status, industry), 0) != actual.get((status, industry), 0)
+                }
+                if fix and table_drift:
+                    conn.execute(f"DELETE FROM {counter_table}")
+                    conn.execute(RECOUNT_SQL.format(counters=counter_table, table=table))
+                drift.update(table_drift)
+            conn.execute(
+                "DELETE FROM stage_throughput WHERE minute < CAST(strftime('%s', 'now') AS INTEGER) / 60 - ?",
+                (THROUGHPUT_RETENTION_MINUTES,),
+            )
+        return drift
+
+    @timed_query
     def get_recent_leads(self, limit=500): 
-        cursor = self.conn.cursor()
         # Order by ID descending so the NEWEST generated leads always appear at the top
-        cursor.execute("SELECT * FROM leads ORDER BY id DESC LIMIT ?", (limit,))
-        return [dict(row) for row in cursor.fetchall()]
+        return self._fetch_leads(None, f"{_across(_select_list(None))} ORDER BY id DESC LIMIT ?", (limit,))
+
+    # --- PAGED BROWSING (/leads) ---
+
+    @timed_query
+    def page_leads(self, limit=100, after=None, sort="id", order="desc", q=None, columns=None, **filters):
+        """
+        One keyset page of leads, archived ones included, ordered by `sort` (PAGE_SORT_COLUMNS;
+        ties by id), with the filters of _filter_clauses and an optional full-text query `q`
+        (names, companies, roles, message content). Returns (leads, next_cursor); pass
+        next_cursor back as `after` for the following page, None means this was the last one.
+        Searches are ordered by id. `columns` always gains id and the sort column (the cursor
+        needs them).
+        """
+        if sort not in PAGE_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort leads by {sort!r}; choose from {PAGE_SORT_COLUMNS}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Order must be 'asc' or 'desc', not {order!r}")
+        match = _search_query(q)
+        if match and sort != "id":
+            raise ValueError("Search results are ordered by id")
+        columns = tuple(columns or LEAD_COLUMNS)
+        columns += tuple(c for c in dict.fromkeys(("id", sort)) if c not in columns)
+        # With a broad filter, walking the sort order's index and skipping non-matching rows
+        # fills a page sooner than collecting and sorting every match through the filter's
+        # index. The (status, id) index already serves both for a status filter by id.
+        # Each table decides on its own counts and one the filters rule out is skipped.
+        # Filters the counters cannot count (persona, confidence, ...) are bounded by the
+        # ones they can: within that bound, the segment indexes narrow the matches first.
+        active = {name for name, value in filters.items() if value is not None}
+        served = sort == "id" and active <= {"status"}
+        op = "<" if order == "desc" else ">"
+        key = (None, None) if after is None else _decode_cursor(after)
+        select = _select_list(columns)
+        arms, params = [], []
+        for table, counters in LEAD_TABLES.items():
+            bound = self._counted(counters, {name: filters.get(name) for name in COUNTED_FILTERS})
+            if bound == 0:
+                continue
+            broad = not served and bound > PAGE_SORT_SCAN_ROWS
+            clauses, arm_params = _filter_clauses(unindexed=broad, **filters)
+            if match:
+                # Driven by the search index in rowid order, so a page stops after `limit` hits
+                # instead of collecting every match first (USING makes `id` the hit's rowid).
+                # Each table only reads the hits within its id range: archived ids are mostly
+                # the oldest, so neither table probes through the other's hits first.
+                hits = (f"SELECT rowid AS id FROM leads_fts WHERE leads_fts MATCH ? "
+                        f"AND rowid BETWEEN (SELECT MIN(id) FROM {table}) AND (SELECT MAX(id) FROM {table})")
+                hit_params = [match]
+                if after is not None:
+                    hits += f" AND rowid {op} ?"
+                    hit_params.append(key[1])
+                arms.append(f"SELECT {select} FROM ({hits} ORDER BY rowid {order}) AS m JOIN {table} USING (id){_where(clauses)}")
+                arm_params = [*hit_params, *arm_params]
+            else:
+                if after is not None:
+                    clauses.append(f"id {op} ?" if sort == "id" else f"({sort}, id) {op} (?, ?)")
+                    arm_params += [key[1]] if sort == "id" else list(key)
+                arms.append(f"SELECT {select} FROM {table}{_where(clauses)}")
+            params += arm_params
+        if not arms:
+            return [], None
+        order_by = f"id {order}" if sort == "id" else f"{sort} {order}, id {order}"
+        leads = self._fetch_leads(columns, f"{' UNION ALL '.join(arms)} ORDER BY {order_by} LIMIT ?", [*params, limit])
+        next_cursor = _encode_cursor(leads[-1][sort], leads[-1]["id"]) if len(leads) == limit else None
+        return leads, next_cursor
+
+    @timed_query
+    def count_leads(self, **filters):
+        """
+        Leads matching the filters, archived ones included, when the status counters can
+        tell (status/industry filters only), else None: an exact count of other filters
+        would scan the table.
+        """
+        return self._counted(ALL_COUNTERS, filters)
+
+    def _counted(self, counters, filters):
+        """count_leads against one counters table (or ALL_COUNTERS)."""
+        active = {name: value for name, value in filters.items() if value is not None}
+        if any(name not in COUNTED_FILTERS for name in active):
+            return None
+        where, params = _lead_filters(**active)
+        with self.read() as conn:
+            return conn.execute(f"SELECT COALESCE(SUM(count), 0) FROM {counters}{where}", params).fetchone()[0]
+
+    @timed_query
+    def get_lead(self, lead_id, columns=None):
+        """One lead by id (messages rendered), hot or archived, or None."""
+        leads = self._fetch_leads(columns, _across(_select_list(columns), " WHERE id = ?"), (lead_id, lead_id))
+        return leads[0] if leads else None
+
+    # --- SEGMENT QUERIES (typed enrichment columns) ---
+
+    @timed_query
+    def segment_stats(self, group_by=("persona",), **filters):
+        """
+        Counts and average confidence per group of SEGMENT_COLUMNS values among the leads
+        matching the filters, largest groups first: [{"persona": ..., "count": n, "avg_confidence": x}].
+        """
+        unknown = [c for c in group_by if c not in SEGMENT_COLUMNS]
+        if unknown or not group_by:
+            raise ValueError(f"Cannot group leads by {unknown or 'nothing'}; choose from {SEGMENT_COLUMNS}")
+        where, params = _lead_filters(**filters)
+        groups = ", ".join(group_by)
+        return self._fetch(
+            f"SELECT {groups}, COUNT(*) AS count, ROUND(AVG(confidence_score), 2) AS avg_confidence "
+            f"FROM ({_across(f'{groups}, confidence_score', where)}) GROUP BY {groups} ORDER BY count DESC",
+            [*params, *params],
+        )
+    # --- LEAD EVENTS ---
+
+    @timed_query
+    def get_lead_events(self, lead_id, after_id=0, limit=100):
+        """A lead's history, oldest first; `after_id` is the last event id of the previous page."""
+        return self._fetch(
+            "SELECT id, lead_id, ts, stage, attempt, outcome, message FROM lead_events WHERE lead_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (lead_id, after_id, limit),
+        )
+
+    @timed_query
+    def stage_analytics(self, since=None):
+        """
+        Per stage, from the events table: event count, failures and failure rate (RETRY
+        attempts counted separately), and latency in seconds since the lead's previous event.
+        `since` (unix time) limits the report to recent events.
+        """
+        rows = self._fetch(f'''
+        WITH timed AS (
+            SELECT stage, outcome, ts, ts - LAG(ts) OVER (PARTITION BY lead_id ORDER BY id) AS latency
+            FROM lead_events
+        )
+        SELECT stage,
+               SUM(outcome != 'RETRY') AS completed,
+               SUM(outcome IN ({", ".join("?" for _ in FAILED_OUTCOMES)})) AS failed,
+               SUM(outcome = 'RETRY') AS retries,
+               AVG(latency) AS avg_latency, MAX(latency) AS max_latency
+        FROM timed WHERE ts >= ? GROUP BY stage
+        ''', (*FAILED_OUTCOMES, since or 0))
+        return {
+            row["stage"]: {
+                "completed": row["completed"], "failed": row["failed"], "retries": row["retries"],
+                "failure_rate": round(row["failed"] / row["completed"], 4) if row["completed"] else 0.0,
+                "avg_latency_seconds": round(row["avg_latency"], 3) if row["avg_latency"] is not None else None,
+                "max_latency_seconds": round(row["max_latency"], 3) if row["max_latency"] is not None else None,
+            }
+            for row in rows
+        }
+
+    @timed_query
+    def migrate_logs(self, batch_size=1000):
+        """
+        Moves text accumulated in leads.logs (written before lead_events existed) into one
+        'legacy' event per lead and clears the column. Returns the number of leads moved.
+        """
+        moved = 0
+        while True:
+            with self.write() as conn:
+                ids = [row[0] for row in conn.execute(
+                    "SELECT id FROM leads WHERE logs IS NOT NULL AND logs != '' LIMIT ?", (batch_size,))]
+                if not ids:
+                    return moved
+                marks = ", ".join("?" for _ in ids)
+                conn.execute(f'''
+                INSERT INTO lead_events (lead_id, ts, stage, attempt, outcome, message)
+                SELECT id, COALESCE(CAST(strftime('%s', last_updated) AS REAL), ?), 'legacy', 1, 'LOG', logs
+                FROM leads WHERE id IN ({marks})
+                ''', (time.time(), *ids))
+                conn.execute(f"UPDATE leads SET logs = NULL WHERE id IN ({marks})", ids)
+            moved += len(ids)
+
+    # --- CHANGE FEED ---
+
+    def current_version(self):
+        """Latest committed change sequence number (0 for an untouched database)."""
+        with self.read() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'change_seq'").fetchone()[0]
+
+    @timed_query
+    def get_changes(self, since, after_id=None, limit=500, until=None, columns=None):
+        """
+        Rows written after change `since`, ordered by (row_version, id).
+        A batch write stamps many rows with one version, so `after_id` continues a page
+        that stopped inside version `since`. `until` caps the version (used for catch-up reads).
+        Archiving a lead is not a change: it keeps its row_version in the archive.
+        """
+        if columns:
+            # The cursor fields are always needed to resume the feed
+            columns = ("id", "row_version", *(c for c in columns if c not in ("id", "row_version")))
+        if after_id is None:
+            where = " WHERE row_version > ?"
+            params = [since]
+        else:
+            where = " WHERE (row_version, id) > (?, ?)"
+            params = [since, after_id]
+        if until is not None:
+            where += " AND row_version <= ?"
+            params.append(until)
+        sql = f"{_across(_select_list(columns), where)} ORDER BY row_version, id LIMIT ?"
+        return self._fetch_leads(columns, sql, [*params, *params, limit])
+
+    def iter_export(self, columns=None, chunk_size=EXPORT_CHUNK_SIZE, **filters):
+        """
+        Streams leads (newest first, archived ones included) for export. The first item
+        yielded is the column list, then lists of row tuples of up to `chunk_size` rows each.
+        Every chunk is its own short keyset read (ids below the last one yielded), so no
+        pooled reader or read transaction is held while a slow client downloads: exports
+        neither starve other reads nor hold back WAL checkpoints, and memory stays bounded by
+        one chunk. A lead changed mid-export shows up once, as its chunk read it.
+        Filters: status, industry, persona, min_confidence (or any other _filter_clauses
+        filter), updated_since, updated_until. `columns` gains id (the keyset needs it).
+        """
+        clauses, params = _filter_clauses(**filters, unindexed=True)
+        columns = columns or LEAD_COLUMNS
+        if "id" not in columns:
+            columns = ("id", *columns)
+        select, id_index = _select_list(columns), columns.index("id")
+        yield list(columns)
+        last_id = None
+        while True:
+            if last_id is None:
+                sql, chunk_params = _across(select, _where(clauses)), [*params, *params]
+            else:
+                sql, chunk_params = _across(select, _where([*clauses, "id < ?"])), [*params, last_id, *params, last_id]
+            with self.read() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None  # plain tuples: no per-row sqlite3.Row wrapper
+                rows = cursor.execute(f"{sql} ORDER BY id DESC LIMIT ?", [*chunk_params, chunk_size]).fetchall()
+                rows = self._render_rows(conn, columns, rows)
+            if not rows:
+                return
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][id_index]
+
+    # --- ARCHIVAL (hot/cold split) ---
+
+    @timed_query
+    def archive_leads(self, older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, max_batches=None):
+        """
+        Moves SENT/FAILED leads last updated at least `older_than_days` ago from leads to
+        leads_archive, oldest first, `batch_size` rows per transaction so stage writes get
+        the writer in between. After each batch the pages it freed are handed back to the
+        file system (incremental auto-vacuum; a database created before archival needs one
+        vacuum() first). Returns counts, including the hot and archived totals afterwards.
+        """
+        cutoff = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - older_than_days * 86400))
+        # Per status, the id to continue after: rows too recent to move are passed over once
+        pending = dict.fromkeys(ARCHIVE_STATUSES, 0)
+        archived = batches = pages_freed = 0
+        while pending and (max_batches is None or batches < max_batches):
+            with self.write() as conn:
+                columns = ", ".join(row[1] for row in conn.execute("PRAGMA table_info(leads)"))
+                ids = []
+                for status in list(pending):
+                    wanted = batch_size - len(ids)
+                    found = [row[0] for row in conn.execute(
+                        "SELECT id FROM leads WHERE status = ? AND id > ? AND last_updated <= ? ORDER BY id LIMIT ?",
+                        (status, pending[status], cutoff, wanted))]
+                    ids += found
+                    if len(found) < wanted:
+                        del pending[status]
+                        continue
+                    pending[status] = found[-1]
+                    break
+                if not ids:
+                    break
+                marks = ", ".join("?" for _ in ids)
+                # Archive first: the search index keeps the entries of rows that reach the archive
+                conn.execute(f"INSERT INTO leads_archive ({columns}, archived_at) SELECT {columns}, ? FROM leads WHERE id IN ({marks})",
+                             (time.time(), *ids))
+                conn.execute(f"DELETE FROM leads WHERE id IN ({marks})", ids)
+            archived += len(ids)
+            batches += 1
+            pages_freed += self._release_free_pages()
+        return {"archived": archived, "batches": batches, "pages_freed": pages_freed, **self.archive_stats()}
+
+    def _release_free_pages(self, pages=VACUUM_PAGES_PER_BATCH):
+        """Truncates up to `pages` free pages off the file (incremental auto-vacuum only). Returns pages freed."""
+        with self.write() as conn:
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # executescript steps the pragma to completion (execute() would free a single page)
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+            return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    @timed_query
+    def vacuum(self):
+        """
+        Rewrites the whole database file compactly and switches it to incremental
+        auto-vacuum, which databases created before archival lack. Holds the writer
+        throughout (minutes on a large file): run it during maintenance, not under load.
+        """
+        with self.write() as conn:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        return self.archive_stats()
+
+    def archive_stats(self):
+        """Lead counts per table (from the counters), file pages and the auto-vacuum mode."""
+        with self.read() as conn:
+            counts = {table: conn.execute(f"SELECT COALESCE(SUM(count), 0) FROM {counters}").fetchone()[0]
+                      for table, counters in LEAD_TABLES.items()}
+            pages = conn.execute("PRAGMA page_count").fetchone()[0]
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        return {"hot_leads": counts["leads"], "archived_leads": counts["leads_archive"], "page_count": pages,
+                "freelist_count": free, "auto_vacuum": ("none", "full", "incremental")[mode]}
+
+    def pool_metrics(self):
+        return self.pool.metrics()
 
     def close(self):
-        self.conn.close()
+        if self.pool is not None:
+            self.pool = None
+            release_pool(self.path)
 
 if __name__ == "__main__":
     init_db()
+    # Also converts message texts written before templates were stored by reference,
+    # moves accumulated log text into lead_events, and switches a database created before
+    # archival to incremental auto-vacuum (one full VACUUM)
+    db = LeadDB()
+    print(db.migrate_message_bodies())
+    print({"logs_moved": db.migrate_logs()})
+    if db.archive_stats()["auto_vacuum"] != "incremental":
+        print(db.vacuum())
+    db.close()
 
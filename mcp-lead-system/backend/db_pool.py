@@ -0,0 +1,129 @@
+# SQLite connection management: a pool of read connections plus one serialized writer
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Read connections per database (WAL readers never block each other or the writer)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+class WaitStats:
+    """Accumulates how long callers waited to obtain a connection."""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "acquisitions": self.count,
+                "wait_seconds_total": round(self.total, 6),
+                "wait_seconds_avg": round(self.total / self.count, 6) if self.count else 0.0,
+                "wait_seconds_max": round(self.max, 6),
+            }
+
+class ConnectionPool:
+    """
+    Opens `size` read connections and a single writer connection to `path` once.
+    Readers are borrowed from a queue for the duration of a query; the writer is
+    guarded by a lock so transactions from different threads never interleave.
+    `pragmas` are executed on every connection (journal mode, cache size, ...).
+    """
+    def __init__(self, path: str, size: int = DB_POOL_SIZE, pragmas=(), connect_args: dict = None):
+        self.path = path
+        self.size = size
+        connect_args = connect_args or {}
+        self.writer_conn = self._connect(pragmas, connect_args)
+        self.writer_lock = threading.Lock()
+        self.readers = queue.Queue()
+        for _ in range(size):
+            conn = self._connect(pragmas, connect_args)
+            conn.execute("PRAGMA query_only=ON")
+            self.readers.put(conn)
+        self.reader_waits = WaitStats()
+        self.writer_waits = WaitStats()
+        self.closed = False
+
+    def _connect(self, pragmas, connect_args):
+        conn = sqlite3.connect(self.path, check_same_thread=False, **connect_args)
+        conn.row_factory = sqlite3.Row
+        for pragma in pragmas:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Borrows a read-only connection; blocks while all readers are in use."""
+        start = time.perf_counter()
+        conn = self.readers.get()
+        self.reader_waits.record(time.perf_counter() - start)
+        try:
+            yield conn
+        finally:
+            # Never hand a connection back mid-transaction (e.g. an abandoned cursor)
+            if conn.in_transaction:
+                conn.rollback()
+            self.readers.put(conn)
+
+    @contextmanager
+    def writer(self):
+        """Holds the writer for one transaction: commits on success, rolls back on error."""
+        start = time.perf_counter()
+        with self.writer_lock:
+            self.writer_waits.record(time.perf_counter() - start)
+            with self.writer_conn:
+                yield self.writer_conn
+
+    def metrics(self) -> dict:
+        return {
+            "path": self.path,
+            "pool_size": self.size,
+            "readers_idle": self.readers.qsize(),
+            "reader": self.reader_waits.snapshot(),
+            "writer": self.writer_waits.snapshot(),
+        }
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        with self.writer_lock:
+            self.writer_conn.close()
+        for _ in range(self.size):
+            self.readers.get().close()
+
+# --- SHARED POOLS (one per database file per process) ---
+
+_pools = {}
+_refs = {}
+_registry_lock = threading.Lock()
+
+def acquire_pool(path: str, **kwargs) -> ConnectionPool:
+    """Returns the process-wide pool for `path`, opening it on first use."""
+    with _registry_lock:
+        if path not in _pools:
+            _pools[path] = ConnectionPool(path, **kwargs)
+            _refs[path] = 0
+        _refs[path] += 1
+        return _pools[path]
+
+def release_pool(path: str):
+    """Drops one reference; the pool's connections are closed when the last user releases it."""
+    with _registry_lock:
+        if path not in _pools:
+            return
+        _refs[path] -= 1
+        if _refs[path] <= 0:
+            _pools.pop(path).close()
+            del _refs[path]
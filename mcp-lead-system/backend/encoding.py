@@ -0,0 +1,18 @@
+# Response serialization: one fast JSON encoder for the MCP tools and the HTTP bridge
+# (the HTTP response classes built on it live in responses.py)
+
+import json
+
+try:
+    import orjson
+except ImportError:  # stdlib json is the (slower) fallback
+    orjson = None
+
+def dumps(obj) -> bytes:
+    """Compact UTF-8 JSON; values json can't encode natively (dates, decimals) become strings."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=str, separators=(",", ":"), ensure_ascii=False).encode()
+
+def dumps_text(obj) -> str:
+    return dumps(obj).decode()
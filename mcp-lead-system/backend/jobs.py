@@ -0,0 +1,101 @@
+# Background execution for pipeline stages called from the API bridge
+
+import asyncio
+import inspect
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+
+# Bounded pool: stages never run on the event loop, and never more than this many at once
+STAGE_WORKERS = int(os.getenv("STAGE_WORKERS", "4"))
+# Finished jobs are forgotten oldest-first beyond this many
+MAX_TRACKED_JOBS = 1000
+
+def _call(fn, kwargs):
+    """Runs a stage function to completion in the current (worker) thread."""
+    if inspect.iscoroutinefunction(fn):
+        return asyncio.run(fn(**kwargs))
+    return fn(**kwargs)
+
+def _processed(result: dict) -> int:
+    """Leads a chunk claimed, whatever became of them: a chunk that claimed none ends the job."""
+    return result.get("processed", 0)
+
+class JobManager:
+    def __init__(self, max_workers: int = STAGE_WORKERS, max_jobs: int = MAX_TRACKED_JOBS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage")
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    async def run(self, fn, **kwargs) -> dict:
+        """Runs a stage on the pool and awaits it without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(_call, fn, kwargs))
+
+    def submit(self, stage: str, fn, chunk_size: int = None, **kwargs) -> dict:
+        """
+        Queues a stage as a background job and returns its record immediately.
+        With `chunk_size`, a large `limit` is processed in several smaller stage calls so
+        progress can be reported between them; the job stops early once a chunk finds no work.
+        """
+        job = {
+            "id": uuid.uuid4().hex,
+            "stage": stage,
+            "state": "queued",
+            "params": kwargs,
+            "progress": {"processed": 0, "target": kwargs.get("limit")},
+            "result": None,
+            "error": None,
+            "submitted_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        with self.lock:
+            self.jobs[job["id"]] = job
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+        self.executor.submit(self._execute, job, fn, chunk_size, kwargs)
+        return dict(job)
+
+    def _execute(self, job, fn, chunk_size, kwargs):
+        job["state"] = "running"
+        job["started_at"] = datetime.now().isoformat()
+        try:
+            if not chunk_size or "limit" not in kwargs:
+                job["result"] = _call(fn, kwargs)
+            else:
+                remaining, totals = kwargs["limit"], {}
+                while remaining > 0:
+                    result = _call(fn, {**kwargs, "limit": min(chunk_size, remaining)})
+                    for key, value in result.items():
+                        # Counters are summed across chunks, labels keep their latest value
+                        if isinstance(value, int) and not isinstance(value, bool):
+                            totals[key] = totals.get(key, 0) + value
+                        else:
+                            totals[key] = value
+                    processed = _processed(result)
+                    job["progress"]["processed"] += processed
+                    remaining -= chunk_size
+                    if processed == 0:
+                        break
+                job["result"] = totals
+            job["state"] = "done"
+        except Exception as e:
+            job["state"] = "failed"
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = datetime.now().isoformat()
+
+    def get(self, job_id: str) -> dict:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self) -> list:
+        with self.lock:
+            return [dict(job) for job in reversed(self.jobs.values())]
@@ -0,0 +1,43 @@
+# Lease renewal for claimed leads: a stage holding a batch for longer than one lease (a
+# rate-limited send, a slow model) keeps it claimed until its results are written
+
+import asyncio
+from contextlib import asynccontextmanager, contextmanager, suppress
+from database import CLAIM_LEASE_SECONDS
+
+@asynccontextmanager
+async def held(db, worker_id: str, ids=None, lease_seconds: float = CLAIM_LEASE_SECONDS):
+    """
+    Renews `worker_id`'s leases on `ids` (None: on every lead it holds) every third of a
+    lease while the block runs. Renewal never claims anything: leads the worker has
+    written or released meanwhile are left alone.
+    """
+    if ids is not None and not ids:
+        yield
+        return
+
+    async def renew():
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            await asyncio.to_thread(db.renew_claims, worker_id, lease_seconds, ids)
+
+    task = asyncio.create_task(renew())
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+@contextmanager
+def released_on_error(db, worker_id: str, leads):
+    """
+    Hands `worker_id`'s claims on `leads` back to their queues at once if the block raises,
+    instead of leaving the leads locked until their leases run out. Leads already written
+    carry no claim any more and are left alone.
+    """
+    try:
+        yield
+    except BaseException:
+        db.release_claims(worker_id, [lead["id"] for lead in leads])
+        raise
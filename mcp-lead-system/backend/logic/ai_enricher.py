@@ -0,0 +1,284 @@
+# Async AI-enrichment client: multi-lead prompts, caching, coalescing, offline fallback
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from logic.enricher import DEFAULT_ENGINE, EnrichmentEngine, enrich_many
+
+# Remote model endpoint; when unset the in-process mock model is used
+AI_MODEL_URL = os.getenv("AI_MODEL_URL")
+AI_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'ai_cache.db')
+# Cached AI answers are reused for a week by default
+AI_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+def cache_key(lead: dict) -> str:
+    """Normalized (company, industry, role): case and whitespace never cause a miss."""
+    return "|".join(" ".join(str(lead.get(field) or "").lower().split()) for field in ("company_name", "industry", "role"))
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+# --- 1. CACHE ---
+
+class EnrichmentCache:
+    """
+    Two-level LRU/TTL cache: an in-memory OrderedDict in front of a small SQLite file,
+    so answers survive restarts. `path=None` keeps it memory-only.
+    """
+    def __init__(self, path: str = AI_CACHE_PATH, max_memory: int = 50_000,
+                 max_persistent: int = 1_000_000, ttl: float = AI_CACHE_TTL_SECONDS):
+        self.max_memory = max_memory
+        self.max_persistent = max_persistent
+        self.ttl = ttl
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.conn = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS ai_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_stored_at ON ai_cache(stored_at)")
+
+    def get_many(self, keys) -> dict:
+        now = time.time()
+        found, missing = {}, []
+        with self.lock:
+            for key in keys:
+                entry = self.memory.get(key)
+                if entry and now - entry[1] < self.ttl:
+                    self.memory.move_to_end(key)
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+            if missing and self.conn:
+                for i in range(0, len(missing), 500):
+                    chunk = missing[i:i + 500]
+                    rows = self.conn.execute(
+                        f"SELECT key, value, stored_at FROM ai_cache WHERE key IN ({','.join('?' * len(chunk))}) AND stored_at > ?",
+                        (*chunk, now - self.ttl),
+                    ).fetchall()
+                    for key, value, stored_at in rows:
+                        found[key] = json.loads(value)
+                        self._remember(key, found[key], stored_at)
+        return found
+
+    def _remember(self, key, value, stored_at):
+        self.memory[key] = (value, stored_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory:
+            self.memory.popitem(last=False)
+
+    def put_many(self, items: dict):
+        now = time.time()
+        with self.lock:
+            for key, value in items.items():
+                self._remember(key, value, now)
+            if self.conn and items:
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO ai_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                        [(key, json.dumps(value), now) for key, value in items.items()],
+                    )
+                    # Evict the oldest entries beyond the persistent cap
+                    self.conn.execute(
+                        "DELETE FROM ai_cache WHERE key IN (SELECT key FROM ai_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_persistent,),
+                    )
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+# --- 2. MODEL BACKENDS ---
+
+def build_prompt(leads) -> str:
+    """One prompt covering several leads; the model answers with a JSON list in the same order."""
+    lines = [f"{i + 1}. {lead.get('role', '')} at {lead.get('company_name', '')} ({lead.get('industry', '')})" for i, lead in enumerate(leads)]
+    return (
+        "For each numbered B2B lead, return a JSON list of objects with company_size, persona, "
+        "pain_points (list), buying_trigger and confidence_score (0-100), in the same order.\n" + "\n".join(lines)
+    )
+
+class MockModelBackend:
+    """In-process stand-in for the LLM (the original simulated AI mode)."""
+    async def enrich_batch(self, leads) -> list:
+        return enrich_many(leads, mode="ai")
+
+class HTTPModelBackend:
+    """
+    POSTs one multi-lead prompt per batch to a model endpoint returning {"results": [...]}.
+    Its connection pool is bound to the event loop of the first request: use it from one
+    loop (AIEnrichmentClient runs it on its own) and close() it on that loop.
+    """
+    def __init__(self, url: str, max_connections: int = 16):
+        self.url = url
+        self.max_connections = max_connections
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import httpx  # only needed when a remote model is configured
+            self._client = httpx.AsyncClient(limits=httpx.Limits(max_connections=self.max_connections), timeout=None)
+        return self._client
+
+    async def enrich_batch(self, leads) -> list:
+        payload = {
+            "prompt": build_prompt(leads),
+            "leads": [{k: lead.get(k) for k in ("company_name", "industry", "role")} for lead in leads],
+        }
+        response = await self.client.post(self.url, json=payload)
+        response.raise_for_status()
+        results = response.json()["results"]
+        if len(results) != len(leads):
+            raise ValueError(f"model returned {len(results)} results for {len(leads)} leads")
+        return [{**result, "enrichment_source": "AI"} for result in results]
+
+    async def close(self):
+        client, self._client = self._client, None
+        if client:
+            await client.aclose()
+
+# --- 3. CLIENT ---
+
+class AIEnrichmentClient:
+    """
+    Enriches leads through a model backend:
+    - cache hits (normalized company/industry/role) never reach the model
+    - identical keys are coalesced, within a batch and across concurrent calls, from any
+      thread: every call runs on the client's own event loop, so in-flight prompts and the
+      backend's connections are shared by callers on different loops
+    - misses are grouped `batch_size` per prompt, at most `concurrency` prompts in flight
+    - a prompt that times out or errors falls back to the offline rules for its leads
+      (fallback answers are not cached, so the model is asked again next time)
+    """
+    def __init__(self, backend=None, cache: EnrichmentCache = None, batch_size: int = 20,
+                 concurrency: int = 4, timeout: float = 10.0, fallback_engine: EnrichmentEngine = DEFAULT_ENGINE):
+        self.backend = backend or MockModelBackend()
+        self.cache = cache if cache is not None else EnrichmentCache(path=None)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.fallback_engine = fallback_engine
+        self.inflight = {}  # key -> Future, on self.loop
+        self.loop = None
+        self.thread = None
+        self.loop_lock = threading.Lock()
+        self.counters = {"leads": 0, "cache_hits": 0, "coalesced": 0, "model_leads": 0, "fallbacks": 0, "batches": 0}
+        self.batch_latencies = []
+
+    def _fallback(self, lead) -> dict:
+        result = self.fallback_engine.enrich(lead, "offline")
+        result["enrichment_source"] = "OFFLINE_FALLBACK"
+        return result
+
+    async def _run_batch(self, semaphore, batch, futures):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                results = await asyncio.wait_for(self.backend.enrich_batch([lead for _, lead in batch]), self.timeout)
+                fresh = {key: result for (key, _), result in zip(batch, results)}
+                await asyncio.to_thread(self.cache.put_many, fresh)
+            except Exception:
+                self.counters["fallbacks"] += len(batch)
+                fresh = {key: self._fallback(lead) for key, lead in batch}
+            finally:
+                self.batch_latencies.append(time.perf_counter() - start)
+                self.counters["batches"] += 1
+            for key, _ in batch:
+                futures[key].set_result(fresh[key])
+
+    def _client_loop(self):
+        """The client's event loop, started in a daemon thread by the first call."""
+        with self.loop_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self.loop.run_forever, name="ai-enrichment", daemon=True)
+                self.thread.start()
+            return self.loop
+
+    async def enrich_many(self, leads) -> list:
+        """Returns one enrichment dict per lead, in order."""
+        loop = self._client_loop()
+        if asyncio.get_running_loop() is loop:
+            return await self._enrich_many(list(leads))
+        # Stage calls each run under their own asyncio.run: hand the work to the client's loop
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._enrich_many(list(leads)), loop))
+
+    async def _enrich_many(self, leads) -> list:
+        keys = [cache_key(lead) for lead in leads]
+        self.counters["leads"] += len(leads)
+
+        # The persistent cache is SQLite: look it up off the loop
+        results = await asyncio.to_thread(self.cache.get_many, set(keys))
+        self.counters["cache_hits"] += sum(1 for key in keys if key in results)
+
+        inflight = self.inflight
+        waiting, to_fetch = {}, {}
+        for key, lead in zip(keys, leads):
+            if key in results or key in waiting:
+                continue
+            if key in inflight:
+                waiting[key] = inflight[key]
+                self.counters["coalesced"] += 1
+            else:
+                waiting[key] = inflight[key] = asyncio.get_running_loop().create_future()
+                to_fetch[key] = lead
+        # Repeats of a key within this call are coalesced too
+        self.counters["coalesced"] += sum(1 for key in keys if key not in results) - len(waiting)
+
+        if to_fetch:
+            self.counters["model_leads"] += len(to_fetch)
+            items = list(to_fetch.items())
+            semaphore = asyncio.Semaphore(self.concurrency)
+            try:
+                await asyncio.gather(*(
+                    self._run_batch(semaphore, items[i:i + self.batch_size], inflight)
+                    for i in range(0, len(items), self.batch_size)
+                ))
+            finally:
+                for key in to_fetch:
+                    future = inflight.pop(key, None)
+                    if future and not future.done():
+                        future.cancel()  # don't leave coalesced waiters hanging
+
+        for key, future in waiting.items():
+            results[key] = await future
+        # Copies, so callers can't mutate cached answers
+        return [{**results[key], "pain_points": list(results[key].get("pain_points", []))} for key in keys]
+
+    def close(self):
+        """Closes the backend's connections, stops the client's loop and closes the cache."""
+        with self.loop_lock:
+            loop, thread, self.loop, self.thread = self.loop, self.thread, None, None
+        if loop:
+            if hasattr(self.backend, "close"):
+                asyncio.run_coroutine_threadsafe(self.backend.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        self.cache.close()
+
+    def stats(self) -> dict:
+        leads = self.counters["leads"]
+        return {
+            **self.counters,
+            "cache_hit_rate": round(self.counters["cache_hits"] / leads, 4) if leads else 0.0,
+            "batch_latency_p50": round(_percentile(self.batch_latencies, 50), 4),
+            "batch_latency_p99": round(_percentile(self.batch_latencies, 99), 4),
+        }
+
+def build_default_client() -> AIEnrichmentClient:
+    """Client used by the MCP tool: remote model if AI_MODEL_URL is set, persistent cache."""
+    backend = HTTPModelBackend(AI_MODEL_URL) if AI_MODEL_URL else MockModelBackend()
+    return AIEnrichmentClient(backend=backend, cache=EnrichmentCache())
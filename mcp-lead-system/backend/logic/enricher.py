@@ -1,48 +1,29 @@
 # Lead enrichment rules and AI logic
 
+import json
+import os
 import random
+import re
+from functools import lru_cache
 
-def get_company_size_heuristic(role: str) -> str:
-    """
-    Offline Heuristic: Estimates company size based on the seniority of the role.
-    Assumption: C-Level/VP roles often exist in clearly defined hierarchies in larger orgs,
-    whereas 'Head of' might vary. This is a simple rule-based guess.
-    """
-    if any(x in role for x in ["Chief", "CTO", "CFO", "CEO", "VP", "President"]):
-        return random.choice(["201-500", "501-1000", "1000+"])
-    return random.choice(["1-10", "11-50", "51-200"])
+# (industry, role) profiles kept per engine; roles come from lead data, so the pairs are open-ended
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "4096"))
 
-def enrich_lead_logic(lead: dict, mode: str = "offline") -> dict:
-    """
-    Enriches a lead with estimated size, persona, pain points, and triggers.
-    
-    DOCUMENTATION - MODES:
-    ----------------------
-    1. OFFLINE MODE (Rule-Based):
-       - Uses deterministic dictionaries and heuristics.
-       - Fast, free, no API calls.
-       - Returns fixed 'Confidence Score' (90+) because rules are static.
-       
-    2. AI MODE (Mocked for Free Tier Compliance):
-       - In a real production system, this would call OpenAI/Anthropic.
-       - Here, it simulates LLM variability by adding 'varied' pain points 
-         and calculating a dynamic confidence score.
-       - Complies with assignment constraint: "mock mode that produces equivalent outputs".
-    """
-    industry = lead.get("industry", "General")
-    role = lead.get("role", "")
-    
-    # --- 1. PERSONA MAPPING (Rule-Based) ---
-    # Assigns a standardized persona tag based on job title keywords.
-    persona = "Individual Contributor"
-    if any(x in role for x in ["VP", "Head", "Director", "Chief", "CFO", "CTO", "CEO"]):
-        persona = "Decision Maker"
-    elif "Manager" in role:
-        persona = "Operational Manager"
-
-    # --- 2. KNOWLEDGE BASE (Structured Rules) ---
-    # This acts as our "Offline Database" of industry insights.
-    knowledge_base = {
+# --- 1. DEFAULT RULE SET ---
+# This acts as our "Offline Database" of industry insights. It is compiled once at import
+# (see EnrichmentEngine); custom rule sets with the same shape can be loaded from JSON.
+DEFAULT_RULES = {
+    # Assigns a standardized persona tag based on job title keywords (first match wins).
+    "persona_rules": [
+        {"persona": "Decision Maker", "keywords": ["VP", "Head", "Director", "Chief", "CFO", "CTO", "CEO"]},
+        {"persona": "Operational Manager", "keywords": ["Manager"]},
+    ],
+    "default_persona": "Individual Contributor",
+    # Offline size heuristic: seniority keywords pick the "large" size bands.
+    "senior_keywords": ["Chief", "CTO", "CFO", "CEO", "VP", "President"],
+    "size_bands": {"senior": ["201-500", "501-1000", "1000+"], "other": ["1-10", "11-50", "51-200"]},
+    "ai_size_bands": ["50-200", "201-1000", "Enterprise"],
+    "knowledge_base": {
         "SaaS": {
             "pains": ["High customer churn", "Long deployment cycles", "Technical debt"],
             "trigger": "Recently raised Series B funding"
@@ -67,38 +48,115 @@ def enrich_lead_logic(lead: dict, mode: str = "offline") -> dict:
             "pains": ["Clinical trial delays", "FDA approval uncertainty", "R&D data silos"],
             "trigger": "Phase 3 trial results announced"
         }
-    }
-    
+    },
     # Default fallback
-    kb_data = knowledge_base.get(industry, {
-        "pains": ["Operational inefficiency", "Budget constraints"], 
+    "fallback": {
+        "pains": ["Operational inefficiency", "Budget constraints"],
         "trigger": "Fiscal year-end planning"
-    })
+    },
+}
+
+def _keyword_matcher(keywords):
+    """One compiled alternation per keyword list (substring semantics, like `x in role`)."""
+    return re.compile("|".join(re.escape(k) for k in keywords)) if keywords else None
+
+# --- 2. COMPILED ENGINE ---
+
+class EnrichmentEngine:
+    """
+    Compiles a rule set once and memoizes the deterministic part of each enrichment per
+    (industry, role) in an LRU of PROFILE_CACHE_SIZE pairs. Only the size band draw (and the AI-mode confidence) stays per lead,
+    consuming `random` in exactly the same order as the original per-lead code.
+    """
+    def __init__(self, rules: dict = None):
+        rules = {**DEFAULT_RULES, **(rules or {})}
+        self.persona_rules = [(_keyword_matcher(r["keywords"]), r["persona"]) for r in rules["persona_rules"]]
+        self.default_persona = rules["default_persona"]
+        self.senior = _keyword_matcher(rules["senior_keywords"])
+        self.size_bands = rules["size_bands"]
+        self.ai_size_bands = rules["ai_size_bands"]
+        self.knowledge_base = rules["knowledge_base"]
+        self.fallback = rules["fallback"]
+        self.profile = lru_cache(maxsize=PROFILE_CACHE_SIZE)(self._profile)
+
+    def _profile(self, industry: str, role: str) -> tuple:
+        """(persona, offline size bands, pains, trigger) for an (industry, role) pair (see profile)."""
+        persona = self.default_persona
+        for matcher, name in self.persona_rules:
+            if matcher and matcher.search(role):
+                persona = name
+                break
+        bands = self.size_bands["senior" if self.senior and self.senior.search(role) else "other"]
+        kb_data = self.knowledge_base.get(industry, self.fallback)
+        return (persona, bands, tuple(kb_data["pains"]), kb_data["trigger"])
 
-    # --- 3. MODE HANDLING ---
+    def enrich(self, lead: dict, mode: str = "offline") -> dict:
+        persona, bands, pains, trigger = self.profile(lead.get("industry", "General"), lead.get("role", ""))
+
+        if mode == "offline":
+            # Rule-based size estimation
+            size = random.choice(bands)
+            pain_points = list(pains)
+            confidence = 95 # Rules are deterministic
+        else: # mode == "ai"
+            # Simulate AI reasoning variability
+            size = random.choice(self.ai_size_bands)
+            # Mock AI "generating" specific/varied insights
+            pain_points = list(pains) + ["(AI inferred: Competitor pressure)"]
+            trigger = f"{trigger} (AI Detected Signal)"
+            # AI confidence varies based on data quality (simulated)
+            confidence = random.randint(70, 99)
+
+        return {
+            "company_size": size,
+            "persona": persona,
+            "pain_points": pain_points,
+            "buying_trigger": trigger,
+            "confidence_score": confidence,
+            "enrichment_source": mode.upper()
+        }
+
+    def enrich_many(self, leads, mode: str = "offline") -> list:
+        """Batch API: enriches every lead in order (same output as calling enrich() per lead)."""
+        enrich = self.enrich
+        return [enrich(lead, mode) for lead in leads]
+
+def load_rules(path: str) -> EnrichmentEngine:
+    """Builds an engine from a JSON rule file; missing top-level keys fall back to the defaults."""
+    with open(path) as f:
+        return EnrichmentEngine(json.load(f))
+
+DEFAULT_ENGINE = EnrichmentEngine()
+
+# --- 3. PUBLIC API ---
+
+def get_company_size_heuristic(role: str) -> str:
+    """
+    Offline Heuristic: Estimates company size based on the seniority of the role.
+    Assumption: C-Level/VP roles often exist in clearly defined hierarchies in larger orgs,
+    whereas 'Head of' might vary. This is a simple rule-based guess.
+    """
+    return random.choice(DEFAULT_ENGINE.profile("", role)[1])
+
+def enrich_lead_logic(lead: dict, mode: str = "offline", engine: EnrichmentEngine = None) -> dict:
+    """
+    Enriches a lead with estimated size, persona, pain points, and triggers.
     
-    if mode == "offline":
-        # Rule-based size estimation
-        size = get_company_size_heuristic(role)
-        pain_points = kb_data["pains"]
-        trigger = kb_data["trigger"]
-        confidence = 95 # Rules are deterministic
-        
-    else: # mode == "ai"
-        # Simulate AI reasoning variability
-        size = random.choice(["50-200", "201-1000", "Enterprise"])
-        # Mock AI "generating" specific/varied insights
-        pain_points = kb_data["pains"] + ["(AI inferred: Competitor pressure)"]
-        trigger = f"{kb_data['trigger']} (AI Detected Signal)"
-        # AI confidence varies based on data quality (simulated)
-        confidence = random.randint(70, 99)
-
-    return {
-        "company_size": size,
-        "persona": persona,
-        "pain_points": pain_points,
-        "buying_trigger": trigger,
-        "confidence_score": confidence,
-        "enrichment_source": mode.upper()
-    }
+    DOCUMENTATION - MODES:
+    ----------------------
+    1. OFFLINE MODE (Rule-Based):
+       - Uses deterministic dictionaries and heuristics.
+       - Fast, free, no API calls.
+       - Returns fixed 'Confidence Score' (90+) because rules are static.
+       
+    2. AI MODE (Mocked for Free Tier Compliance):
+       - In a real production system, this would call OpenAI/Anthropic.
+       - Here, it simulates LLM variability by adding 'varied' pain points 
+         and calculating a dynamic confidence score.
+       - Complies with assignment constraint: "mock mode that produces equivalent outputs".
+    """
+    return (engine or DEFAULT_ENGINE).enrich(lead, mode)
 
+def enrich_many(leads, mode: str = "offline", engine: EnrichmentEngine = None) -> list:
+    """Enriches a batch of leads with the compiled (memoized) rule engine."""
+    return (engine or DEFAULT_ENGINE).enrich_many(leads, mode)
@@ -0,0 +1,69 @@
+# Streaming lead exporters (CSV / NDJSON / Parquet)
+
+import csv
+import importlib.util
+import io
+import json
+
+# Parquet export is optional; pyarrow (slow to import) loads with the first Parquet export
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+INTEGER_COLUMNS = {"id", "row_version", "confidence_score", "attempt_count"}
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+def stream_csv(chunks):
+    """Encodes a (columns, row-chunk, row-chunk, ...) stream as CSV bytes, one chunk at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for i, chunk in enumerate(chunks):
+        if i == 0:
+            writer.writerow(chunk)  # header
+        else:
+            writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+def stream_ndjson(chunks):
+    """Encodes the stream as newline-delimited JSON objects."""
+    columns = None
+    for chunk in chunks:
+        if columns is None:
+            columns = chunk
+            continue
+        yield "".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in chunk).encode()
+
+def stream_parquet(chunks):
+    """Writes one Parquet row group per chunk and yields the bytes as each group is flushed."""
+    if not HAS_PYARROW:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    chunks = iter(chunks)
+    columns = next(chunks)
+    # Lead columns are TEXT apart from the integer keys
+    schema = pa.schema([(c, pa.int64() if c in INTEGER_COLUMNS else pa.string()) for c in columns])
+    sink = io.BytesIO()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in chunks:
+        data = {c: [row[i] for row in chunk] for i, c in enumerate(columns)}
+        writer.write_table(pa.Table.from_pydict(data, schema=schema))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+STREAMERS = {"csv": stream_csv, "ndjson": stream_ndjson, "parquet": stream_parquet}
+
+def is_available(fmt: str) -> bool:
+    return fmt in STREAMERS and (fmt != "parquet" or HAS_PYARROW)
+
+def stream_export(chunks, fmt: str = "csv"):
+    """Returns a bytes generator for `fmt` over LeadDB.iter_export() output."""
+    return STREAMERS[fmt](chunks)
@@ -0,0 +1,75 @@
+# Local HTTP stand-in for the AI enrichment model (tests and benchmarks)
+
+import argparse
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from logic.enricher import enrich_many
+
+class FakeModelServer(ThreadingHTTPServer):
+    """
+    Answers POST {"leads": [...]} with {"results": [...]} using the mock AI rules.
+    `latency` (+ uniform `jitter`) is added per request, and `slow_rate` of requests
+    take `slow_latency` instead, to exercise client timeouts.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.05, jitter=0.0, slow_rate=0.0, slow_latency=5.0, seed=None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-response; that is expected here
+        pass
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/enrich"
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        server.requests += 1
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        slow = server.rng.random() < server.slow_rate
+        time.sleep(server.slow_latency if slow else server.latency + server.rng.uniform(0, server.jitter))
+        results = enrich_many(body["leads"], mode="ai")
+        payload = json.dumps({"results": results}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@contextmanager
+def serve(**kwargs):
+    """Runs a FakeModelServer on a background thread for the duration of the block."""
+    server = FakeModelServer(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in model server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    with serve(port=args.port, latency=args.latency) as server:
+        print(f"Serving fake model on {server.url}")
+        threading.Event().wait()
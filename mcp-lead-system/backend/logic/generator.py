@@ -1,8 +1,16 @@
-from faker import Faker
+from functools import lru_cache
+from collections import deque
+import os
 import random
 import re
 
-fake = Faker()
+# Faker and its locale providers load on first use, not at import: importing faker and
+# building Faker() costs about 90ms, which processes that only serve reads never need.
+@lru_cache(maxsize=1)
+def get_faker():
+    """The shared Faker instance (default en_US providers)."""
+    from faker import Faker
+    return Faker()
 
 # --- 1. CONFIGURATION & CONSISTENCY RULES ---
 
@@ -39,14 +47,18 @@ GENERIC_ROLES = ["CEO", "Founder", "Managing Director", "VP of Sales"]
 
 # --- 2. HELPER FUNCTIONS ---
 
+_NON_ALNUM = re.compile(r'[^a-zA-Z0-9]')
+
+@lru_cache(maxsize=65536)
 def clean_string(text: str) -> str:
     """Removes special characters for URL/Email generation."""
     # Convert 'Acme, Inc.' -> 'acmeinc'
-    return re.sub(r'[^a-zA-Z0-9]', '', text).lower()
+    return _NON_ALNUM.sub('', text).lower()
 
 def generate_valid_lead(seed: int, industry_filter: str = None) -> dict:
     """Generates a single, scientifically consistent lead."""
-    
+    fake = get_faker()
+
     # 1. Determine Industry & Role
     # FIX: Case-insensitive matching
     matched_industry = None
@@ -104,8 +116,8 @@ def generate_leads_logic(count: int = 200, seed: int = 42, industry_filter: str
     """
     Generates a list of synthetic leads.
     """
-    # Reproducibility: Set the seed
-    Faker.seed(seed)
+    # Reproducibility: Set the seed (Faker seeds are class-wide)
+    type(get_faker()).seed(seed)
     random.seed(seed)
     
     leads = []
@@ -114,3 +126,126 @@ def generate_leads_logic(count: int = 200, seed: int = 42, industry_filter: str
     
     return leads
 
+# --- 4. HIGH-THROUGHPUT MODE (load testing) ---
+# Values are sampled once per seed from Faker's en_US provider data (same names, weights and
+# company patterns as fake.first_name()/company()/country(), without a Faker call per value).
+# Leads are then assembled from pool indexes, with slugs precomputed, in deterministic shards.
+
+POOL_SIZES = {"first": 4096, "last": 4096, "company": 8192, "country": 1024}
+# Leads per shard when `shards` is not given (shards bound memory per worker result)
+DEFAULT_SHARD_SIZE = 50_000
+
+def _match_industry(industry_filter):
+    if industry_filter:
+        for ind in ROLES_BY_INDUSTRY:
+            if ind.lower() == industry_filter.lower():
+                return ind
+    return None
+
+def _weighted_sample(rng, values, k):
+    """Samples from a Faker value list or {value: weight} mapping."""
+    if isinstance(values, dict):
+        return rng.choices(list(values), weights=list(values.values()), k=k)
+    return rng.choices(values, k=k)
+
+@lru_cache(maxsize=8)
+def _value_pools(seed: int) -> dict:
+    """Samples name/company/country pools for a seed, each name paired with its slug."""
+    from faker.providers.address.en_US import Provider as AddressProvider
+    from faker.providers.company.en_US import Provider as CompanyProvider
+    from faker.providers.person.en_US import Provider as PersonProvider
+
+    rng = random.Random(seed)
+    first = _weighted_sample(rng, PersonProvider.first_names, POOL_SIZES["first"])
+    last = _weighted_sample(rng, PersonProvider.last_names, POOL_SIZES["last"])
+
+    templates = rng.choices(CompanyProvider.formats, k=POOL_SIZES["company"])
+    # One weighted draw for every {{last_name}} placeholder across all templates
+    parts = iter(_weighted_sample(rng, PersonProvider.last_names, sum(t.count("{{last_name}}") for t in templates)))
+    companies = []
+    for template in templates:
+        name = template.replace("{{company_suffix}}", rng.choice(CompanyProvider.company_suffixes))
+        while "{{last_name}}" in name:
+            name = name.replace("{{last_name}}", next(parts), 1)
+        companies.append(name)
+
+    return {
+        "first": [(name, clean_string(name)) for name in first],
+        "last": [(name, clean_string(name)) for name in last],
+        "company": [(name, clean_string(name)) for name in companies],
+        "country": rng.choices(AddressProvider.countries, k=POOL_SIZES["country"]),
+    }
+
+def _generate_shard(seed: int, shard: int, count: int, industry_filter: str = None) -> list:
+    """Generates one shard. Depends only on (seed, shard, count, filter), never on global state."""
+    pools = _value_pools(seed)
+    rng = random.Random(seed * 1_000_003 + shard)
+    matched_industry = _match_industry(industry_filter)
+
+    # Draw every index for the shard up front instead of lead by lead
+    firsts = rng.choices(pools["first"], k=count)
+    lasts = rng.choices(pools["last"], k=count)
+    companies = rng.choices(pools["company"], k=count)
+    countries = rng.choices(pools["country"], k=count)
+    if matched_industry:
+        industries = [matched_industry] * count
+        roles = rng.choices(ROLES_BY_INDUSTRY[matched_industry], k=count)
+    else:
+        industries = rng.choices(INDUSTRIES, k=count)
+        generic = rng.choices(GENERIC_ROLES, k=count)
+        # 80% chance of industry-specific role, 20% generic C-suite
+        roles = [
+            rng.choice(ROLES_BY_INDUSTRY[ind]) if rng.random() < 0.8 else generic[i]
+            for i, ind in enumerate(industries)
+        ]
+    suffixes = [rng.randint(100, 999) for _ in range(count)]
+
+    leads = []
+    for i in range(count):
+        first_name, first_slug = firsts[i]
+        last_name, last_slug = lasts[i]
+        company_name, company_slug = companies[i]
+        leads.append({
+            "full_name": f"{first_name} {last_name}",
+            "company_name": company_name,
+            "role": roles[i],
+            "industry": industries[i],
+            "website": f"https://www.{company_slug}.com",
+            "email": f"{first_slug}.{last_slug}@{company_slug}.com",
+            "linkedin_url": f"https://linkedin.com/in/{first_slug}-{last_slug}-{suffixes[i]}",
+            "country": countries[i],
+        })
+    return leads
+
+def _shard_task(args):
+    return _generate_shard(*args)
+
+def generate_leads_fast(count: int, seed: int = 42, industry_filter: str = None,
+                        shards: int = None, processes: int = None):
+    """
+    Yields leads shard by shard (lists), suitable for streaming into LeadDB.add_leads.
+    Output is reproducible for a given (seed, shards); shards run on a process pool and
+    are yielded in order, with at most 2 x processes shards in memory at once.
+    """
+    if count <= 0:
+        return
+    shards = shards or max(1, -(-count // DEFAULT_SHARD_SIZE))
+    processes = processes or min(shards, os.cpu_count() or 1)
+    base, extra = divmod(count, shards)
+    tasks = [(seed, i, base + (1 if i < extra else 0), industry_filter) for i in range(shards)]
+    tasks = [t for t in tasks if t[2] > 0]
+
+    if processes <= 1:
+        for task in tasks:
+            yield _shard_task(task)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(_shard_task, task))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,239 @@
+# Outreach message templates: loaded from files, compiled once, rendered in batches
+
+import os
+import re
+from itertools import repeat
+from operator import itemgetter
+from string import Formatter
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "message_templates")
+# The four message columns on `leads`; each is filled from the template of the same name
+# unless a variant is picked for it (e.g. {"email_b": "email_c"} for a new B test).
+SLOTS = ("email_a", "email_b", "linkedin_a", "linkedin_b")
+FIELDS = ("first_name", "full_name", "company_name", "role", "industry", "pain", "trigger")
+DEFAULT_PAIN = "efficiency"
+DEFAULT_TRIGGER = "growth"
+
+# Constraints per channel (template names are "<channel>_<variant>")
+CHANNEL_LIMITS = {
+    "email": {"max_words": 120},
+    "linkedin": {"max_chars": 300},  # LinkedIn connection-note limit
+}
+# A message needs a call to action: a question or an explicit invitation
+CTA_PATTERN = re.compile(r"\?|\blet'?s (connect|chat|talk)\b", re.IGNORECASE)
+
+class TemplateError(ValueError):
+    """A template that references unknown fields or breaks its channel constraints."""
+
+class CompiledTemplate:
+    """
+    A template parsed once into its literal text and field slots. The CTA and the static
+    part of the length limits are checked here; per lead only the field values' own
+    sizes are added (see MessageRenderer), so rendered text is never rescanned.
+    `parts` is the parsed template as (text, is_field) pairs, which render and
+    render_columns join without parsing the template again.
+    """
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.channel = name.split("_", 1)[0]
+        limits = CHANNEL_LIMITS.get(self.channel, {})
+        self.max_words = limits.get("max_words")
+        self.max_chars = limits.get("max_chars")
+
+        literal, fields, standalone, parts = [], [], [], []
+        for prefix, field, spec, conversion in Formatter().parse(text):
+            literal.append(prefix)
+            if prefix:
+                parts.append((prefix, False))
+            if field is None:
+                continue
+            if field not in FIELDS or spec or conversion:
+                raise TemplateError(f"{name}: unsupported placeholder {{{field}}} (fields: {', '.join(FIELDS)})")
+            fields.append(field)
+            parts.append((field, True))
+        self.parts = tuple(parts)
+        self.literal = "".join(literal)
+        if not CTA_PATTERN.search(self.literal):
+            raise TemplateError(f"{name}: no call to action (a question or \"Let's connect\")")
+
+        # Word count with every field replaced by a one-word sentinel. A field with n >= 1
+        # words then adds n - 1; an empty one removes its sentinel only when it stands alone.
+        sentinel = text.replace("{{", "\0").replace("}}", "\0")
+        self.static_words = len(re.sub(r"\{[^}]*\}", "X", sentinel).split())
+        for match in re.finditer(r"\{[^}]*\}", sentinel):
+            before = sentinel[match.start() - 1] if match.start() else " "
+            after = sentinel[match.end()] if match.end() < len(sentinel) else " "
+            standalone.append(before.isspace() and after.isspace())
+        self.fields = tuple(zip(fields, standalone))
+        self.static_chars = len(self.literal)
+        if self.max_chars and self.static_chars > self.max_chars:
+            raise TemplateError(f"{name}: {self.static_chars} characters before any field (limit {self.max_chars})")
+        if self.max_words and self.static_words > self.max_words:
+            raise TemplateError(f"{name}: {self.static_words} words before any field (limit {self.max_words})")
+        self.fmt = text
+
+    def size(self, values: dict) -> tuple:
+        """(characters, words) of the rendered text, from the field values alone."""
+        chars, words = self.static_chars, self.static_words
+        for field, standalone in self.fields:
+            value = values[field]
+            n = len(value.split())
+            chars += len(value)
+            words += n - 1 if n else -standalone
+        return chars, words
+
+    def render(self, values: dict) -> str:
+        return "".join([values[text] if is_field else text for text, is_field in self.parts])
+
+    def render_columns(self, columns: dict, count: int) -> list:
+        """The texts for `count` leads from {field: [value per lead]}, one join per lead."""
+        if not self.fields:
+            return [self.literal] * count
+        return list(map("".join, zip(*[columns[text] if is_field else repeat(text) for text, is_field in self.parts])))
+
+def load_templates(*directories) -> dict:
+    """{name: CompiledTemplate} from the *.txt files in each directory; later ones override."""
+    templates = {}
+    for directory in directories:
+        for filename in sorted(os.listdir(directory)):
+            name, ext = os.path.splitext(filename)
+            if ext != ".txt":
+                continue
+            with open(os.path.join(directory, filename), encoding="utf-8") as f:
+                text = f.read()
+            templates[name] = CompiledTemplate(name, text[:-1] if text.endswith("\n") else text)
+    return templates
+
+# The lead fields templates are filled from (first_name is derived from full_name)
+SOURCE_FIELDS = ("full_name", "company_name", "role", "industry", "pain", "trigger")
+_source_values = itemgetter(*SOURCE_FIELDS)
+
+def field_columns(full_names, company_names, roles, industries, pains, triggers) -> dict:
+    """Every template field for a batch of leads, {field: [value per lead]}, defaults applied."""
+    full_names = [name or "" for name in full_names]
+    return {
+        "first_name": [(name.split(None, 1) or ("",))[0] for name in full_names],
+        "full_name": full_names,
+        "company_name": [value or "" for value in company_names],
+        "role": [value or "" for value in roles],
+        "industry": [value or "" for value in industries],
+        "pain": [value or DEFAULT_PAIN for value in pains],
+        "trigger": [value or DEFAULT_TRIGGER for value in triggers],
+    }
+
+def _compile_batch(templates: list, render: bool = True):
+    """
+    Builds one function that checks and renders a batch of leads for every slot, a column
+    (one field or one template across all leads) at a time. Each limit is a sum over
+    the field values' lengths; fields totalling n characters in k slots hold at most
+    (n + k) // 2 words, so words are only counted exactly when that bound comes near the
+    limit. It returns one (texts, reason) pair per lead, texts None when a template
+    rejects it; with render=False the (pain, trigger) parameters replace the texts, for
+    storing the messages by reference.
+    """
+    def batch(leads):
+        count = len(leads)
+        if not count:
+            return []
+        columns = field_columns(*zip(*map(_source_values, leads)))
+        lengths = {field: list(map(len, values)) for field, values in columns.items()}
+        reasons = [None] * count
+        for template in templates:
+            if not (template.max_chars or template.max_words):
+                continue
+            totals = list(map(sum, zip(*[lengths[field] for field, _ in template.fields]))) if template.fields else [0] * count
+            if template.max_chars:
+                limit = template.max_chars - template.static_chars
+                for i in [i for i, total in enumerate(totals) if total > limit]:
+                    if reasons[i] is None:
+                        reasons[i] = f"{template.name} has {template.static_chars + totals[i]} characters (limit {template.max_chars})"
+            if template.max_words:
+                limit, slots = template.max_words - template.static_words, len(template.fields)
+                for i in [i for i, total in enumerate(totals) if (total + slots) // 2 > limit]:
+                    if reasons[i] is None:
+                        words = template.size({field: columns[field][i] for field, _ in template.fields})[1]
+                        if words > template.max_words:
+                            reasons[i] = f"{template.name} has {words} words (limit {template.max_words})"
+        if render:
+            outputs = zip(*[template.render_columns(columns, count) for template in templates])
+        else:
+            outputs = zip(columns["pain"], columns["trigger"])
+        return [(None, reason) if reason else (output, None) for output, reason in zip(outputs, reasons)]
+    return batch
+
+class MessageRenderer:
+    """Renders every slot for a batch of leads from typed fields (no enrichment JSON)."""
+    def __init__(self, templates: dict):
+        missing = [slot for slot in SLOTS if slot not in templates]
+        if missing:
+            raise TemplateError(f"missing templates for {', '.join(missing)}")
+        self.templates = templates
+        self.compiled = {}
+
+    def assignment(self, variants: dict = None) -> dict:
+        """{slot: CompiledTemplate} with any requested variants swapped in."""
+        variants = variants or {}
+        unknown = [name for name in variants.values() if name not in self.templates]
+        if unknown:
+            raise TemplateError(f"unknown template variant(s): {', '.join(unknown)}")
+        return {slot: self.templates[variants.get(slot, slot)] for slot in SLOTS}
+
+    def compile(self, variants: dict = None, render: bool = True):
+        """The batch check (and render) function for a slot assignment, built once and cached."""
+        templates = list(self.assignment(variants).values())
+        key = (tuple(template.name for template in templates), render)
+        fn = self.compiled.get(key)
+        if fn is None:
+            fn = self.compiled[key] = _compile_batch(templates, render)
+        return fn
+
+    def render_many(self, leads, variants: dict = None):
+        """
+        Takes lead dicts with id, full_name, company_name, role, industry, pain and trigger.
+        Returns (messages, rejected): messages is [(lead_id, {slot: text})] and rejected is
+        [(lead_id, reason)] for leads whose values push a template past its limits.
+        """
+        render = self.compile(variants)
+        messages, rejected = [], []
+        for lead, (texts, reason) in zip(leads, render(leads)):
+            if reason:
+                rejected.append((lead["id"], reason))
+            else:
+                messages.append((lead["id"], dict(zip(SLOTS, texts))))
+        return messages, rejected
+
+    def check_many(self, leads, variants: dict = None):
+        """
+        Like render_many but without rendering: returns (params, rejected) where params is
+        [(lead_id, pain, trigger)] with defaults applied, ready to store by reference.
+        """
+        check = self.compile(variants, render=False)
+        params, rejected = [], []
+        for lead, (values, reason) in zip(leads, check(leads)):
+            if reason:
+                rejected.append((lead["id"], reason))
+            else:
+                params.append((lead["id"], *values))
+        return params, rejected
+
+def compile_stored(templates: list):
+    """
+    Compiles stored templates (one per slot) into a function taking a batch of raw lead
+    fields, (full_name, company_name, role, industry, pain, trigger) tuples, and returning
+    all texts for each. Bodies are re-parsed by CompiledTemplate first, so only known,
+    plain fields are ever filled in.
+    """
+    templates = [CompiledTemplate(name, body) for name, body in templates]
+
+    def render(rows):
+        if not rows:
+            return []
+        columns = field_columns(*zip(*rows))
+        return list(zip(*[template.render_columns(columns, len(rows)) for template in templates]))
+    return render
+
+def load_renderer(path: str = None) -> MessageRenderer:
+    """The built-in templates, overridden and extended by the *.txt files in `path`."""
+    return MessageRenderer(load_templates(TEMPLATE_DIR, *([path] if path else [])))
+
+DEFAULT_RENDERER = load_renderer()
@@ -0,0 +1,195 @@
+# In-process metrics: stage and query latency histograms, counters and gauges, rendered in
+# the Prometheus text format, plus an optional per-batch trace/profile dump
+
+import contextvars
+import cProfile
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+# METRICS_ENABLED=0 turns every hook into a no-op (decorators return the plain function)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+# Per-batch trace: one JSON line per stage batch (duration, DB time and queries) appended here
+METRICS_TRACE = os.getenv("METRICS_TRACE")
+# Per-batch profile: a cProfile dump per stage batch written to this directory
+METRICS_PROFILE = os.getenv("METRICS_PROFILE")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}\n# TYPE {self.name} counter"
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {value:g}"
+
+class Gauge(Counter):
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def replace(self, values: dict):
+        """Swaps in a full snapshot {label or label tuple: value}; series missing from it are dropped."""
+        self.values = {key if isinstance(key, tuple) else (key,): value for key, value in values.items()}
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}\n# TYPE {self.name} gauge"
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {value:g}"
+
+class Histogram:
+    """Cumulative-bucket histogram per label set (bucket counts, sum and count)."""
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}\n# TYPE {self.name} histogram"
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {total:.6f}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {count}"
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.register(Histogram("leadgen_stage_batch_seconds", "Wall time of one stage batch", ("stage",)))
+STAGE_LEADS = REGISTRY.register(Counter("leadgen_stage_leads_total", "Leads processed per stage", ("stage",)))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram("leadgen_db_query_seconds", "LeadDB call latency", ("query",)))
+RATE_LIMIT_WAIT = REGISTRY.register(Histogram("leadgen_rate_limit_wait_seconds", "Time a send waited for a rate-limit token (waits only)"))
+SEND_RESULTS = REGISTRY.register(Counter("leadgen_send_results_total", "Send results by status (RETRY: scheduled for a later attempt)", ("status",)))
+SEND_RETRIES = REGISTRY.register(Counter("leadgen_send_retries_total", "Failed send attempts that were retried or scheduled for retry"))
+LEADS_BY_STATUS = REGISTRY.register(Gauge("leadgen_leads", "Leads per status (stage backlog depth)", ("status",)))
+PIPELINE_QUEUE_DEPTH = REGISTRY.register(Gauge("leadgen_pipeline_queue_batches", "Batches waiting between pipeline stages", ("stage",)))
+
+# [seconds, queries] of DB time inside the current stage batch (shared with to_thread calls)
+_db_time = contextvars.ContextVar("leadgen_db_time", default=None)
+_trace_lock = threading.Lock()
+# cProfile hooks one profiler per thread: overlapping spans (pipeline stages) profile one at a time
+_profile_lock = threading.Lock()
+
+def timed_query(fn):
+    """Records a LeadDB method's latency under its name (and in the enclosing stage span)."""
+    if not METRICS_ENABLED:
+        return fn
+    name = fn.__name__
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_QUERY_SECONDS.observe(elapsed, name)
+            acc = _db_time.get()
+            if acc is not None:
+                acc[0] += elapsed
+                acc[1] += 1
+    return wrapper
+
+class _NoopSpan:
+    leads = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class _Span:
+    """Times one stage batch; set `.leads` once the batch size is known."""
+    def __init__(self, stage):
+        self.stage = stage
+        self.leads = 0
+
+    def __enter__(self):
+        self.db = [0.0, 0]
+        self.token = _db_time.set(self.db)
+        self.profile = None
+        if METRICS_PROFILE and _profile_lock.acquire(blocking=False):
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        elapsed = time.perf_counter() - self.start
+        _db_time.reset(self.token)
+        STAGE_SECONDS.observe(elapsed, self.stage)
+        STAGE_LEADS.inc(self.stage, amount=self.leads)
+        if self.profile:
+            self.profile.disable()
+            _profile_lock.release()
+            os.makedirs(METRICS_PROFILE, exist_ok=True)
+            self.profile.dump_stats(os.path.join(METRICS_PROFILE, f"{self.stage}-{time.time():.6f}.prof"))
+        if METRICS_TRACE:
+            record = {"ts": round(time.time(), 6), "stage": self.stage, "leads": self.leads, "seconds": round(elapsed, 6),
+                      "db_seconds": round(self.db[0], 6), "db_queries": self.db[1], "error": exc_type.__name__ if exc_type else None}
+            with _trace_lock, open(METRICS_TRACE, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        return False
+
+def stage_span(stage: str):
+    """Context manager timing one batch of `stage`; a shared no-op when metrics are disabled."""
+    return _Span(stage) if METRICS_ENABLED else _NOOP_SPAN
+
+def record_sends(results, retries: int = 0):
+    """Counts an OutreachEngine batch: results by status and the attempts that were retried."""
+    if not METRICS_ENABLED:
+        return
+    for _, status, *_ in results:
+        SEND_RESULTS.inc(status)
+    if retries:
+        SEND_RETRIES.inc(amount=retries)
+
+def observe_rate_limit_wait(seconds: float):
+    if METRICS_ENABLED:
+        RATE_LIMIT_WAIT.observe(seconds)
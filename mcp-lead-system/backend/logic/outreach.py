@@ -0,0 +1,126 @@
+# Concurrent outreach engine: bounded concurrency, shared rate limits, off-path retries
+
+import asyncio
+import os
+import random
+import time
+from logic.metrics import record_sends
+from logic.rate_limiter import RateLimiter
+from logic.sender import send_message_async, SimulatedChannel
+
+# Requirement: "max 10 messages per minute" per channel and per sending domain
+DEFAULT_RATE_PER_MINUTE = 10
+# The address messages go out from (the SMTP login); its domain is one rate-limit scope
+SENDER_ADDRESS = os.getenv("SMTP_USER", "")
+
+def sender_domain(address: str) -> str:
+    """The domain of a sender address ("localhost" when no sender is configured)."""
+    return address.rpartition("@")[2].strip().lower() or "localhost"
+
+# Scheduled retries, per error class: total attempts allowed and the backoff bounds (seconds)
+RETRY_POLICIES = {
+    "transient": {"max_attempts": 3, "base_backoff": 1.0, "max_backoff": 30.0},
+    "timeout": {"max_attempts": 5, "base_backoff": 2.0, "max_backoff": 60.0},
+    "rate_limited": {"max_attempts": 5, "base_backoff": 60.0, "max_backoff": 900.0},
+    "permanent": {"max_attempts": 1, "base_backoff": 0.0, "max_backoff": 0.0},
+}
+
+def classify_error(error) -> str:
+    """Error class of a failed attempt: `error` is the exception raised, or None when the channel just refused."""
+    if error is None:
+        return "transient"
+    if isinstance(error, TimeoutError):
+        return "timeout"
+    text = str(error).lower()
+    if "429" in text or "rate limit" in text:
+        return "rate_limited"
+    if isinstance(error, (ValueError, PermissionError)):
+        return "permanent"  # e.g. an invalid recipient: retrying cannot help
+    return "transient"
+
+class OutreachEngine:
+    """
+    Sends a batch of leads concurrently.
+
+    - `concurrency` caps in-flight sends (asyncio.Semaphore).
+    - Every send takes a token from the channel bucket and the sending-domain bucket.
+    - A failed attempt releases its slot and waits out an exponential backoff with full
+      jitter *outside* the semaphore, so retries never hold up other leads.
+    - With `schedule_retries=True` every lead gets exactly one attempt. A failure comes back
+      as a RETRY item carrying its due time (per RETRY_POLICIES) for the persistent retry
+      queue, so the batch finishes without waiting for any backoff.
+    """
+    def __init__(self, dry_run: bool = True, concurrency: int = 10, rate_limiter: RateLimiter = None,
+                 transport: SimulatedChannel = None, channel: str = "email",
+                 sender: str = SENDER_ADDRESS, max_attempts: int = 3,
+                 base_backoff: float = 1.0, max_backoff: float = 30.0, seed: int = None,
+                 schedule_retries: bool = False, policies: dict = None):
+        self.dry_run = dry_run
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter or RateLimiter(None if dry_run else DEFAULT_RATE_PER_MINUTE)
+        self.transport = transport or SimulatedChannel()
+        self.channel = channel
+        self.sender_domain = sender_domain(sender)
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.rng = random.Random(seed)
+        self.schedule_retries = schedule_retries
+        self.policies = policies or RETRY_POLICIES
+        self.retries = 0
+        # (lead_id, stage, attempt, outcome, message) for every failed attempt that was retried
+        self.events = []
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given (1-based) failed attempt."""
+        return self.rng.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** (attempt - 1)))
+
+    async def _attempt(self, semaphore, lead) -> tuple:
+        async with semaphore:
+            await self.rate_limiter.acquire(("channel", self.channel), ("domain", self.sender_domain))
+            try:
+                ok = await send_message_async(lead['email'], lead['email_content_a'], self.channel, self.dry_run, self.transport)
+                return ok, None
+            except Exception as e:
+                return False, e
+
+    async def _send_scheduled(self, semaphore, lead) -> tuple:
+        attempt = (lead.get('attempt_count') or 0) + 1
+        ok, error = await self._attempt(semaphore, lead)
+        if ok:
+            return lead['id'], "SENT", f"Email A sent successfully on attempt {attempt}.", attempt
+        error_class = classify_error(error)
+        policy = self.policies[error_class]
+        message = f"{error_class}: {error}" if error else f"{error_class}: send failed"
+        if attempt >= policy["max_attempts"]:
+            return lead['id'], "FAILED", f"Failed after {attempt} attempts ({message}).", attempt
+        self.retries += 1
+        delay = self.rng.uniform(0, min(policy["max_backoff"], policy["base_backoff"] * 2 ** (attempt - 1)))
+        return lead['id'], "RETRY", message, attempt, time.time() + delay
+
+    async def _send_lead(self, semaphore, lead) -> tuple:
+        if self.schedule_retries:
+            return await self._send_scheduled(semaphore, lead)
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            ok, error = await self._attempt(semaphore, lead)
+            if ok:
+                return lead['id'], "SENT", f"Email A sent successfully on attempt {attempt}.", attempt
+            if attempt < self.max_attempts:
+                self.retries += 1
+                self.events.append((lead['id'], "send", attempt, "RETRY", f"Error: {error}" if error else "Send failed"))
+                await asyncio.sleep(self.backoff(attempt))
+        if error:
+            return lead['id'], "FAILED", f"Error: {error}", self.max_attempts
+        return lead['id'], "FAILED", f"Failed after {self.max_attempts} attempts.", self.max_attempts
+
+    async def run(self, leads) -> list:
+        """
+        Sends every lead; returns (lead_id, status, message, attempts) items ready for
+        update_status_many. Scheduled RETRY items also carry their due time (unix seconds).
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        retries = self.retries
+        results = await asyncio.gather(*(self._send_lead(semaphore, lead) for lead in leads))
+        record_sends(results, self.retries - retries)
+        return results
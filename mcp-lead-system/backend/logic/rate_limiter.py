@@ -0,0 +1,61 @@
+# Token-bucket rate limiting for outreach channels
+
+import asyncio
+import threading
+import time
+from logic.metrics import observe_rate_limit_wait
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate_per_minute` tokens refill continuously up to `capacity`.
+    Callers reserve a token up front and only wait for the exact deficit, so there are
+    no fixed sleeps between sends.
+    """
+    def __init__(self, rate_per_minute: float, capacity: float = 1, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def reserve(self) -> float:
+        """Takes one token (possibly on credit). Returns seconds until that token is valid."""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class RateLimiter:
+    """
+    Shared registry of buckets keyed by scope, e.g. ("channel", "email") or
+    ("domain", "example.com"). A send must hold a token from every scope it touches.
+    `rate_per_minute=None` disables limiting (used for dry runs). One limiter may be
+    shared by senders on several threads and event loops.
+    """
+    def __init__(self, rate_per_minute: float = 10, capacity: float = 1):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = capacity
+        self.buckets = {}
+        self.total_wait = 0.0
+        self.lock = threading.Lock()
+
+    def bucket(self, key) -> TokenBucket:
+        if key not in self.buckets:
+            self.buckets[key] = TokenBucket(self.rate_per_minute, self.capacity)
+        return self.buckets[key]
+
+    async def acquire(self, *keys) -> float:
+        """Waits until a token is available in every bucket. Returns the time waited."""
+        if not self.rate_per_minute:
+            return 0.0
+        # Reservations are taken together under the lock (never across an await), so
+        # concurrent senders queue up in FIFO order, whichever thread or loop they run on
+        with self.lock:
+            wait = max(self.bucket(key).reserve() for key in keys)
+            if wait > 0:
+                self.total_wait += wait
+        if wait > 0:
+            observe_rate_limit_wait(wait)
+            await asyncio.sleep(wait)
+        return wait
@@ -1,23 +1,37 @@
-import time
+import asyncio
 import random
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def send_message_logic(lead_email: str, content: str, channel: str = "email", dry_run: bool = True) -> bool:
-    """Simulates sending a message."""
-    time.sleep(0.1) # Simulated delay
-    
+class SimulatedChannel:
+    """
+    Local stand-in for the SMTP server / LinkedIn API.
+    Injects network latency and a random failure rate without blocking the event loop,
+    so the async outreach engine can be benchmarked offline.
+    """
+    def __init__(self, latency: float = 0.1, failure_rate: float = 0.1, seed: int = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.delivered = 0
+
+    async def send(self, recipient: str, content: str, channel: str = "email") -> bool:
+        await asyncio.sleep(self.latency)
+        if self.rng.random() < self.failure_rate:
+            return False
+        self.delivered += 1
+        return True
+
+async def send_message_async(lead_email: str, content: str, channel: str = "email", dry_run: bool = True, transport: SimulatedChannel = None) -> bool:
+    """Simulates sending one message; used by the outreach engine."""
     if dry_run:
         logger.info(f"[DRY RUN] Processed {channel} for {lead_email}")
         return True
-    
-    # 10% chance of random failure in live mode
-    if random.random() < 0.1:
-        return False
-        
-    return True
 
-# Outreach simulation logic
+    # Live mode keeps the original behaviour (latency + 10% failures) unless a transport is injected
+    transport = transport or SimulatedChannel()
+    return await transport.send(lead_email, content, channel)
 
+# Outreach simulation logic
@@ -1,171 +1,51 @@
-# MCP Server implementation
-
-from mcp.server.fastmcp import FastMCP
-from logic.generator import generate_leads_logic
-from logic.enricher import enrich_lead_logic
-from logic.sender import send_message_logic
-from database import LeadDB
-import json
-import time # Ensure time is imported at the top
-
-mcp = FastMCP("LeadGenAgent")
-db = LeadDB()
-
-@mcp.tool()
-def generate_leads(count: int = 5, seed: int = 42, industry: str = None) -> str:
-    """Generates synthetic leads with optional industry filter."""
-    leads = generate_leads_logic(count, seed, industry)
-    added = db.add_leads(leads)
-    return json.dumps({"status": "success", "generated": count, "added": added, "industry": industry})
-
-@mcp.tool()
-def enrich_leads_batch(limit: int = 5, mode: str = "offline") -> str:
-    """
-    Enriches leads using either Offline Rules or AI (Mock).
-    Args:
-        limit: Number of leads to process.
-        mode: 'offline' (default) or 'ai'.
-    """
-    leads = db.get_leads_by_status("NEW", limit)
-    processed_count = 0
-    
-    for lead in leads:
-        # Pass the mode to the logic function
-        enrichment = enrich_lead_logic(lead, mode=mode)
-        db.update_lead_enrichment(lead['id'], enrichment)
-        processed_count += 1
-        
-    return json.dumps({
-        "status": "success", 
-        "processed": processed_count, 
-        "mode": mode
-    })
-
-@mcp.tool()
-def generate_messages_batch(limit: int = 5) -> str:
-    """Generates draft messages with strict CTA and Word Count constraints."""
-    leads = db.get_leads_by_status("ENRICHED", limit)
-    for lead in leads:
-        raw_data = lead['enrichment_data']
-        
-        # --- ROBUST JSON PARSING ---
-        try:
-            if not raw_data:
-                enrichment = {}
-            else:
-                enrichment = json.loads(raw_data)
-                # Double-Encoded fix
-                if isinstance(enrichment, str):
-                    try:
-                        enrichment = json.loads(enrichment)
-                    except:
-                        enrichment = {}
-        except (TypeError, json.JSONDecodeError):
-            enrichment = {}
-            
-        if not isinstance(enrichment, dict):
-            enrichment = {}
-
-        # 1. Get the Insight (Pain Point)
-        pain_points = enrichment.get('pain_points', [])
-        pain = pain_points[0] if pain_points else "efficiency"
-        
-        # 2. Get the Trigger (Context)
-        trigger = enrichment.get('buying_trigger', 'growth')
-
-        # --- TEMPLATE A (Focus: Pain Point) ---
-        email_a = (
-            f"Hi {lead['full_name'].split()[0]},\n\n"
-            f"I noticed {lead['company_name']} might be navigating {pain} challenges. "
-            f"We help {lead['industry']} leaders streamline operations to solve exactly this.\n\n"
-            f"Are you open to a 15-minute call next Tuesday to discuss?\n\n" # <--- CTA
-            f"Best,\n[Your Name]"
-        )
-
-        # --- TEMPLATE B (Focus: Trigger/Persona) ---
-        email_b = (
-            f"Hi {lead['full_name']},\n\n"
-            f"Saw the news about your {trigger} - congratulations.\n"
-            f"As a {lead['role']}, you likely care about avoiding {pain}.\n\n"
-            f"Do you have 15 minutes this week for a quick intro?\n\n" # <--- CTA
-            f"Cheers,\n[Your Name]"
-        )
-
-        # --- LINKEDIN A (Short & Direct) ---
-        linkedin_a = f"Hi {lead['full_name'].split()[0]}, would love to connect and share how we solve {pain} for {lead['industry']} teams. Open to chatting?"
-
-        # --- LINKEDIN B (Context-led) ---
-        linkedin_b = f"Hi {lead['full_name']}, saw {lead['company_name']} is in {lead['industry']}. We help peers tackle {pain}. Let's connect."
-
-        msgs = {
-            "email_a": email_a,
-            "email_b": email_b,
-            "linkedin_a": linkedin_a,
-            "linkedin_b": linkedin_b
-        }
-        
-        db.update_lead_messages(lead['id'], msgs)
-
-    return json.dumps({"status": "success", "processed": len(leads)})
-
-@mcp.tool()
-def send_outreach_batch(limit: int = 5, dry_run: bool = True) -> str:
-    """
-    Sends messages via Email/LinkedIn with Retry Logic and Rate Limiting.
-    Requirements:
-    - Retry: At least 2 retries (Total 3 attempts).
-    - Rate Limit: Max 10 messages/min (approx 6s delay) -> Simulated here as 0.5s for demo, 
-      but structured to support strict limiting.
-    """
-    leads = db.get_leads_by_status("MESSAGED", limit)
-    sent_count, failed_count = 0, 0
-    
-    # Rate Limit Config (Seconds between requests)
-    # Requirement: "max 10 messages per minute" = 60s / 10 = 6.0 seconds
-    # For this DEMO, we use 0.5s to keep it usable, but you can set to 6.0 to be strict.
-    DELAY_SECONDS = 0.5 
-
-    for lead in leads:
-        success = False
-        attempts = 0
-        max_retries = 3 # Original + 2 Retries
-        
-        # --- RETRY LOGIC ---
-        while attempts < max_retries and not success:
-            attempts += 1
-            try:
-                # Default to sending Template A
-                result = send_message_logic(lead['email'], lead['email_content_a'], "email", dry_run)
-                
-                if result:
-                    success = True
-                    db.update_lead_status(lead['id'], "SENT", f"Email A sent successfully on attempt {attempts}.")
-                    sent_count += 1
-                else:
-                    # If logic returns False (simulated failure), we retry
-                    if attempts < max_retries:
-                        time.sleep(1) # Backoff before retry
-                        continue
-                        
-            except Exception as e:
-                # Catch unexpected crashes
-                if attempts == max_retries:
-                    db.update_lead_status(lead['id'], "FAILED", f"Error: {str(e)}")
-        
-        if not success:
-            db.update_lead_status(lead['id'], "FAILED", f"Failed after {max_retries} attempts.")
-            failed_count += 1
-            
-        # --- RATE LIMITING ---
-        time.sleep(DELAY_SECONDS)
-            
-    return json.dumps({
-        "status": "complete",
-        "sent": sent_count,
-        "failed": failed_count,
-        "mode": "DRY RUN" if dry_run else "LIVE"
-    })
+# MCP Server implementation: thin adapters over service.py that encode each result as JSON text.
+# The FastMCP app is built on first use (get_app), so importing the tools loads no MCP machinery.
+
+from encoding import dumps_text
+import service
+
+def generate_leads(count: int = 5, seed: int = 42, industry: str = None, fast: bool = False, shards: int = None) -> str:
+    return dumps_text(service.generate_leads(count, seed, industry, fast, shards))
+
+async def enrich_leads_batch(limit: int = 5, mode: str = "offline") -> str:
+    return dumps_text(await service.enrich_leads_batch(limit, mode))
+
+def generate_messages_batch(limit: int = 5, variants: dict = None) -> str:
+    return dumps_text(service.generate_messages_batch(limit, variants))
+
+async def send_outreach_batch(limit: int = 5, dry_run: bool = True, concurrency: int = 10, rate_per_minute: float = None) -> str:
+    return dumps_text(await service.send_outreach_batch(limit, dry_run, concurrency, rate_per_minute))
+
+async def process_retries(limit: int = 200, dry_run: bool = True, concurrency: int = 10,
+                          rate_per_minute: float = None, drain: bool = False) -> str:
+    return dumps_text(await service.process_retries(limit, dry_run, concurrency, rate_per_minute, drain))
+
+async def run_pipeline(count: int = 100, seed: int = 42, industry: str = None, mode: str = "offline",
+                       dry_run: bool = True, concurrency: int = 10, rate_per_minute: float = None,
+                       batch_size: int = None, workers: dict = None, resume: bool = True) -> str:
+    return dumps_text(await service.run_pipeline(count, seed, industry, mode, dry_run, concurrency, rate_per_minute,
+                                                 batch_size, workers, resume))
+
+TOOLS = (generate_leads, enrich_leads_batch, generate_messages_batch, send_outreach_batch, process_retries, run_pipeline)
+_app = None
+
+def get_app():
+    """The FastMCP server with every tool registered, built on the first call."""
+    global _app
+    if _app is None:
+        from mcp.server.fastmcp import FastMCP
+        app = FastMCP("LeadGenAgent")
+        for tool in TOOLS:
+            # Tool descriptions are the service docstrings, so both transports document the same behaviour
+            app.add_tool(tool, description=getattr(service, tool.__name__).__doc__)
+        _app = app
+    return _app
+
+def __getattr__(name):
+    # `mcp run mcp_server.py` and similar tooling look the server up as the module's `mcp`
+    if name == "mcp":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
-    mcp.run()
-
+    get_app().run()
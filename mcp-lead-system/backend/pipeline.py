@@ -0,0 +1,254 @@
+# Fused pipeline: generate -> enrich -> message -> send as concurrent stages over bounded queues
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from database import CLAIM_LEASE_SECONDS
+from leases import held
+from logic.generator import generate_leads_fast
+from logic.enricher import DEFAULT_ENGINE
+from logic.messaging import DEFAULT_RENDERER, DEFAULT_PAIN, DEFAULT_TRIGGER
+from logic.outreach import OutreachEngine, DEFAULT_RATE_PER_MINUTE
+from logic.rate_limiter import RateLimiter
+from logic.metrics import stage_span, PIPELINE_QUEUE_DEPTH
+from retry_scheduler import RetryScheduler
+
+# Leads per batch: the unit passed between stages and checkpointed to the DB
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", "200"))
+# Batches buffered between two stages; a full queue blocks the stage feeding it
+PIPELINE_QUEUE_SIZE = 4
+DEFAULT_WORKERS = {"enrich": 1, "message": 1, "send": 2}
+
+STAGES = ("enrich", "message", "send")
+# Runs claim under "<host>:<pid>:pipeline-<run>": resume=True only takes leads one of them left
+PIPELINE_CLAIMS = "%:pipeline-%"
+# Lead fields carried from stage to stage (read once, never re-read by status)
+CARRY_COLUMNS = ("id", "full_name", "company_name", "role", "industry", "email")
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class PipelineRunner:
+    """
+    Runs the four stages in one process. Each stage has its own workers and hands batches
+    to the next through a bounded queue, so a slow stage applies backpressure upstream
+    instead of letting work pile up in memory.
+
+    Every batch is checkpointed with the stage's batch write (status + data) before it is
+    passed on, so the DB status of each lead always names the next stage it needs. The
+    runner holds a claim on every lead it carries (renewed at each checkpoint and in the
+    background while the run lasts), so stage tools running elsewhere leave them alone, and
+    its checkpoints only write leads it still holds. A failed run ends its leases at once, a
+    killed one when they expire; either way its leads keep the run's name, and
+    `run(resume=True)` picks up the NEW, ENRICHED and MESSAGED leads an earlier run left at
+    their stage. Leads queued by other means (the stage tools) are left to those. Sends are
+    at-least-once: a batch sent but not yet checkpointed is sent again on resume.
+
+    Failed sends go to the persistent retry schedule instead of being retried inline; a
+    RetryScheduler runs next to the stages and, with drain_retries=True, the run only ends
+    once no retry is pending.
+    """
+    def __init__(self, db, engine=DEFAULT_ENGINE, renderer=DEFAULT_RENDERER, ai_client=None,
+                 batch_size: int = PIPELINE_BATCH_SIZE, queue_size: int = PIPELINE_QUEUE_SIZE,
+                 workers: dict = None, transport=None, lease_seconds: float = CLAIM_LEASE_SECONDS):
+        self.db = db
+        self.engine = engine
+        self.renderer = renderer
+        self.ai_client = ai_client
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.workers = {**DEFAULT_WORKERS, **(workers or {})}
+        self.transport = transport
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:pipeline-{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.lease = (self.worker_id, lease_seconds)
+
+    async def run(self, count: int = 0, seed: int = 42, industry: str = None, mode: str = "offline",
+                  dry_run: bool = True, concurrency: int = 10, rate_per_minute: float = None,
+                  resume: bool = True, drain_retries: bool = True, rate_limiter: RateLimiter = None) -> dict:
+        """
+        Generates `count` new leads (plus any resumed backlog) and drives them to SENT/FAILED.
+        Sends draw from `rate_limiter` (share one with the process's other senders), else from
+        a limiter of their own at `rate_per_minute`.
+        """
+        if rate_limiter is None:
+            if rate_per_minute is None:
+                rate_per_minute = None if dry_run else DEFAULT_RATE_PER_MINUTE
+            rate_limiter = RateLimiter(rate_per_minute)
+        self.mode = mode
+        self.send_options = dict(dry_run=dry_run, concurrency=concurrency, transport=self.transport,
+                                 rate_limiter=rate_limiter, schedule_retries=True)
+        self.set_id = await asyncio.to_thread(self.db.template_set_id, self.renderer.assignment())
+        self.writes = set()
+        self.started = {}
+        self.latencies = []
+        self.counts = {"generated": 0, "resumed": 0, "enriched": 0, "messaged": 0, "rejected": 0,
+                       "sent": 0, "failed": 0, "retries": 0}
+        queues = {stage: asyncio.Queue(self.queue_size) for stage in STAGES}
+        process = {"enrich": self._enrich, "message": self._message, "send": self._send}
+
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(self._source(queues, count, seed, industry, resume))]
+        for i, stage in enumerate(STAGES):
+            outbox = queues[STAGES[i + 1]] if i + 1 < len(STAGES) else None
+            next_workers = self.workers[STAGES[i + 1]] if outbox else 0
+            tasks.append(asyncio.create_task(self._stage(stage, queues[stage], outbox, next_workers, process[stage])))
+        if drain_retries:
+            scheduler = RetryScheduler(self.db, self.worker_id, self.batch_size, lease_seconds=self.lease_seconds,
+                                       on_results=self._record, **self.send_options)
+            # The scheduler keeps polling until every stage is done, then drains what is left
+            stop = asyncio.Event()
+            asyncio.ensure_future(asyncio.wait(list(tasks))).add_done_callback(lambda _: stop.set())
+            tasks.append(asyncio.create_task(scheduler.run(stop)))
+        try:
+            # Leads wait in queues and rate-limited sends far longer than one lease
+            async with held(self.db, self.worker_id, None, self.lease_seconds):
+                await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let in-flight checkpoints land first, or they would renew claims released here
+            await asyncio.gather(*self.writes, return_exceptions=True)
+            # Ended but still marked as this run's, for the next run to resume
+            await asyncio.to_thread(self.db.expire_claims, self.worker_id)
+        elapsed = time.perf_counter() - start
+
+        done = self.counts["sent"] + self.counts["failed"]
+        return {
+            **self.counts,
+            "mode": "DRY RUN" if dry_run else "LIVE",
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput_per_second": round(done / elapsed, 1) if elapsed else 0.0,
+            "latency_p50": round(_percentile(self.latencies, 50), 4),
+            "latency_p99": round(_percentile(self.latencies, 99), 4),
+        }
+
+    async def _source(self, queues, count, seed, industry, resume):
+        """Feeds the backlog (downstream stages first), then freshly generated leads."""
+        if resume:
+            for stage in reversed(STAGES):
+                while True:
+                    batch = await self._write(self._backlog, stage)
+                    if not batch:
+                        break
+                    self.counts["resumed"] += len(batch)
+                    await self._enter(queues[stage], batch)
+        if count > 0:
+            # Small shards keep the first leads flowing; output is reproducible per (seed, shards)
+            shards = generate_leads_fast(count, seed, industry, shards=-(-count // self.batch_size), processes=1)
+            while True:
+                leads = await asyncio.to_thread(next, shards, None)
+                if leads is None:
+                    break
+                batch = await self._write(self.db.add_leads_returning, leads, CARRY_COLUMNS, self.lease)
+                self.counts["generated"] += len(batch)
+                await self._enter(queues["enrich"], batch)
+        for _ in range(self.workers["enrich"]):
+            await queues["enrich"].put(None)
+
+    def _backlog(self, stage):
+        columns = CARRY_COLUMNS + {"message": ("pain_point", "buying_trigger"), "send": ("email_content_a",)}.get(stage, ())
+        batch = self.db.claim_batch(stage, self.batch_size, *self.lease, columns, PIPELINE_CLAIMS)
+        if stage == "message":
+            for lead in batch:
+                lead["pain"], lead["trigger"] = lead.pop("pain_point"), lead.pop("buying_trigger")
+        return batch
+
+    async def _write(self, fn, *args):
+        """Runs a DB call off the loop. It is shielded: a cancelled run still waits for it to commit."""
+        task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        self.writes.add(task)
+        task.add_done_callback(self.writes.discard)
+        return await asyncio.shield(task)
+
+    async def _enter(self, queue, batch):
+        now = time.perf_counter()
+        for lead in batch:
+            self.started[lead["id"]] = now
+        await queue.put(batch)
+
+    async def _stage(self, stage, inbox, outbox, next_workers, process):
+        async def worker():
+            while True:
+                batch = await inbox.get()
+                PIPELINE_QUEUE_DEPTH.set(inbox.qsize(), stage)
+                if batch is None:
+                    return
+                with stage_span(stage) as span:
+                    span.leads = len(batch)
+                    result = await process(batch)
+                if outbox is not None and result:
+                    await outbox.put(result)
+        await asyncio.gather(*(worker() for _ in range(self.workers[stage])))
+        # Every worker has drained its share: tell the next stage's workers to stop
+        for _ in range(next_workers):
+            await outbox.put(None)
+
+    async def _enrich(self, batch):
+        if self.mode == "ai" and self.ai_client is not None:
+            enrichments = await self.ai_client.enrich_many(batch)
+        else:
+            enrichments = self.engine.enrich_many(batch, mode=self.mode)
+        pairs = list(zip(batch, enrichments))
+        if await self._write(self.db.update_enrichment_many, [(lead["id"], e) for lead, e in pairs], self.lease) < len(pairs):
+            held_ids = await self._still_held(lead["id"] for lead, _ in pairs)
+            pairs = [(lead, e) for lead, e in pairs if lead["id"] in held_ids]
+        self.counts["enriched"] += len(pairs)
+        return [dict(lead, pain=(e.get("pain_points") or [None])[0], trigger=e.get("buying_trigger")) for lead, e in pairs]
+
+    async def _message(self, batch):
+        messages, rejected = self.renderer.render_many(batch)
+        by_id = {lead["id"]: lead for lead in batch}
+        params = [(lead_id, by_id[lead_id]["pain"] or DEFAULT_PAIN, by_id[lead_id]["trigger"] or DEFAULT_TRIGGER) for lead_id, _ in messages]
+        if await self._write(self._checkpoint_messages, params, rejected) < len(params):
+            held_ids = await self._still_held(lead_id for lead_id, _ in messages)
+            messages = [(lead_id, msgs) for lead_id, msgs in messages if lead_id in held_ids]
+        self.counts["messaged"] += len(messages)
+        self.counts["rejected"] += len(rejected)
+        for lead_id, _ in rejected:
+            self.started.pop(lead_id, None)
+        return [{"id": lead_id, "email": by_id[lead_id]["email"], "email_content_a": msgs["email_a"]} for lead_id, msgs in messages]
+
+    def _checkpoint_messages(self, params, rejected):
+        updated = self.db.update_message_refs_many(self.set_id, params, self.lease)
+        if rejected:
+            self.db.update_status_many([(lead_id, "FAILED", f"Message rejected: {reason}") for lead_id, reason in rejected],
+                                       stage="message", worker_id=self.worker_id)
+        return updated
+
+    async def _still_held(self, ids):
+        """
+        The ids the runner still holds, after a checkpoint wrote fewer leads than it was
+        given: the others' leases ran out and another worker claimed them, so this run
+        stops carrying them (and never sends them).
+        """
+        ids = list(ids)
+        held_ids = await self._write(self.db.claimed_ids, self.worker_id, ids)
+        for lead_id in ids:
+            if lead_id not in held_ids:
+                self.started.pop(lead_id, None)
+        return held_ids
+
+    async def _send(self, batch):
+        engine = OutreachEngine(**self.send_options)
+        results = await engine.run(batch)
+        await self._write(self.db.update_status_many, results, None, engine.events, self.worker_id)
+        self._record(results, engine)
+        return None
+
+    def _record(self, results, engine):
+        """Counts send outcomes; a lead's latency ends at its final (non-RETRY) outcome."""
+        now = time.perf_counter()
+        for lead_id, status, *_ in results:
+            if status == "RETRY":
+                continue
+            self.counts["sent" if status == "SENT" else "failed"] += 1
+            started = self.started.pop(lead_id, None)
+            if started is not None:
+                self.latencies.append(now - started)
+        self.counts["retries"] += engine.retries
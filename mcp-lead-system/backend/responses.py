@@ -0,0 +1,66 @@
+# HTTP responses: JSON rendered by encoding.dumps, and gzip/brotli compression of large
+# responses. Kept apart from encoding.py so the MCP server never imports starlette for it.
+
+import os
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipMiddleware, GZipResponder, IdentityResponder
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from encoding import dumps
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip covers every client
+    brotli = None
+
+# Responses smaller than this go out uncompressed (a small /leads page or a stage result)
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Fast settings: pages are compressed per request, so CPU matters more than the last few %
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+# Already compressed (or never worth compressing) on top of starlette's list, e.g. Parquet exports
+EXCLUDED_CONTENT_TYPES = DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/vnd.apache.parquet",)
+
+class JSONResponse(StarletteJSONResponse):
+    """
+    Renders with `dumps`. Routes return it directly for large payloads, which also skips
+    FastAPI's jsonable_encoder pass over every row.
+    """
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int = BROTLI_QUALITY, **kwargs):
+        super().__init__(app, minimum_size, **kwargs)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        # Streamed bodies are flushed per chunk, so each one can be decoded as it arrives
+        if more_body:
+            return self.compressor.process(body) + self.compressor.flush()
+        return self.compressor.process(body) + self.compressor.finish()
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresses responses of at least `minimum_size` bytes: brotli when the client accepts
+    it and the brotli package is installed, else gzip. Event streams and Parquet are left alone.
+    """
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES, compresslevel: int = GZIP_LEVEL,
+                 exclude_content_types=EXCLUDED_CONTENT_TYPES, **kwargs):
+        super().__init__(app, minimum_size, compresslevel, exclude_content_types=exclude_content_types, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accepted = {e.split(";")[0].strip().lower() for e in Headers(scope=scope).get("accept-encoding", "").split(",")}
+        options = dict(exclude_content_types=self.exclude_content_types)
+        if brotli is not None and "br" in accepted:
+            responder = BrotliResponder(self.app, self.minimum_size, **options)
+        elif "gzip" in accepted:
+            responder = GZipResponder(self.app, self.minimum_size, self.compresslevel,
+                                      thread_minimum_size=self.thread_minimum_size, **options)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size, **options)
+        await responder(scope, receive, send)
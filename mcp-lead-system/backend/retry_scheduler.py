@@ -0,0 +1,82 @@
+# Persistent send retries: due RETRY leads are worked in batches, never inline in a send
+
+import asyncio
+import os
+import time
+from database import CLAIM_LEASE_SECONDS
+from leases import held
+from logic.outreach import OutreachEngine
+from logic.metrics import stage_span
+
+# Due retries claimed per pass
+RETRY_BATCH_SIZE = int(os.getenv("RETRY_BATCH_SIZE", "200"))
+# Longest sleep between passes when nothing is due (new retries may be scheduled meanwhile)
+RETRY_POLL_SECONDS = float(os.getenv("RETRY_POLL_SECONDS", "5"))
+# Shortest sleep, for due retries that another worker currently holds
+RETRY_MIN_WAIT_SECONDS = 0.05
+
+RETRY_COLUMNS = ("id", "email", "email_content_a", "attempt_count")
+
+class RetryScheduler:
+    """
+    Works the retry schedule filled by scheduled sends (OutreachEngine(schedule_retries=True)).
+    A pass claims the leads whose next_attempt_at has passed, earliest first, makes one more
+    attempt each and stores the outcome: SENT, FAILED once the error class has used up its
+    attempts, or RETRY again with a longer backoff. Nothing waits in memory between
+    attempts, so pending retries survive restarts.
+    `send_options` go to OutreachEngine (dry_run, concurrency, rate_limiter, transport, ...).
+    """
+    def __init__(self, db, worker_id: str, batch_size: int = RETRY_BATCH_SIZE,
+                 poll_interval: float = RETRY_POLL_SECONDS, lease_seconds: float = CLAIM_LEASE_SECONDS,
+                 on_results=None, **send_options):
+        self.db = db
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.on_results = on_results
+        self.send_options = send_options
+        self.totals = {"attempted": 0, "sent": 0, "failed": 0, "rescheduled": 0}
+
+    async def run_once(self) -> int:
+        """One pass over up to `batch_size` due retries. Returns how many were attempted."""
+        with stage_span("retry") as span:
+            leads = await asyncio.to_thread(self.db.claim_batch, "retry", self.batch_size, self.worker_id, self.lease_seconds, RETRY_COLUMNS)
+            if not leads:
+                return 0
+            span.leads = len(leads)
+            engine = OutreachEngine(schedule_retries=True, **self.send_options)
+            try:
+                async with held(self.db, self.worker_id, [lead["id"] for lead in leads], self.lease_seconds):
+                    results = await engine.run(leads)
+                await asyncio.to_thread(self.db.update_status_many, results, worker_id=self.worker_id)
+            except BaseException:
+                # Back to the schedule at once rather than when the leases run out
+                await asyncio.to_thread(self.db.release_claims, self.worker_id, [lead["id"] for lead in leads])
+                raise
+        self.totals["attempted"] += len(results)
+        for _, status, *_ in results:
+            self.totals["sent" if status == "SENT" else "failed" if status == "FAILED" else "rescheduled"] += 1
+        if self.on_results:
+            self.on_results(results, engine)
+        return len(results)
+
+    async def run(self, stop: asyncio.Event = None) -> dict:
+        """
+        Loops until `stop` is set and no retry is pending (stop=None: until the schedule is
+        drained), sleeping until the next retry falls due. Returns the running totals.
+        """
+        while True:
+            if await self.run_once():
+                continue
+            next_at = await asyncio.to_thread(self.db.next_retry_at)
+            if next_at is None and (stop is None or stop.is_set()):
+                return dict(self.totals)
+            wait = self.poll_interval if next_at is None else min(self.poll_interval, max(next_at - time.time(), RETRY_MIN_WAIT_SECONDS))
+            if stop is None or stop.is_set():
+                await asyncio.sleep(wait)
+                continue
+            try:
+                await asyncio.wait_for(stop.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
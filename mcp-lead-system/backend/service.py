@@ -0,0 +1,277 @@
+# Core pipeline operations shared by the MCP server and the HTTP bridge. Each returns a
+# plain result dict (typed below); the adapters only encode it for their transport.
+
+from typing import TypedDict
+from logic.generator import generate_leads_logic, generate_leads_fast
+from logic.enricher import enrich_many, load_rules, DEFAULT_ENGINE
+from logic.ai_enricher import build_default_client
+from logic.messaging import load_renderer, DEFAULT_RENDERER
+from logic.outreach import OutreachEngine, DEFAULT_RATE_PER_MINUTE
+from logic.rate_limiter import RateLimiter
+from logic.metrics import stage_span
+from database import LeadDB
+from leases import held, released_on_error
+from pipeline import PipelineRunner
+from retry_scheduler import RetryScheduler
+import os
+import socket
+import threading
+from itertools import chain
+
+# Optional custom enrichment rules (JSON, same shape as logic.enricher.DEFAULT_RULES)
+enrichment_engine = load_rules(os.environ["ENRICHMENT_RULES"]) if os.getenv("ENRICHMENT_RULES") else DEFAULT_ENGINE
+# Optional directory of extra/overriding message templates (<channel>_<variant>.txt)
+message_renderer = load_renderer(os.environ["MESSAGE_TEMPLATES"]) if os.getenv("MESSAGE_TEMPLATES") else DEFAULT_RENDERER
+_ai_client = None
+# The shared LeadDB opens on first use: importing this module (or the MCP server / HTTP
+# bridge on top of it) opens no connection and runs no schema migration
+_db = None
+_db_lock = threading.Lock()
+
+# Columns each stage actually reads (avoids SELECT * over message bodies and logs)
+ENRICH_COLUMNS = ("id", "industry", "role", "company_name")
+SEND_COLUMNS = ("id", "email", "email_content_a")
+# Every live send in this process (stage calls, background job chunks, the retry loop and
+# the pipeline) draws from this one limiter, so together they keep to the per-channel and
+# per-domain rate instead of each starting with a full bucket
+send_limiter = RateLimiter(DEFAULT_RATE_PER_MINUTE)
+# Stages claim their batch under this id, so concurrent callers (several API workers,
+# the MCP server next to the API bridge) never process the same lead twice
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+def send_rate_limiter(dry_run: bool, rate_per_minute: float = None) -> RateLimiter:
+    """
+    The shared limiter for live sends. Dry runs are unlimited; an explicit `rate_per_minute`
+    (load tests, benchmarks) gets a limiter of its own.
+    """
+    if rate_per_minute is not None:
+        return RateLimiter(rate_per_minute)
+    return RateLimiter(None) if dry_run else send_limiter
+
+def get_db() -> LeadDB:
+    """The process-wide LeadDB on DB_PATH, opened (and migrated) by the first caller."""
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                _db = LeadDB()
+    return _db
+
+def close_db():
+    """Closes the shared LeadDB if it was opened; a later get_db() opens it again."""
+    global _db
+    with _db_lock:
+        if _db is not None:
+            _db.close()
+            _db = None
+
+class GenerateResult(TypedDict):
+    status: str
+    generated: int
+    added: int
+    skipped: int
+    industry: str
+
+class EnrichResult(TypedDict, total=False):
+    status: str
+    processed: int
+    mode: str
+    ai_stats: dict  # mode="ai" only
+
+class MessageResult(TypedDict):
+    status: str
+    processed: int
+    rejected: int
+
+class SendResult(TypedDict):
+    status: str
+    processed: int  # leads claimed, whatever their outcome
+    sent: int
+    failed: int
+    retries: int
+    mode: str
+
+class RetryResult(TypedDict):
+    status: str
+    attempted: int
+    sent: int
+    failed: int
+    rescheduled: int
+    next_retry_at: float  # None when nothing is scheduled
+    mode: str
+
+class PipelineResult(TypedDict):
+    status: str
+    generated: int
+    resumed: int
+    enriched: int
+    messaged: int
+    rejected: int
+    sent: int
+    failed: int
+    retries: int
+    mode: str
+    elapsed_seconds: float
+    throughput_per_second: float
+    latency_p50: float
+    latency_p99: float
+
+def generate_leads(count: int = 5, seed: int = 42, industry: str = None, fast: bool = False, shards: int = None) -> GenerateResult:
+    """
+    Generates synthetic leads with optional industry filter.
+    fast=True uses the sharded high-throughput generator (reproducible per seed and shard
+    count) and streams shards straight into the bulk insert; use it for load-test volumes.
+    """
+    db = get_db()
+    with stage_span("generate") as span:
+        if fast:
+            leads = chain.from_iterable(generate_leads_fast(count, seed, industry, shards=shards))
+        else:
+            leads = generate_leads_logic(count, seed, industry)
+        added = span.leads = db.add_leads(leads)
+    # Leads whose email already existed are skipped by the bulk insert
+    return {"status": "success", "generated": count, "added": added, "skipped": count - added, "industry": industry}
+
+def get_ai_client():
+    """
+    AI enrichment client, created on first use (it opens the persistent answer cache).
+    One per process, so stage calls on different worker threads share its in-flight prompts.
+    """
+    global _ai_client
+    if _ai_client is None:
+        with _db_lock:
+            if _ai_client is None:
+                _ai_client = build_default_client()
+    return _ai_client
+
+def close_ai_client():
+    """Closes the shared AI client (its model connections, loop and cache) if it was created."""
+    global _ai_client
+    with _db_lock:
+        if _ai_client is not None:
+            _ai_client.close()
+            _ai_client = None
+
+async def enrich_leads_batch(limit: int = 5, mode: str = "offline") -> EnrichResult:
+    """
+    Enriches leads using either Offline Rules or AI.
+    Args:
+        limit: Number of leads to process.
+        mode: 'offline' (default) or 'ai' (AI_MODEL_URL if set, else the mock model;
+              batched prompts, cached answers, offline fallback on timeout).
+    """
+    db = get_db()
+    with stage_span("enrich") as span:
+        leads = db.claim_batch("enrich", limit, WORKER_ID, columns=ENRICH_COLUMNS)
+        span.leads = len(leads)
+
+        with released_on_error(db, WORKER_ID, leads):
+            if mode == "ai":
+                # Model calls can outlast a lease: keep the batch claimed until it is written
+                async with held(db, WORKER_ID, [lead['id'] for lead in leads]):
+                    enrichments = await get_ai_client().enrich_many(leads)
+            else:
+                # Compiled rule engine, memoized per (industry, role)
+                enrichments = enrich_many(leads, mode=mode, engine=enrichment_engine)
+            # The batch is written in one transaction, for the leads this worker still holds
+            updates = [(lead['id'], enrichment) for lead, enrichment in zip(leads, enrichments)]
+            processed_count = db.update_enrichment_many(updates, worker_id=WORKER_ID)
+
+    result = {"status": "success", "processed": processed_count, "mode": mode}
+    if mode == "ai":
+        # Cumulative cache hit rate, coalescing, fallbacks and model latency percentiles
+        result["ai_stats"] = get_ai_client().stats()
+    return result
+
+def generate_messages_batch(limit: int = 5, variants: dict = None) -> MessageResult:
+    """
+    Generates draft messages with strict CTA and Word Count constraints.
+    Templates come from logic/message_templates (plus MESSAGE_TEMPLATES overrides);
+    `variants` swaps a template into a slot, e.g. {"email_b": "email_c"}. Leads whose
+    messages would break a limit are marked FAILED instead of MESSAGED.
+    """
+    # Unknown variants fail here, before any lead is claimed
+    assignment = message_renderer.assignment(variants)
+    db = get_db()
+    with stage_span("message") as span:
+        leads = db.claim_batch("message", limit, WORKER_ID)
+        span.leads = len(leads)
+        if not leads:
+            return {"status": "success", "processed": 0, "rejected": 0}
+        with released_on_error(db, WORKER_ID, leads):
+            # Messages are stored as a template set plus parameters and rendered when read
+            params, rejected = message_renderer.check_many(leads, variants)
+            db.update_message_refs_many(db.template_set_id(assignment), params, worker_id=WORKER_ID)
+            if rejected:
+                db.update_status_many([(lead_id, "FAILED", f"Message rejected: {reason}") for lead_id, reason in rejected],
+                                      stage="message", worker_id=WORKER_ID)
+    return {"status": "success", "processed": len(leads), "rejected": len(rejected)}
+
+async def send_outreach_batch(limit: int = 5, dry_run: bool = True, concurrency: int = 10, rate_per_minute: float = None) -> SendResult:
+    """
+    Sends messages via Email/LinkedIn with Retry Logic and Rate Limiting.
+    Requirements:
+    - Retry: At least 2 retries (Total 3 attempts), exponential backoff with jitter.
+      Each lead gets one attempt here; a failure is scheduled as a RETRY (see process_retries)
+      per error class, so the batch never waits on a backoff.
+    - Rate Limit: Max 10 messages/min per channel and per sending domain (token bucket).
+      Dry runs are unlimited unless `rate_per_minute` is given.
+    Sends run concurrently (up to `concurrency` in flight).
+    """
+    db = get_db()
+    with stage_span("send") as span:
+        leads = db.claim_batch("send", limit, WORKER_ID, columns=SEND_COLUMNS)
+        span.leads = len(leads)
+
+        engine = OutreachEngine(dry_run=dry_run, concurrency=concurrency, rate_limiter=send_rate_limiter(dry_run, rate_per_minute),
+                                schedule_retries=True)
+        with released_on_error(db, WORKER_ID, leads):
+            # At 10 sends/min a batch easily outlasts one lease: keep it claimed until it is written
+            async with held(db, WORKER_ID, [lead['id'] for lead in leads]):
+                results = await engine.run(leads)
+
+            # Status changes, retry schedule and attempt history are written in one transaction,
+            # for the leads this worker still holds
+            db.update_status_many(results, events=engine.events, worker_id=WORKER_ID)
+    sent_count = sum(1 for _, status, *_ in results if status == "SENT")
+
+    return {
+        "status": "complete",
+        "processed": len(leads),
+        "sent": sent_count,
+        "failed": sum(1 for _, status, *_ in results if status == "FAILED"),
+        "retries": engine.retries,
+        "mode": "DRY RUN" if dry_run else "LIVE",
+    }
+
+async def process_retries(limit: int = 200, dry_run: bool = True, concurrency: int = 10,
+                          rate_per_minute: float = None, drain: bool = False) -> RetryResult:
+    """
+    Works the persistent send-retry schedule: due RETRY leads, earliest first, get one more
+    attempt each with the usual rate limits. drain=True keeps going (sleeping until the next
+    retry is due) until nothing is scheduled.
+    """
+    db = get_db()
+    scheduler = RetryScheduler(db, WORKER_ID, batch_size=limit, dry_run=dry_run, concurrency=concurrency,
+                               rate_limiter=send_rate_limiter(dry_run, rate_per_minute))
+    if drain:
+        await scheduler.run()
+    else:
+        await scheduler.run_once()
+    return {"status": "complete", **scheduler.totals, "next_retry_at": db.next_retry_at(), "mode": "DRY RUN" if dry_run else "LIVE"}
+
+async def run_pipeline(count: int = 100, seed: int = 42, industry: str = None, mode: str = "offline",
+                       dry_run: bool = True, concurrency: int = 10, rate_per_minute: float = None,
+                       batch_size: int = None, workers: dict = None, resume: bool = True) -> PipelineResult:
+    """
+    Runs generate -> enrich -> message -> send in one pass, with the stages working
+    concurrently on batches of `batch_size` leads joined by bounded queues.
+    `workers` sets per-stage worker counts, e.g. {"send": 4}. With resume=True, leads left
+    mid-pipeline by an earlier (crashed) run are picked up first; leads waiting for the
+    stage tools are not touched.
+    """
+    runner = PipelineRunner(get_db(), enrichment_engine, message_renderer, get_ai_client() if mode == "ai" else None,
+                            workers=workers, **({"batch_size": batch_size} if batch_size else {}))
+    result = await runner.run(count, seed, industry, mode, dry_run, concurrency, resume=resume,
+                              rate_limiter=send_rate_limiter(dry_run, rate_per_minute))
+    return {"status": "complete", **result}
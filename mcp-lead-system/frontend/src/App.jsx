@@ -1,30 +1,70 @@
 // App.jsx
 // Main Dashboard Layout
 
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import axios from 'axios';
 import { Users, CheckCircle, MessageSquare, Send, AlertTriangle } from 'lucide-react';
 import StatCard from './components/StatCard';
 import Controls from './components/Controls';
 import LeadTable from './components/LeadTable';
 
+const API = "http://localhost:8000";
+const FALLBACK_POLL_MS = 3000;
+
 function App() {
-  const [leads, setLeads] = useState([]);
+  // Changed rows from the feed; the table pages through /leads itself and merges these in
+  const [changes, setChanges] = useState([]);
   const [stats, setStats] = useState({});
+  const [industries, setIndustries] = useState([]);
   const [isProcessing, setProcessing] = useState(false);
+  const version = useRef(null);
 
+  // Stats snapshot and feed position: used on load, after a feed reset and as the manual refresh
   const fetchData = async () => {
     try {
-      const res = await axios.get("http://localhost:8000/leads"); 
-      setLeads(res.data.leads);
+      const res = await axios.get(`${API}/leads`, { params: { limit: 1, columns: "id" } });
       setStats(res.data.stats);
+      setIndustries(Object.keys(res.data.industry_stats).filter(Boolean).sort());
+      version.current = res.data.version;
     } catch (err) { console.error(err); }
   };
 
+  // Delta poll: only rows changed since the last version we saw
+  const fetchChanges = async () => {
+    if (version.current === null) return fetchData();
+    try {
+      let hasMore = true, afterId = null;
+      while (hasMore) {
+        const params = { since: version.current, ...(afterId !== null && { after_id: afterId }) };
+        const res = await axios.get(`${API}/leads`, { params });
+        if (res.data.leads.length) setChanges(res.data.leads);
+        setStats(res.data.stats);
+        version.current = res.data.version;
+        hasMore = res.data.has_more;
+        afterId = hasMore ? res.data.after_id : null;
+      }
+    } catch (err) { console.error(err); }
+  };
+
+  const applyEvent = (event) => {
+    if (event.reset) return fetchData();
+    setChanges(event.leads);
+    setStats(event.stats);
+    version.current = event.version;
+  };
+
   useEffect(() => {
-    fetchData();
-    const interval = setInterval(fetchData, 3000);
-    return () => clearInterval(interval);
+    let source = null, interval = null;
+    fetchData().then(() => {
+      if (typeof EventSource === "undefined") {
+        interval = setInterval(fetchChanges, FALLBACK_POLL_MS);
+        return;
+      }
+      // Server push; the browser reconnects by itself and resumes from the last event id
+      source = new EventSource(`${API}/leads/stream?since=${version.current}`);
+      source.addEventListener("changes", e => applyEvent(JSON.parse(e.data)));
+    });
+    return () => { source && source.close(); interval && clearInterval(interval); };
   }, []);
 
   // Safe Stats Access
@@ -50,10 +90,10 @@ function App() {
         </div>
 
         {/* MAIN CONTROLS */}
-        <Controls refreshData={fetchData} isProcessing={isProcessing} setProcessing={setProcessing} />
+        <Controls refreshData={fetchChanges} isProcessing={isProcessing} setProcessing={setProcessing} />
 
         {/* DATA TABLE */}
-        <LeadTable leads={leads} />
+        <LeadTable changes={changes} industries={industries} />
 
       </div>
     </div>
@@ -1,44 +1,165 @@
 // LeadTable.jsx
-// Component to display a data grid with status badges
+// Virtualized data grid with status badges: pages are fetched from /leads by cursor as
+// the user scrolls, and only the rows in view are rendered
 
-import React from 'react';
+import React, { useEffect, useRef, useState } from 'react';
+import axios from 'axios';
 import { Linkedin, Mail, Search, Globe, MapPin, Download } from 'lucide-react';
 
-const LeadTable = ({ leads }) => {
+const API = "http://localhost:8000";
+const PAGE_SIZE = 200;
+const ROW_HEIGHT = 73;
+// Rows rendered above and below the visible window
+const OVERSCAN = 10;
+// Start loading the next page when the window gets this close to the end of the loaded rows
+const PREFETCH_ROWS = 50;
+const SEARCH_DEBOUNCE_MS = 250;
+// Table rows need no message bodies; drafts are fetched when opened
+const COLUMNS = "id,full_name,email,linkedin_url,company_name,website,role,country,industry,status";
+const STATUSES = ["NEW", "ENRICHED", "MESSAGED", "SENT", "RETRY", "FAILED"];
+const HAS_DRAFTS = new Set(["MESSAGED", "SENT", "RETRY"]);
+
+const LeadTable = ({ changes, industries }) => {
+  const [rows, setRows] = useState([]);
+  const [total, setTotal] = useState(null);
+  const [cursor, setCursor] = useState(null);
+  const [hasMore, setHasMore] = useState(true);
+  const [scrollTop, setScrollTop] = useState(0);
+  const [viewHeight, setViewHeight] = useState(500);
+  const [search, setSearch] = useState("");
+  const [query, setQuery] = useState({ q: "", status: "", industry: "", country: "", sort: "id", order: "desc" });
+  const loading = useRef(false);
+  // Bumped on every query change, so pages of an older query are dropped
+  const generation = useRef(0);
+  const scroller = useRef(null);
+
   // Avatar generator
   const getAvatar = (name) => `https://ui-avatars.com/api/?name=${name.replace(' ', '+')}&background=3b82f6&color=fff`;
   const getLogo = (company) => `https://ui-avatars.com/api/?name=${company.substring(0,2)}&background=1e293b&color=94a3b8&font-size=0.4`;
 
+  const loadPage = async (after, gen) => {
+    if (loading.current) return;
+    loading.current = true;
+    try {
+      const params = { limit: PAGE_SIZE, columns: COLUMNS, sort: query.sort, order: query.order };
+      ["q", "status", "industry", "country"].forEach(k => { if (query[k]) params[k] = query[k]; });
+      if (after) params.cursor = after;
+      const res = await axios.get(`${API}/leads`, { params });
+      if (gen !== generation.current) return;
+      setRows(prev => after ? [...prev, ...res.data.leads] : res.data.leads);
+      setCursor(res.data.next_cursor);
+      setHasMore(res.data.has_more);
+      setTotal(res.data.total);
+    } catch (err) { console.error(err); }
+    finally { loading.current = false; }
+  };
+
+  // New query: start again from the first page
+  useEffect(() => {
+    generation.current += 1;
+    loading.current = false;
+    setRows([]); setCursor(null); setHasMore(true);
+    if (scroller.current) scroller.current.scrollTop = 0;
+    loadPage(null, generation.current);
+  }, [query]);
+
+  // Debounced search box
+  useEffect(() => {
+    const timer = setTimeout(() => setQuery(q => q.q === search ? q : { ...q, q: search, sort: "id" }), SEARCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [search]);
+
+  useEffect(() => {
+    const measure = () => scroller.current && setViewHeight(scroller.current.clientHeight);
+    measure();
+    window.addEventListener("resize", measure);
+    return () => window.removeEventListener("resize", measure);
+  }, []);
+
+  // Live updates: refresh rows already loaded; new leads appear on top of the unfiltered newest-first view
+  useEffect(() => {
+    if (!changes || !changes.length) return;
+    const unfiltered = query.sort === "id" && query.order === "desc" && !query.q && !query.status && !query.industry && !query.country;
+    setRows(prev => {
+      const byId = new Map(changes.map(l => [l.id, l]));
+      const updated = prev.map(l => byId.has(l.id) ? { ...l, ...byId.get(l.id) } : l);
+      if (!unfiltered) return updated;
+      const top = prev.length ? prev[0].id : 0;
+      const added = changes.filter(l => l.id > top).sort((a, b) => b.id - a.id);
+      return [...added, ...updated];
+    });
+  }, [changes]);
+
+  const first = Math.max(0, Math.floor(scrollTop / ROW_HEIGHT) - OVERSCAN);
+  const last = Math.min(rows.length, Math.ceil((scrollTop + viewHeight) / ROW_HEIGHT) + OVERSCAN);
+
+  useEffect(() => {
+    if (hasMore && cursor && last + PREFETCH_ROWS >= rows.length) loadPage(cursor, generation.current);
+  }, [last, rows.length, cursor, hasMore]);
+
+  const setFilter = (key, value) => setQuery(q => ({ ...q, [key]: value }));
+  const setSort = (value) => {
+    const [sort, order] = value.split(":");
+    setQuery(q => ({ ...q, sort, order }));
+  };
+
+  const showDraft = async (lead, column, label) => {
+    try {
+      const res = await axios.get(`${API}/leads/${lead.id}`, { params: { columns: `id,${column}` } });
+      alert(`${label}:\n\n${res.data[column] || "(no draft)"}`);
+    } catch (err) { console.error(err); }
+  };
+
+  const inputStyle = "bg-dashboard-dark border border-dashboard-border rounded-lg px-3 py-2 text-xs text-white focus:outline-none focus:border-blue-500 transition-all";
+
   return (
     <div className="bg-dashboard-card border border-dashboard-border rounded-2xl shadow-lg flex flex-col h-[600px]">
-      
-      {/* Header with Export Button */}
-      <div className="px-6 py-5 border-b border-dashboard-border flex justify-between items-center">
+
+      {/* Header with Filters and Export Button */}
+      <div className="px-6 py-5 border-b border-dashboard-border flex justify-between items-center gap-4">
         <div className="flex items-center gap-4">
           <h3 className="text-dashboard-textHighlight text-lg font-semibold">Lead List</h3>
           <span className="bg-blue-500/10 text-blue-400 text-xs font-bold px-2 py-1 rounded-md border border-blue-500/20">
-            {leads.length} Total
+            {total !== null ? `${total.toLocaleString()} Total` : `${rows.length.toLocaleString()}${hasMore ? "+" : ""} Found`}
           </span>
         </div>
-        
+
         <div className="flex items-center gap-3">
-          <a href="http://localhost:8000/export/csv" target="_blank" rel="noreferrer"
+          <select value={query.status} onChange={e => setFilter("status", e.target.value)} className={inputStyle}>
+            <option value="">All statuses</option>
+            {STATUSES.map(s => <option key={s} value={s}>{s}</option>)}
+          </select>
+          <select value={query.industry} onChange={e => setFilter("industry", e.target.value)} className={inputStyle}>
+            <option value="">All industries</option>
+            {industries.map(i => <option key={i} value={i}>{i}</option>)}
+          </select>
+          <input type="text" placeholder="Country" value={query.country}
+                 onChange={e => setFilter("country", e.target.value)} className={`${inputStyle} w-28`} />
+          <select value={`${query.sort}:${query.order}`} onChange={e => setSort(e.target.value)} disabled={!!query.q} className={inputStyle}>
+            <option value="id:desc">Newest first</option>
+            <option value="id:asc">Oldest first</option>
+            <option value="full_name:asc">Name A-Z</option>
+            <option value="company_name:asc">Company A-Z</option>
+          </select>
+          <a href={`${API}/export/csv`} target="_blank" rel="noreferrer"
              className="flex items-center gap-2 px-3 py-2 rounded-lg bg-dashboard-dark border border-dashboard-border text-xs text-dashboard-text hover:text-white hover:border-blue-500 transition-all">
              <Download size={14} /> Export CSV
           </a>
           <div className="relative">
             <Search className="absolute left-3 top-2.5 text-gray-500" size={14}/>
-            <input 
-              type="text" 
-              placeholder="Search leads..." 
+            <input
+              type="text"
+              placeholder="Search leads..."
+              value={search}
+              onChange={e => setSearch(e.target.value)}
               className="bg-dashboard-dark border border-dashboard-border rounded-lg pl-9 pr-4 py-2 text-xs text-white focus:outline-none focus:border-blue-500 w-64 transition-all"
             />
           </div>
         </div>
       </div>
 
-      {/* Table Content */}
-      <div className="overflow-auto custom-scrollbar flex-grow">
+      {/* Table Content: spacer rows stand in for everything outside the window */}
+      <div ref={scroller} onScroll={e => setScrollTop(e.currentTarget.scrollTop)} className="overflow-auto custom-scrollbar flex-grow">
         <table className="w-full text-left border-collapse">
           <thead className="bg-dashboard-dark text-xs uppercase text-dashboard-text sticky top-0 z-10">
             <tr>
@@ -51,13 +172,14 @@ const LeadTable = ({ leads }) => {
             </tr>
           </thead>
           <tbody className="divide-y divide-dashboard-border">
-            {leads.map(l => (
-              <tr key={l.id} className="hover:bg-slate-800/50 transition-colors group">
-                
+            {first > 0 && <tr style={{ height: first * ROW_HEIGHT }}><td colSpan={6} /></tr>}
+            {rows.slice(first, last).map(l => (
+              <tr key={l.id} style={{ height: ROW_HEIGHT }} className="hover:bg-slate-800/50 transition-colors group">
+
                 {/* 1. Name + Email + LinkedIn Link */}
                 <td className="px-6 py-4">
                   <div className="flex items-center gap-3">
-                    <img src={getAvatar(l.full_name)} alt="avatar" className="w-10 h-10 rounded-full border border-dashboard-border" />
+                    <img src={getAvatar(l.full_name)} alt="avatar" loading="lazy" className="w-10 h-10 rounded-full border border-dashboard-border" />
                     <div>
                       <div className="text-sm font-medium text-white flex items-center gap-2">
                         {l.full_name}
@@ -74,7 +196,7 @@ const LeadTable = ({ leads }) => {
                 {/* 2. Company + Website Link */}
                 <td className="px-6 py-4">
                    <div className="flex items-center gap-2">
-                    <img src={getLogo(l.company_name)} alt="logo" className="w-6 h-6 rounded bg-dashboard-dark" />
+                    <img src={getLogo(l.company_name)} alt="logo" loading="lazy" className="w-6 h-6 rounded bg-dashboard-dark" />
                     <div>
                       <div className="text-sm text-gray-300">{l.company_name}</div>
                       <a href={l.website} target="_blank" rel="noreferrer" className="text-[10px] text-blue-400 hover:underline flex items-center gap-1">
@@ -101,29 +223,30 @@ const LeadTable = ({ leads }) => {
 
                 {/* 5. Status Badge */}
                 <td className="px-6 py-4 text-center">
-                  <span className={`inline-flex items-center gap-1.5 px-3 py-1 rounded-full text-xs font-bold border 
+                  <span className={`inline-flex items-center gap-1.5 px-3 py-1 rounded-full text-xs font-bold border
                     ${l.status==='NEW'?'bg-blue-500/10 text-blue-400 border-blue-500/20':''}
                     ${l.status==='ENRICHED'?'bg-yellow-500/10 text-yellow-400 border-yellow-500/20':''}
                     ${l.status==='MESSAGED'?'bg-orange-500/10 text-orange-400 border-orange-500/20':''}
                     ${l.status==='SENT'?'bg-green-500/10 text-green-400 border-green-500/20':''}
+                    ${l.status==='RETRY'?'bg-purple-500/10 text-purple-400 border-purple-500/20':''}
                     ${l.status==='FAILED'?'bg-red-500/10 text-red-400 border-red-500/20':''}
                   `}>
                     {l.status}
                   </span>
                 </td>
 
-                {/* 6. Action Buttons (View Content) */}
+                {/* 6. Action Buttons (View Content, loaded on demand) */}
                 <td className="px-6 py-4 text-right">
                   <div className="flex justify-end gap-2">
-                    {l.email_content_a ? (
+                    {HAS_DRAFTS.has(l.status) ? (
                       <>
-                        <button 
-                          onClick={() => alert(`EMAIL TO ${l.email}:\n\n${l.email_content_a}`)}
+                        <button
+                          onClick={() => showDraft(l, "email_content_a", `EMAIL TO ${l.email}`)}
                           className="px-2 py-1 rounded bg-slate-800 border border-slate-700 text-xs text-blue-400 hover:text-white hover:border-blue-500 transition-all flex items-center gap-1">
                           <Mail size={12}/> Email
                         </button>
-                        <button 
-                          onClick={() => alert(`LINKEDIN MSG TO ${l.full_name}:\n\n${l.linkedin_content_a}`)}
+                        <button
+                          onClick={() => showDraft(l, "linkedin_content_a", `LINKEDIN MSG TO ${l.full_name}`)}
                           className="px-2 py-1 rounded bg-slate-800 border border-slate-700 text-xs text-blue-400 hover:text-white hover:border-blue-500 transition-all flex items-center gap-1">
                           <Linkedin size={12}/> DM
                         </button>
@@ -136,16 +259,17 @@ const LeadTable = ({ leads }) => {
 
               </tr>
             ))}
+            {last < rows.length && <tr style={{ height: (rows.length - last) * ROW_HEIGHT }}><td colSpan={6} /></tr>}
           </tbody>
         </table>
       </div>
-      
+
       {/* Footer */}
       <div className="px-6 py-3 border-t border-dashboard-border flex justify-between items-center text-xs text-gray-500">
-        <div>Showing all {leads.length} records</div>
+        <div>Loaded {rows.length.toLocaleString()}{total !== null ? ` of ${total.toLocaleString()}` : ""} records{hasMore ? " (scroll for more)" : ""}</div>
       </div>
     </div>
   );
 };
 
-export default LeadTable;
\ No newline at end of file
+export default LeadTable;